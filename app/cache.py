@@ -0,0 +1,126 @@
+import asyncio
+import copy
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+from app.config import USER_CACHE_SIZE, USER_CACHE_TTL
+
+
+class CacheBackend(ABC):
+    """Read-through cache used in front of CRUD reads.
+
+    Implementations must never return a value loaded before the last
+    `invalidate` of its key completed.
+    """
+
+    @abstractmethod
+    async def get_or_load(
+        self, key: Hashable, loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        ...
+
+    @abstractmethod
+    async def invalidate(self, key: Hashable):
+        ...
+
+    @abstractmethod
+    async def clear(self):
+        ...
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+
+class LRUTTLCache(CacheBackend):
+    """In-process LRU cache with per-entry TTL.
+
+    Concurrent misses on a key share a single load. `invalidate` detaches an
+    in-flight load, so its result is neither stored nor handed to later callers.
+    None results are not cached.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._loading: dict[Hashable, asyncio.Future] = {}
+
+    async def get_or_load(
+        self, key: Hashable, loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.copy(value)
+            del self._entries[key]
+        self.misses += 1
+
+        future = self._loading.get(key)
+        if future is not None:
+            try:
+                return copy.copy(await asyncio.shield(future))
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # the caller that owned the load was cancelled, not us
+                return await self.get_or_load(key, loader)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            value = await loader()
+        except (Exception, asyncio.CancelledError) as e:
+            if self._loading.get(key) is future:
+                del self._loading[key]
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # waiters re-raise it, nobody else has to retrieve it
+                future.exception()
+            raise
+
+        if self._loading.get(key) is future:
+            del self._loading[key]
+            if value is not None:
+                self._store(key, value)
+        future.set_result(value)
+        return copy.copy(value)
+
+    def _store(self, key: Hashable, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+        self._loading.pop(key, None)
+
+    async def clear(self):
+        self._entries.clear()
+        self._loading.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+user_cache: CacheBackend | None = (
+    LRUTTLCache(USER_CACHE_SIZE, USER_CACHE_TTL) if USER_CACHE_SIZE > 0 else None
+)
@@ -0,0 +1,52 @@
+"""Split embedded conversation messages into bucket documents.
+
+Usage: python -m app.commands.bucket_conversations [--bucket-size N]
+"""
+import argparse
+import asyncio
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import app.cruds.conv_crud as crud  # noqa: E402
+from app.config import MESSAGE_BUCKET_SIZE  # noqa: E402
+from app.db import conversations_collection, message_buckets_collection  # noqa: E402
+
+
+async def migrate(
+    collection, buckets, bucket_size: int, max_retries: int = 3
+) -> tuple[int, int]:
+    migrated, skipped = 0, 0
+    async for doc in collection.find(
+        {"bucket_size": {"$exists": False}}, batch_size=100
+    ):
+        for _ in range(max_retries):
+            if await crud.migrate_conv_to_buckets(
+                collection, buckets, doc, bucket_size
+            ):
+                migrated += 1
+                break
+            # a message was appended meanwhile, re-read and retry
+            doc = await collection.find_one(
+                {"_id": doc["_id"], "bucket_size": {"$exists": False}}
+            )
+            if doc is None:
+                break
+        else:
+            skipped += 1
+    return migrated, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bucket-size", type=int, default=MESSAGE_BUCKET_SIZE)
+    args = parser.parse_args()
+
+    migrated, skipped = asyncio.run(
+        migrate(conversations_collection, message_buckets_collection, args.bucket_size)
+    )
+    print(f"Migrated {migrated} conversations, skipped {skipped}")
+
+
+if __name__ == "__main__":
+    main()
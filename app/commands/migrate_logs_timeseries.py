@@ -0,0 +1,127 @@
+"""Copy logs from the regular collection into the time-series collection.
+
+Usage: python -m app.commands.migrate_logs_timeseries
+           [--batch-size N] [--workers N] [--after ID]
+
+The _id space is split into ranges by ObjectId creation time and parallel
+workers copy one range at a time, each through its own cursor. The time-series
+collection has no unique _id index, so resume an interrupted run with --after
+set to the last reported safe id instead of starting over.
+"""
+import argparse
+import asyncio
+from bson import ObjectId
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.config import LOG_TIMESERIES_COLLECTION  # noqa: E402
+from app.cruds.log_crud import with_meta  # noqa: E402
+from app.db import get_db  # noqa: E402
+from app.indexes import ensure_timeseries_collection  # noqa: E402
+
+
+RANGES_PER_WORKER = 4
+
+
+def id_ranges(
+    first: ObjectId, last: ObjectId, count: int
+) -> list[tuple[ObjectId | None, ObjectId | None]]:
+    """Split [first, last] into up to `count` [low, high) ranges of equal creation
+    time; None is unbounded."""
+    start, end = first.generation_time, last.generation_time
+    step = (end - start) / count
+    bounds = sorted({ObjectId.from_datetime(start + step * i) for i in range(1, count)})
+    bounds = [bound for bound in bounds if first < bound <= last]
+    return list(zip([None, *bounds], [*bounds, None]))
+
+
+async def copy_logs(
+    source, target, batch_size: int, workers: int, after: ObjectId | None = None
+) -> int:
+    base = {"$gt": after} if after is not None else {}
+    query = {"_id": base} if base else {}
+    first = await source.find_one(query, projection={"_id": 1}, sort=[("_id", 1)])
+    if first is None:
+        return 0
+    last = await source.find_one(query, projection={"_id": 1}, sort=[("_id", -1)])
+    ranges = asyncio.Queue()
+    for item in enumerate(
+        id_ranges(first["_id"], last["_id"], workers * RANGES_PER_WORKER)
+    ):
+        ranges.put_nowait(item)
+
+    copied = 0
+    # ranges finish out of order, only ids below the first unfinished range are
+    # safe to resume from
+    finished, next_seq, resume_id = {}, 0, after
+
+    async def copy_range(
+        low: ObjectId | None, high: ObjectId | None
+    ) -> ObjectId | None:
+        nonlocal copied
+        id_range = dict(base)
+        if low is not None:
+            id_range["$gte"] = low
+        if high is not None:
+            id_range["$lt"] = high
+        batch, last_id = [], None
+        cursor = source.find(
+            {"_id": id_range} if id_range else {},
+            sort=[("_id", 1)],
+            batch_size=batch_size,
+        )
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                await target.insert_many(
+                    [with_meta(doc) for doc in batch], ordered=False
+                )
+                copied += len(batch)
+                batch, last_id = [], doc["_id"]
+        if batch:
+            await target.insert_many([with_meta(doc) for doc in batch], ordered=False)
+            copied += len(batch)
+            last_id = batch[-1]["_id"]
+        return last_id
+
+    async def work():
+        nonlocal next_seq, resume_id
+        while not ranges.empty():
+            seq, (low, high) = ranges.get_nowait()
+            finished[seq] = await copy_range(low, high)
+            while next_seq in finished:
+                resume_id = finished.pop(next_seq) or resume_id
+                next_seq += 1
+            print(f"Copied {copied} logs, safe to resume after {resume_id}")
+
+    tasks = [asyncio.create_task(work()) for _ in range(workers)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+    return copied
+
+
+async def migrate(batch_size: int, workers: int, after: ObjectId | None) -> int:
+    db = get_db()
+    await ensure_timeseries_collection(db, LOG_TIMESERIES_COLLECTION)
+    return await copy_logs(
+        db.logs_new, db[LOG_TIMESERIES_COLLECTION], batch_size, workers, after
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--after", type=ObjectId, default=None)
+    args = parser.parse_args()
+
+    copied = asyncio.run(migrate(args.batch_size, args.workers, args.after))
+    print(f"Migrated {copied} logs into {LOG_TIMESERIES_COLLECTION}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Recompute log_rollups from the raw logs.
+
+Usage: python -m app.commands.rebuild_log_rollups [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+"""
+import argparse
+import asyncio
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.config import LOG_TIMESERIES  # noqa: E402
+from app.cruds.rollup_crud import rebuild_rollups  # noqa: E402
+from app.db import logs_collection, log_rollups_collection  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--from", dest="start", type=datetime.fromisoformat, default=None
+    )
+    parser.add_argument("--to", dest="end", type=datetime.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    asyncio.run(
+        rebuild_rollups(
+            logs_collection,
+            log_rollups_collection,
+            args.start,
+            args.end,
+            timeseries=LOG_TIMESERIES,
+        )
+    )
+    print("Rebuilt log rollups")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import os
+
+
+# "direct" inserts every log on its own request, "acknowledged" queues it in the
+# log writer and waits for the batched flush, "accepted" queues it and returns 202
+LOG_WRITE_MODE = os.getenv("LOG_WRITE_MODE", "direct")
+LOG_BUFFER_MAX_SIZE = int(os.getenv("LOG_BUFFER_MAX_SIZE", "10000"))
+LOG_BUFFER_FLUSH_SIZE = int(os.getenv("LOG_BUFFER_FLUSH_SIZE", "500"))
+LOG_BUFFER_FLUSH_INTERVAL = float(os.getenv("LOG_BUFFER_FLUSH_INTERVAL", "0.05"))
+
+if LOG_WRITE_MODE not in ("direct", "acknowledged", "accepted"):
+    raise ValueError(f"Unknown LOG_WRITE_MODE: {LOG_WRITE_MODE}")
+
+# "embedded" keeps messages in the conversation document, "bucketed" stores new
+# conversations as a header plus fixed-size message buckets. Reads and deletes
+# handle both shapes regardless of the mode.
+CONV_STORAGE_MODE = os.getenv("CONV_STORAGE_MODE", "embedded")
+MESSAGE_BUCKET_SIZE = int(os.getenv("MESSAGE_BUCKET_SIZE", "200"))
+
+if CONV_STORAGE_MODE not in ("embedded", "bucketed"):
+    raise ValueError(f"Unknown CONV_STORAGE_MODE: {CONV_STORAGE_MODE}")
+
+# Motor cursor batch size used when streaming conversation listings
+CONV_STREAM_BATCH_SIZE = int(os.getenv("CONV_STREAM_BATCH_SIZE", "50"))
+
+# "create" builds missing indexes in the background at startup, "verify" only
+# reports drift, "off" skips the check
+MONGO_INDEX_MODE = os.getenv("MONGO_INDEX_MODE", "verify")
+
+if MONGO_INDEX_MODE not in ("create", "verify", "off"):
+    raise ValueError(f"Unknown MONGO_INDEX_MODE: {MONGO_INDEX_MODE}")
+
+# Maintain log_rollups on every log insert. Run
+# `python -m app.commands.rebuild_log_rollups` after enabling it to backfill days
+# that were written without rollups.
+LOG_ROLLUPS_ENABLED = os.getenv("LOG_ROLLUPS_ENABLED", "false").lower() == "true"
+
+# "timeseries" stores logs in a MongoDB time-series collection (start_time as
+# timeField, {user_id, type} as metaField) named LOG_TIMESERIES_COLLECTION.
+# Copy existing logs with `python -m app.commands.migrate_logs_timeseries`.
+LOG_STORAGE_MODE = os.getenv("LOG_STORAGE_MODE", "standard")
+LOG_TIMESERIES_COLLECTION = os.getenv("LOG_TIMESERIES_COLLECTION", "logs_ts")
+LOG_TIMESERIES = LOG_STORAGE_MODE == "timeseries"
+
+if LOG_STORAGE_MODE not in ("standard", "timeseries"):
+    raise ValueError(f"Unknown LOG_STORAGE_MODE: {LOG_STORAGE_MODE}")
+
+# In-process cache for GET /users/{user_id}; USER_CACHE_SIZE=0 disables it
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+
+
+# "mongo" talks to MONGO_KEY, "memory" keeps every collection in process (tests,
+# benchmarks, local runs without a cluster); nothing is persisted in that mode
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")
+
+if STORAGE_BACKEND not in ("mongo", "memory"):
+    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+
+
+def _optional_int(name: str) -> int | None:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+# Mongo client. The client is created on first use (normally by the app lifespan),
+# unset optional values fall back to the driver defaults. MONGO_COMPRESSORS is a
+# comma separated preference list such as "zstd,snappy,zlib"; zstd and snappy need
+# the zstandard / python-snappy packages installed.
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "swp_db")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = _optional_int("MONGO_MAX_IDLE_TIME_MS")
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(
+    os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "30000")
+)
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "20000"))
+MONGO_SOCKET_TIMEOUT_MS = _optional_int("MONGO_SOCKET_TIMEOUT_MS")
+# open this many pooled connections at startup, before the first request is served
+MONGO_WARMUP_CONNECTIONS = int(os.getenv("MONGO_WARMUP_CONNECTIONS", "0"))
+
+# Request and Mongo command metrics served at /metrics in the Prometheus text format
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Log Mongo commands slower than MONGO_SLOW_OP_MS (unset disables it) with their
+# redacted shape and the calling route. With MONGO_SLOW_OP_EXPLAIN=true each slow
+# shape is also explained ("executionStats"), at most once per interval, and the
+# result is served at /admin/slow-ops.
+MONGO_SLOW_OP_MS = _optional_int("MONGO_SLOW_OP_MS")
+MONGO_SLOW_OP_EXPLAIN = os.getenv("MONGO_SLOW_OP_EXPLAIN", "false").lower() == "true"
+MONGO_SLOW_OP_EXPLAIN_INTERVAL = float(
+    os.getenv("MONGO_SLOW_OP_EXPLAIN_INTERVAL", "600")
+)
+
+# Per-request profiling. A request is profiled when it sends an X-Profile-Token
+# header equal to PROFILE_TOKEN or when PROFILE_SAMPLE_RATE (0..1) samples it;
+# with neither set the middleware is not installed. Each profile is written to
+# PROFILE_DIR as a cProfile .prof file plus a .json summary.
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN") or None
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "reports/profiles")
+PROFILING_ENABLED = PROFILE_TOKEN is not None or PROFILE_SAMPLE_RATE > 0
+
+# Event loop lag is sampled every LOOP_LAG_INTERVAL seconds (0 disables it) and
+# reported by /health and /metrics. LOOP_BLOCK_THRESHOLD_MS turns on a debug
+# watchdog thread that logs the loop thread's stack whenever the loop has been
+# blocked for longer than that.
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+LOOP_BLOCK_THRESHOLD_MS = _optional_int("LOOP_BLOCK_THRESHOLD_MS")
@@ -1,9 +1,43 @@
-from .user_crud import create_user, read_user_by_id, update_user_by_id, delete_user_by_id
-from .conv_crud import create_conv, read_conv, update_conv, delete_conv, create_message, read_user_conv
-from .log_crud import create_log, read_log, update_log, delete_log
+from .user_crud import (
+    create_user,
+    read_user_by_id,
+    read_user_etag,
+    update_user_by_id,
+    patch_user_by_id,
+    record_user_launch,
+    delete_user_by_id,
+)
+from .conv_crud import (
+    create_conv,
+    read_conv,
+    read_conv_etag,
+    update_conv,
+    delete_conv,
+    create_message,
+    create_messages,
+    read_user_conv,
+)
+from .log_crud import create_log, create_logs, read_log, update_log, delete_log
 
 __all__ = [
-    "create_user", "read_user_by_id", "update_user_by_id", "delete_user_by_id",
-    "create_conv", "read_conv", "update_conv", "delete_conv", "create_message", "read_user_conv",
-    "create_log", "read_log", "update_log", "delete_log"
-] 
\ No newline at end of file
+    "create_user",
+    "read_user_by_id",
+    "read_user_etag",
+    "update_user_by_id",
+    "patch_user_by_id",
+    "record_user_launch",
+    "delete_user_by_id",
+    "create_conv",
+    "read_conv",
+    "read_conv_etag",
+    "update_conv",
+    "delete_conv",
+    "create_message",
+    "create_messages",
+    "read_user_conv",
+    "create_log",
+    "create_logs",
+    "read_log",
+    "update_log",
+    "delete_log",
+]
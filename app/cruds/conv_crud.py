@@ -1,51 +1,509 @@
-from motor.motor_asyncio import AsyncIOMotorCollection
-from app.models.conv import ConversationIn, Message
+from typing import AsyncIterator
+from app.storage import Collection
+from pymongo import ReturnDocument, UpdateOne
+from app.models.conv import ConversationIn, ConversationDB, Message
+from app.etag import ETAG_FIELD, new_etag
+from app.config import MESSAGE_BUCKET_SIZE
 from bson import ObjectId, errors
+from pymongo.errors import PyMongoError
 
 
-async def create_conv(collection: AsyncIOMotorCollection, conv: ConversationIn) -> str:
-    result = await collection.insert_one(conv.model_dump(by_alias=True, exclude_unset=True))
+# Bucketed conversations keep only a header ({_id, user_id, message_count,
+# bucket_size}) in the conversations collection. Messages live in bucket
+# documents {conversation_id, seq, count, messages} holding up to bucket_size
+# messages each, so message i is stored in bucket i // bucket_size. Writes go by
+# the shape of the stored document, CONV_STORAGE_MODE only decides the shape of
+# conversations that are created or replaced.
+
+
+def is_bucketed(doc: dict) -> bool:
+    return "bucket_size" in doc
+
+
+def split_into_buckets(
+    conv_id: ObjectId, messages: list[dict], bucket_size: int
+) -> list[dict]:
+    return [
+        {
+            "conversation_id": conv_id,
+            "seq": seq,
+            "count": len(messages[start:start + bucket_size]),
+            "messages": messages[start:start + bucket_size],
+        }
+        for seq, start in enumerate(range(0, len(messages), bucket_size))
+    ]
+
+
+def _bucketed_header(doc: dict, bucket_size: int) -> dict:
+    header = {k: v for k, v in doc.items() if k != "messages"}
+    header["message_count"] = len(doc.get("messages") or [])
+    header["bucket_size"] = bucket_size
+    return header
+
+
+def _strip_header(doc: dict, messages: list[dict]) -> dict:
+    conv = {k: v for k, v in doc.items() if k not in ("message_count", "bucket_size")}
+    conv["messages"] = messages
+    return conv
+
+
+async def _write_buckets(
+    buckets: Collection, conv_id: ObjectId, messages: list[dict], bucket_size: int
+):
+    await buckets.delete_many({"conversation_id": conv_id})
+    if messages:
+        await buckets.insert_many(split_into_buckets(conv_id, messages, bucket_size))
+
+
+async def load_bucketed_messages(buckets: Collection, docs: list[dict]) -> list[dict]:
+    conv_ids = [doc["_id"] for doc in docs if is_bucketed(doc)]
+    if not conv_ids:
+        return docs
+
+    messages = {conv_id: [] for conv_id in conv_ids}
+    cursor = buckets.find(
+        {"conversation_id": {"$in": conv_ids}},
+        sort=[("conversation_id", 1), ("seq", 1)],
+    )
+    async for bucket in cursor:
+        messages[bucket["conversation_id"]].extend(bucket["messages"])
+
+    return [
+        _strip_header(doc, messages[doc["_id"]]) if is_bucketed(doc) else doc
+        for doc in docs
+    ]
+
+
+async def create_conv(
+    collection: Collection,
+    conv: ConversationIn,
+    buckets: Collection | None = None,
+    bucket_size: int = MESSAGE_BUCKET_SIZE,
+) -> str:
+    doc = conv.model_dump(by_alias=True, exclude_unset=True)
+    doc["_id"] = ConversationDB.model_fields["id"].default_factory()
+    doc[ETAG_FIELD] = new_etag()
+    if buckets is None:
+        result = await collection.insert_one(doc)
+        return str(result.inserted_id)
+
+    result = await collection.insert_one(_bucketed_header(doc, bucket_size))
+    if doc.get("messages"):
+        try:
+            await buckets.insert_many(
+                split_into_buckets(doc["_id"], doc["messages"], bucket_size)
+            )
+        except PyMongoError:
+            # A header without its buckets would report messages it doesn't have.
+            await buckets.delete_many({"conversation_id": doc["_id"]})
+            await collection.delete_one({"_id": doc["_id"]})
+            raise
     return str(result.inserted_id)
 
 
-async def create_message(collection: AsyncIOMotorCollection, id: str, message: Message) -> bool:
+async def _push_embedded(collection: Collection, oid: ObjectId, push) -> bool:
+    result = await collection.update_one(
+        {"_id": oid, "bucket_size": {"$exists": False}},
+        {"$push": {"messages": push}, "$set": {ETAG_FIELD: new_etag()}}
+    )
+    return result.modified_count > 0
+
+
+async def _push_bucketed(
+    collection: Collection, buckets: Collection, oid: ObjectId, message_doc: dict
+) -> bool:
+    header = await collection.find_one_and_update(
+        {"_id": oid, "bucket_size": {"$exists": True}},
+        {"$inc": {"message_count": 1}, "$set": {ETAG_FIELD: new_etag()}},
+        projection={"message_count": 1, "bucket_size": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if header is None:
+        return False
+    seq = (header["message_count"] - 1) // header["bucket_size"]
+    try:
+        await buckets.update_one(
+            {"conversation_id": oid, "seq": seq},
+            {"$push": {"messages": message_doc}, "$inc": {"count": 1}},
+            upsert=True,
+        )
+    except PyMongoError:
+        # Release the reserved position unless another append already followed.
+        await collection.update_one(
+            {"_id": oid, "message_count": header["message_count"]},
+            {"$inc": {"message_count": -1}, "$set": {ETAG_FIELD: new_etag()}},
+        )
+        raise
+    return True
+
+
+async def create_message(
+    collection: Collection,
+    id: str,
+    message: Message,
+    buckets: Collection | None = None,
+    bucketed_first: bool = True,
+) -> bool:
+    """Append `message` to an embedded or (when `buckets` is given) bucketed
+    conversation.
+
+    Each write only matches its own shape, `bucketed_first` picks the one tried first.
+    """
     try:
         oid = ObjectId(id)
     except errors.InvalidId:
         return False
-    result = await collection.update_one(
-        {"_id": oid},
-        {"$push": {"messages": message.model_dump(by_alias=True, exclude_unset=True)}}
+    message_doc = message.model_dump(by_alias=True, exclude_unset=True)
+
+    if buckets is None:
+        return await _push_embedded(collection, oid, message_doc)
+    if bucketed_first:
+        return (
+            await _push_bucketed(collection, buckets, oid, message_doc)
+            or await _push_embedded(collection, oid, message_doc)
+        )
+    return (
+        await _push_embedded(collection, oid, message_doc)
+        or await _push_bucketed(collection, buckets, oid, message_doc)
     )
-    return result.modified_count > 0
 
 
-async def read_conv(collection: AsyncIOMotorCollection, id: str) -> dict | None:
+async def _push_many_bucketed(
+    collection: Collection, buckets: Collection, oid: ObjectId, message_docs: list[dict]
+) -> bool:
+    header = await collection.find_one_and_update(
+        {"_id": oid, "bucket_size": {"$exists": True}},
+        {
+            "$inc": {"message_count": len(message_docs)},
+            "$set": {ETAG_FIELD: new_etag()},
+        },
+        projection={"message_count": 1, "bucket_size": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if header is None:
+        return False
+    bucket_size = header["bucket_size"]
+    start = header["message_count"] - len(message_docs)
+    per_bucket = {}
+    for index, message_doc in enumerate(message_docs, start):
+        per_bucket.setdefault(index // bucket_size, []).append(message_doc)
+    # bucket position of the first message in each bucket
+    offsets = {seq: max(start - seq * bucket_size, 0) for seq in per_bucket}
+    try:
+        await buckets.bulk_write([
+            UpdateOne(
+                {"conversation_id": oid, "seq": seq},
+                {"$push": {"messages": {"$each": docs}}, "$inc": {"count": len(docs)}},
+                upsert=True,
+            )
+            for seq, docs in per_bucket.items()
+        ], ordered=False)
+    except PyMongoError:
+        # Without a transaction the batch is undone by hand: buckets this
+        # write reached are cut back, then the reserved positions released.
+        # Each step is skipped if another append already came after this one.
+        for seq, docs in per_bucket.items():
+            await buckets.update_one(
+                {"conversation_id": oid, "seq": seq, "count": offsets[seq] + len(docs)},
+                {
+                    "$push": {"messages": {"$each": [], "$slice": offsets[seq]}},
+                    "$inc": {"count": -len(docs)},
+                },
+            )
+        await collection.update_one(
+            {"_id": oid, "message_count": header["message_count"]},
+            {
+                "$inc": {"message_count": -len(message_docs)},
+                "$set": {ETAG_FIELD: new_etag()},
+            },
+        )
+        raise
+    return True
+
+
+async def create_messages(
+    collection: Collection,
+    id: str,
+    messages: list[Message],
+    buckets: Collection | None = None,
+    bucketed_first: bool = True,
+    max_history: int | None = None,
+) -> bool:
+    """Append `messages` to an embedded or (when `buckets` is given) bucketed
+    conversation.
+
+    `max_history` keeps only the last messages of embedded conversations. It
+    removes messages from the front, which shifts the positions read_messages
+    `before` cursors refer to, so a client paging back through a trimmed
+    conversation may see messages twice or miss some.
+    """
+    try:
+        oid = ObjectId(id)
+    except errors.InvalidId:
+        return False
+    message_docs = [
+        message.model_dump(by_alias=True, exclude_unset=True) for message in messages
+    ]
+    push = {"$each": message_docs}
+    if max_history is not None:
+        push["$slice"] = -max_history
+
+    if buckets is None:
+        return await _push_embedded(collection, oid, push)
+    if max_history is not None:
+        if await _push_embedded(collection, oid, push):
+            return True
+        if await collection.find_one(
+            {"_id": oid, "bucket_size": {"$exists": True}}, projection={"_id": 1}
+        ):
+            raise ValueError("max_history is not supported for bucketed conversations")
+        return False
+    if bucketed_first:
+        return (
+            await _push_many_bucketed(collection, buckets, oid, message_docs)
+            or await _push_embedded(collection, oid, push)
+        )
+    return (
+        await _push_embedded(collection, oid, push)
+        or await _push_many_bucketed(collection, buckets, oid, message_docs)
+    )
+
+
+def conv_projection(fields: frozenset[str] | None) -> dict | None:
+    """Projection returning only `fields` (plus the etag), None for whole documents."""
+    if fields is None:
+        return None
+    projection = {field: 1 for field in fields}
+    projection[ETAG_FIELD] = 1
+    if "messages" in fields:
+        # bucketed headers are recognised by these, their messages are loaded separately
+        projection["message_count"] = 1
+        projection["bucket_size"] = 1
+    return projection
+
+
+async def read_conv(
+    collection: Collection,
+    id: str,
+    buckets: Collection | None = None,
+    fields: frozenset[str] | None = None,
+) -> dict | None:
+    try:
+        oid = ObjectId(id)
+    except errors.InvalidId:
+        return None
+    doc = await collection.find_one({"_id": oid}, projection=conv_projection(fields))
+    if doc is None or buckets is None or not is_bucketed(doc):
+        return doc
+    conv = (await load_bucketed_messages(buckets, [doc]))[0]
+    # create_message bumps the header before pushing into the bucket, don't
+    # hand out the new etag together with the old messages
+    if len(conv["messages"]) != doc["message_count"]:
+        conv.pop(ETAG_FIELD, None)
+    return conv
+
+
+async def read_conv_etag(collection: Collection, id: str) -> str | None:
     try:
         oid = ObjectId(id)
     except errors.InvalidId:
         return None
-    return await collection.find_one({"_id": oid})
+    doc = await collection.find_one({"_id": oid}, projection={ETAG_FIELD: 1})
+    return doc.get(ETAG_FIELD) if doc else None
+
+
+async def read_messages(
+    collection: Collection,
+    id: str,
+    limit: int,
+    before: int | None = None,
+    buckets: Collection | None = None,
+) -> tuple[list[dict], int] | None:
+    """Return up to `limit` messages preceding index `before` (or the latest ones)
+    together with the index of the first returned message."""
+    try:
+        oid = ObjectId(id)
+    except errors.InvalidId:
+        return None
+
+    # the header fields come along so bucketed conversations need no extra lookup
+    projection = {"message_count": 1, "bucket_size": 1}
+    if before is None:
+        projection["total"] = {"$size": {"$ifNull": ["$messages", []]}}
+        projection["messages"] = {"$slice": -limit}
+    else:
+        start = max(before - limit, 0)
+        projection["messages"] = {"$slice": [start, max(before - start, 1)]}
+    doc = await collection.find_one({"_id": oid}, projection=projection)
+    if doc is None:
+        return None
+    if is_bucketed(doc):
+        if buckets is None:
+            return None
+        return await _read_bucketed_messages(buckets, doc, limit, before)
+
+    messages = doc.get("messages") or []
+    if before is None:
+        return messages, doc["total"] - len(messages)
+    if before <= 0:
+        return [], 0
+    return messages, start
 
 
-async def read_user_conv(collection: AsyncIOMotorCollection, user_id: int) -> list[dict]:
-    cursor = collection.find({"user_id": user_id})
-    return await cursor.to_list(length=100)
+async def _read_bucketed_messages(
+    buckets: Collection, header: dict, limit: int, before: int | None
+) -> tuple[list[dict], int]:
+    bucket_size = header["bucket_size"]
+    end = (
+        header["message_count"]
+        if before is None
+        else min(before, header["message_count"])
+    )
+    start = max(end - limit, 0)
+    if end <= start:
+        return [], start
+
+    first_seq, last_seq = start // bucket_size, (end - 1) // bucket_size
+    cursor = buckets.find(
+        {
+            "conversation_id": header["_id"],
+            "seq": {"$gte": first_seq, "$lte": last_seq},
+        },
+        sort=[("seq", 1)],
+    )
+    messages = []
+    async for bucket in cursor:
+        messages.extend(bucket["messages"])
+    offset = first_seq * bucket_size
+    return messages[start - offset:end - offset], start
+
+
+async def read_user_conv(
+    collection: Collection,
+    user_id: int,
+    limit: int = 100,
+    after: str | None = None,
+    buckets: Collection | None = None,
+    fields: frozenset[str] | None = None,
+) -> list[dict]:
+    query = {"user_id": user_id}
+    if after is not None:
+        query["_id"] = {"$gt": ObjectId(after)}
+    cursor = collection.find(
+        query, projection=conv_projection(fields), sort=[("_id", 1)], limit=limit
+    )
+    docs = await cursor.to_list(length=limit)
+    if buckets is None:
+        return docs
+    return await load_bucketed_messages(buckets, docs)
 
 
-async def update_conv(collection: AsyncIOMotorCollection, id: str, conv: ConversationIn) -> bool:
+async def iter_user_conv(
+    collection: Collection,
+    user_id: int,
+    after: str | None = None,
+    limit: int = 0,
+    batch_size: int = 50,
+    buckets: Collection | None = None,
+    fields: frozenset[str] | None = None,
+) -> AsyncIterator[dict]:
+    query = {"user_id": user_id}
+    if after is not None:
+        query["_id"] = {"$gt": ObjectId(after)}
+    cursor = collection.find(
+        query,
+        projection=conv_projection(fields),
+        sort=[("_id", 1)],
+        limit=limit,
+        batch_size=batch_size,
+    )
+
+    chunk = []
+    async for doc in cursor:
+        if buckets is None:
+            yield doc
+            continue
+        chunk.append(doc)
+        if len(chunk) >= batch_size:
+            for conv in await load_bucketed_messages(buckets, chunk):
+                yield conv
+            chunk = []
+    if chunk:
+        for conv in await load_bucketed_messages(buckets, chunk):
+            yield conv
+
+
+async def update_conv(
+    collection: Collection,
+    id: str,
+    conv: ConversationIn,
+    buckets: Collection | None = None,
+    bucket_size: int = MESSAGE_BUCKET_SIZE,
+    bucketed: bool | None = None,
+) -> bool:
+    """Replace a conversation, stored bucketed if `bucketed` (by default whenever
+    `buckets` is given). Buckets of the replaced version are removed either way."""
     try:
         oid = ObjectId(id)
     except errors.InvalidId:
         return False
-    result = await collection.replace_one({"_id": oid}, conv.model_dump(by_alias=True, exclude_unset=True))
-    return result.modified_count > 0
+    if bucketed is None:
+        bucketed = buckets is not None
+    doc = conv.model_dump(by_alias=True, exclude_unset=True)
+    doc[ETAG_FIELD] = new_etag()
+    if buckets is None:
+        result = await collection.replace_one({"_id": oid}, doc)
+        return result.modified_count > 0
 
+    replaced = await collection.find_one_and_replace(
+        {"_id": oid},
+        _bucketed_header(doc, bucket_size) if bucketed else doc,
+        projection={"bucket_size": 1},
+    )
+    if replaced is None:
+        return False
+    if bucketed or is_bucketed(replaced):
+        await _write_buckets(
+            buckets, oid, (doc.get("messages") or []) if bucketed else [], bucket_size
+        )
+    return True
 
-async def delete_conv(collection: AsyncIOMotorCollection, id: str) -> bool:
+
+async def delete_conv(
+    collection: Collection,
+    id: str,
+    buckets: Collection | None = None,
+) -> bool:
     try:
         oid = ObjectId(id)
     except errors.InvalidId:
         return False
-    result = await collection.delete_one({"_id": oid})
-    return result.deleted_count > 0
+    if buckets is None:
+        result = await collection.delete_one({"_id": oid})
+        return result.deleted_count > 0
+
+    doc = await collection.find_one_and_delete(
+        {"_id": oid}, projection={"bucket_size": 1}
+    )
+    if doc is None:
+        return False
+    if is_bucketed(doc):
+        await buckets.delete_many({"conversation_id": oid})
+    return True
+
+
+async def migrate_conv_to_buckets(
+    collection: Collection,
+    buckets: Collection,
+    doc: dict,
+    bucket_size: int = MESSAGE_BUCKET_SIZE,
+) -> bool:
+    messages = doc.get("messages") or []
+    await _write_buckets(buckets, doc["_id"], messages, bucket_size)
+    # only swap in the header if no message was appended since `doc` was read
+    unchanged = {"$size": len(messages)} if "messages" in doc else {"$exists": False}
+    result = await collection.replace_one(
+        {"_id": doc["_id"], "bucket_size": {"$exists": False}, "messages": unchanged},
+        _bucketed_header(doc, bucket_size),
+    )
+    return result.modified_count > 0
@@ -1,22 +1,401 @@
-from motor.motor_asyncio import AsyncIOMotorCollection
+import logging
+from datetime import datetime
+from typing import AsyncIterator
+from app.storage import Collection
 from bson import ObjectId
-from app.models.log import LogIn
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
+from app.models.log import LogIn, LogDB
+from app.cruds.rollup_crud import apply_log_rollups, remove_log_rollups
+from app.indexes import (
+    LOG_INDEXES,
+    TIMESERIES_LOG_INDEXES,
+    MissingIndexError,
+    index_key,
+    require_index,
+)
 
+logger = logging.getLogger(__name__)
 
-async def create_log(collection: AsyncIOMotorCollection, log: LogIn):
-    result = await collection.insert_one(log.model_dump(by_alias=True, exclude_unset=True))
+
+# In time-series mode user_id and type are stored only under {"meta": {...}},
+# the collection's metaField, so each bucket keeps them once. Filters, indexes
+# and pipelines use the meta.* paths and reads move the fields back up.
+META_FIELDS = ("user_id", "type")
+
+
+def build_log_doc(log: LogIn) -> dict:
+    doc = log.model_dump(by_alias=True, exclude_unset=True)
+    doc["_id"] = LogDB.model_fields["id"].default_factory()
+    return doc
+
+
+def with_meta(doc: dict) -> dict:
+    stored = {field: value for field, value in doc.items() if field not in META_FIELDS}
+    stored["meta"] = {field: doc[field] for field in META_FIELDS}
+    return stored
+
+
+def without_meta(doc: dict | None) -> dict | None:
+    if doc is None or "meta" not in doc:
+        return doc
+    doc = dict(doc)
+    return {**doc.pop("meta"), **doc}
+
+
+def stored_field(field: str, timeseries: bool = False) -> str:
+    return f"meta.{field}" if timeseries and field in META_FIELDS else field
+
+
+async def update_rollups(
+    rollups: Collection | None, docs: list[dict], removed: list[dict] = ()
+):
+    """Add `docs` to the rollups, take the `removed` (deleted or replaced) logs out."""
+    if rollups is None or not (docs or removed):
+        return
+    # the logs are already stored, a failed rollup is fixed by rebuild_log_rollups
+    try:
+        if removed:
+            await remove_log_rollups(rollups, list(removed))
+        if docs:
+            await apply_log_rollups(rollups, docs)
+    except PyMongoError:
+        logger.exception(
+            "Failed to update rollups for %d logs", len(docs) + len(removed)
+        )
+
+
+async def create_log(
+    collection: Collection,
+    log: LogIn,
+    rollups: Collection | None = None,
+    timeseries: bool = False,
+):
+    doc = build_log_doc(log)
+    result = await collection.insert_one(with_meta(doc) if timeseries else doc)
+    await update_rollups(rollups, [doc])
     return str(result.inserted_id)
 
 
-async def read_log(collection: AsyncIOMotorCollection, id: str):
-    return await collection.find_one({"_id": ObjectId(id)})
+async def insert_log_docs(
+    collection: Collection,
+    docs: list[dict],
+    rollups: Collection | None = None,
+    timeseries: bool = False,
+) -> list[dict]:
+    if not docs:
+        return []
+
+    errors = {}
+    try:
+        await collection.insert_many(
+            [with_meta(doc) for doc in docs] if timeseries else docs, ordered=False
+        )
+    except BulkWriteError as e:
+        errors = {
+            err["index"]: err.get("errmsg", "Write failed")
+            for err in e.details.get("writeErrors", [])
+        }
+    await update_rollups(
+        rollups, [doc for i, doc in enumerate(docs) if i not in errors]
+    )
+
+    return [
+        (
+            {"_id": None, "error": errors[i]}
+            if i in errors
+            else {"_id": str(doc["_id"]), "error": None}
+        )
+        for i, doc in enumerate(docs)
+    ]
+
+
+async def create_logs(
+    collection: Collection,
+    logs: list[LogIn],
+    rollups: Collection | None = None,
+    timeseries: bool = False,
+) -> list[dict]:
+    return await insert_log_docs(
+        collection,
+        [build_log_doc(log) for log in logs],
+        rollups=rollups,
+        timeseries=timeseries,
+    )
+
+
+async def read_log(
+    collection: Collection,
+    id: str,
+    fields: frozenset[str] | None = None,
+    timeseries: bool = False,
+):
+    projection = (
+        None
+        if fields is None
+        else {stored_field(field, timeseries): 1 for field in fields}
+    )
+    return without_meta(
+        await collection.find_one({"_id": ObjectId(id)}, projection=projection)
+    )
+
+
+# Equality filters accepted by find_logs and the index serving each combination.
+# All of them end in (start_time, _id) so time ranges and keyset pages stay on the
+# index.
+LOG_QUERY_INDEXES = {
+    frozenset(): "start_time_id",
+    frozenset({"user_id"}): "user_id_start_time_id",
+    frozenset({"user_id", "type"}): "user_id_type_start_time_id",
+    frozenset({"user_id", "activity_id"}): "user_id_activity_id_start_time_id",
+    frozenset({"activity_id"}): "activity_id_start_time_id",
+    frozenset({"type"}): "type_start_time_id",
+    frozenset({"build_version"}): "build_version_start_time_id",
+}
+
+
+def log_index_hint(
+    collection: Collection, index: str, timeseries: bool = False
+) -> list[tuple[str, int]]:
+    """Hint for `index` given by its key pattern, so an index built under another
+    name still serves it. Raises MissingIndexError if the index is known to be missing.
+    """
+    require_index(collection.name, index)
+    return index_key(TIMESERIES_LOG_INDEXES if timeseries else LOG_INDEXES, index)
+
+
+def _missing_hint(error: OperationFailure, index: str) -> MissingIndexError | None:
+    # an index dropped after the last check is only noticed by the server
+    if "hint provided does not correspond to an existing index" in str(error):
+        return MissingIndexError(f"Index {index} is missing")
+    return None
+
+
+def build_log_query(
+    filters: dict,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    after: tuple[datetime, ObjectId] | None = None,
+    timeseries: bool = False,
+) -> tuple[dict, str]:
+    index = LOG_QUERY_INDEXES.get(frozenset(filters))
+    if index is None:
+        raise ValueError(
+            f"Unsupported filter combination: {', '.join(sorted(filters))}"
+        )
+    if not filters and start is None:
+        raise ValueError("A lower time bound is required when no other filter is given")
+
+    query = {stored_field(field, timeseries): value for field, value in filters.items()}
+    time_range = {}
+    if start is not None:
+        time_range["$gte"] = start
+    if end is not None:
+        time_range["$lt"] = end
+    if time_range:
+        query["start_time"] = time_range
+    if after is not None:
+        after_time, after_id = after
+        query["$or"] = [
+            {"start_time": {"$gt": after_time}},
+            {"start_time": after_time, "_id": {"$gt": after_id}},
+        ]
+    return query, index
+
+
+async def find_logs(
+    collection: Collection,
+    filters: dict,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    after: tuple[datetime, ObjectId] | None = None,
+    limit: int = 100,
+    timeseries: bool = False,
+) -> list[dict]:
+    query, index = build_log_query(filters, start, end, after, timeseries=timeseries)
+    cursor = collection.find(
+        query,
+        sort=[("start_time", 1), ("_id", 1)],
+        limit=limit,
+        hint=log_index_hint(collection, index, timeseries=timeseries),
+    )
+    try:
+        docs = await cursor.to_list(length=limit)
+    except OperationFailure as e:
+        raise _missing_hint(e, index) or e
+    return [without_meta(doc) for doc in docs] if timeseries else docs
+
+
+async def iter_logs(
+    collection: Collection,
+    filters: dict,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    after: tuple[datetime, ObjectId] | None = None,
+    limit: int = 0,
+    batch_size: int = 500,
+    timeseries: bool = False,
+) -> AsyncIterator[dict]:
+    query, index = build_log_query(filters, start, end, after, timeseries=timeseries)
+    cursor = collection.find(
+        query,
+        sort=[("start_time", 1), ("_id", 1)],
+        limit=limit,
+        hint=log_index_hint(collection, index, timeseries=timeseries),
+        batch_size=batch_size,
+    )
+    try:
+        async for doc in cursor:
+            yield without_meta(doc) if timeseries else doc
+    except OperationFailure as e:
+        raise _missing_hint(e, index) or e
+
+
+DURATION_PERCENTILES = [0.5, 0.9, 0.99]
+
+
+def duration_stats_pipeline(query: dict, timeseries: bool = False) -> list[dict]:
+    # $percentile needs MongoDB 7.0+, $dateTrunc 5.0+
+    return [
+        {"$match": query},
+        {
+            "$project": {
+                "type": "$meta.type" if timeseries else 1,
+                "day": {"$dateTrunc": {"date": "$start_time", "unit": "day"}},
+                "duration_ms": {"$subtract": ["$completion_time", "$start_time"]},
+            }
+        },
+        {
+            "$group": {
+                "_id": {"day": "$day", "type": "$type"},
+                "count": {"$sum": 1},
+                "mean_ms": {"$avg": "$duration_ms"},
+                "percentiles": {
+                    "$percentile": {
+                        "input": "$duration_ms",
+                        "p": DURATION_PERCENTILES,
+                        "method": "approximate",
+                    }
+                },
+            }
+        },
+        {"$sort": {"_id.day": 1, "_id.type": 1}},
+    ]
+
+
+async def duration_stats(
+    collection: Collection,
+    filters: dict,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    timeseries: bool = False,
+) -> list[dict]:
+    query, index = build_log_query(filters, start, end, timeseries=timeseries)
+    cursor = collection.aggregate(
+        duration_stats_pipeline(query, timeseries=timeseries),
+        hint=log_index_hint(collection, index, timeseries=timeseries),
+    )
+    try:
+        groups = [group async for group in cursor]
+    except OperationFailure as e:
+        raise _missing_hint(e, index) or e
+    return [
+        {
+            "day": group["_id"]["day"],
+            "type": group["_id"]["type"],
+            "count": group["count"],
+            "mean_ms": group["mean_ms"],
+            "p50_ms": group["percentiles"][0],
+            "p90_ms": group["percentiles"][1],
+            "p99_ms": group["percentiles"][2],
+        }
+        for group in groups
+    ]
+
+
+async def update_log(
+    collection: Collection,
+    id: str,
+    log: LogIn,
+    rollups: Collection | None = None,
+    timeseries: bool = False,
+):
+    doc = log.model_dump(by_alias=True, exclude_unset=True)
+    if not timeseries:
+        if rollups is None:
+            result = await collection.replace_one({"_id": ObjectId(id)}, doc)
+            return result.modified_count
+        # the replace only matches the document read, so the rollup delta is
+        # taken against exactly the log it replaced
+        while True:
+            old = await collection.find_one({"_id": ObjectId(id)})
+            if old is None:
+                return 0
+            result = await collection.replace_one(old, doc)
+            if result.matched_count:
+                break
+        if result.modified_count:
+            await update_rollups(rollups, [doc], removed=[old])
+        return result.modified_count
+
+    # time-series collections have no replacement updates and no unique _id:
+    # the new measurement is written first and the old one deleted after, so
+    # a failure leaves the old log in place rather than losing it
+    old = await collection.find_one({"_id": ObjectId(id)})
+    if old is None:
+        return 0
+    new = with_meta({**doc, "_id": ObjectId(id)})
+    if new == old:
+        return 0
+    await collection.insert_one(new)
+    await collection.delete_many(_measurement_filter(old, new))
+    await update_rollups(rollups, [doc], removed=[without_meta(old)])
+    return 1
+
+
+def _flatten(doc: dict, prefix: str = "") -> dict:
+    flat = {}
+    for field, value in doc.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{field}."))
+        else:
+            flat[f"{prefix}{field}"] = value
+    return flat
 
 
-async def update_log(collection: AsyncIOMotorCollection, id: str, log: LogIn):
-    result = await collection.replace_one({"_id": ObjectId(id)}, log.model_dump(by_alias=True, exclude_unset=True))
-    return result.modified_count
+def _measurement_filter(old: dict, new: dict) -> dict:
+    """Matches the stored `old` measurement but not `new`, which shares its _id."""
+    old, new = _flatten(old), _flatten(new)
+    query = {}
+    for field in old.keys() | new.keys():
+        if field not in old:
+            query[field] = {"$exists": False}
+        elif old[field] is None:
+            # a plain None would also match the field missing from `new`
+            query[field] = {"$type": "null"}
+        else:
+            query[field] = old[field]
+    return query
 
 
-async def delete_log(collection: AsyncIOMotorCollection, id: str):
-    result = await collection.delete_one({"_id": ObjectId(id)})
-    return result.deleted_count
\ No newline at end of file
+async def delete_log(
+    collection: Collection,
+    id: str,
+    rollups: Collection | None = None,
+    timeseries: bool = False,
+):
+    if timeseries:
+        old = (
+            await collection.find_one({"_id": ObjectId(id)})
+            if rollups is not None
+            else None
+        )
+        deleted = (await collection.delete_many({"_id": ObjectId(id)})).deleted_count
+    elif rollups is not None:
+        old = await collection.find_one_and_delete({"_id": ObjectId(id)})
+        deleted = int(old is not None)
+    else:
+        old = None
+        deleted = (await collection.delete_one({"_id": ObjectId(id)})).deleted_count
+    if deleted and old is not None:
+        await update_rollups(rollups, [], removed=[without_meta(old)])
+    return deleted
@@ -0,0 +1,213 @@
+from datetime import datetime, timedelta, timezone
+from app.storage import Collection
+from pymongo import DeleteOne, UpdateOne
+
+
+# log_rollups holds one document per (day, user_id, type, activity_id) with the
+# number of logs and their summed/min/max duration in milliseconds. Updating or
+# deleting a log takes its count and duration back out of its rollup (removing
+# rollups that reach zero logs), but min/max can't be narrowed that way; run
+# rebuild_log_rollups for exact min/max after logs were changed.
+ROLLUP_KEY = ("day", "user_id", "type", "activity_id")
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Mongo stores naive UTC datetimes, rollups must bucket the same way
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _epoch_ms(value: datetime) -> int:
+    # BSON datetimes keep whole milliseconds, durations are computed from the
+    # stored values so they match $subtract in rebuild_rollups_pipeline
+    return (_as_utc(value) - _EPOCH) // timedelta(milliseconds=1)
+
+
+def duration_ms(doc: dict) -> int:
+    return _epoch_ms(doc["completion_time"]) - _epoch_ms(doc["start_time"])
+
+
+def _group(docs: list[dict]) -> dict[tuple, dict]:
+    groups = {}
+    for doc in docs:
+        start = _as_utc(doc["start_time"])
+        duration = duration_ms(doc)
+        key = (
+            datetime(start.year, start.month, start.day),
+            doc["user_id"],
+            doc["type"],
+            doc["activity_id"],
+        )
+
+        group = groups.get(key)
+        if group is None:
+            groups[key] = {
+                "count": 1,
+                "total": duration,
+                "min": duration,
+                "max": duration,
+            }
+        else:
+            group["count"] += 1
+            group["total"] += duration
+            group["min"] = min(group["min"], duration)
+            group["max"] = max(group["max"], duration)
+    return groups
+
+
+def rollup_updates(docs: list[dict]) -> list[UpdateOne]:
+    return [
+        UpdateOne(
+            dict(zip(ROLLUP_KEY, key)),
+            {
+                "$inc": {"count": group["count"], "total_duration_ms": group["total"]},
+                "$min": {"min_duration_ms": group["min"]},
+                "$max": {"max_duration_ms": group["max"]},
+            },
+            upsert=True,
+        )
+        for key, group in _group(docs).items()
+    ]
+
+
+def rollup_removals(docs: list[dict]) -> list[UpdateOne | DeleteOne]:
+    requests = []
+    for key, group in _group(docs).items():
+        rollup_filter = dict(zip(ROLLUP_KEY, key))
+        requests.append(
+            UpdateOne(
+                rollup_filter,
+                {
+                    "$inc": {
+                        "count": -group["count"],
+                        "total_duration_ms": -group["total"],
+                    }
+                },
+            )
+        )
+        requests.append(DeleteOne({**rollup_filter, "count": {"$lte": 0}}))
+    return requests
+
+
+async def apply_log_rollups(collection: Collection, docs: list[dict]):
+    updates = rollup_updates(docs)
+    if updates:
+        await collection.bulk_write(updates, ordered=False)
+
+
+async def remove_log_rollups(collection: Collection, docs: list[dict]):
+    """Take deleted (or replaced) logs back out of their rollups."""
+    requests = rollup_removals(docs)
+    if requests:
+        # ordered, each DeleteOne has to see its decrement
+        await collection.bulk_write(requests, ordered=True)
+
+
+async def read_rollups(
+    collection: Collection,
+    filters: dict,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    limit: int = 1000,
+) -> list[dict]:
+    query = dict(filters)
+    day_range = {}
+    if start is not None:
+        day_range["$gte"] = start
+    if end is not None:
+        day_range["$lt"] = end
+    if day_range:
+        query["day"] = day_range
+    cursor = collection.find(
+        query, projection={"_id": 0}, sort=[("day", 1)], limit=limit
+    )
+    return await cursor.to_list(length=limit)
+
+
+def rebuild_rollups_pipeline(
+    rollups_name: str,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    timeseries: bool = False,
+) -> list[dict]:
+    pipeline = []
+    time_range = {}
+    if start is not None:
+        time_range["$gte"] = start
+    if end is not None:
+        time_range["$lt"] = end
+    if time_range:
+        pipeline.append({"$match": {"start_time": time_range}})
+    pipeline += [
+        {
+            "$project": {
+                # time-series logs keep user_id/type under meta
+                "user_id": "$meta.user_id" if timeseries else 1,
+                "type": "$meta.type" if timeseries else 1,
+                "activity_id": 1,
+                "day": {"$dateTrunc": {"date": "$start_time", "unit": "day"}},
+                "duration_ms": {"$subtract": ["$completion_time", "$start_time"]},
+            }
+        },
+        {
+            "$group": {
+                "_id": {
+                    "day": "$day",
+                    "user_id": "$user_id",
+                    "type": "$type",
+                    "activity_id": "$activity_id",
+                },
+                "count": {"$sum": 1},
+                "total_duration_ms": {"$sum": "$duration_ms"},
+                "min_duration_ms": {"$min": "$duration_ms"},
+                "max_duration_ms": {"$max": "$duration_ms"},
+            }
+        },
+        {
+            "$replaceWith": {
+                "$mergeObjects": [
+                    "$_id",
+                    {
+                        "count": "$count",
+                        "total_duration_ms": "$total_duration_ms",
+                        "min_duration_ms": "$min_duration_ms",
+                        "max_duration_ms": "$max_duration_ms",
+                    },
+                ]
+            }
+        },
+        {
+            "$merge": {
+                "into": rollups_name,
+                "on": list(ROLLUP_KEY),
+                "whenMatched": "replace",
+                "whenNotMatched": "insert",
+            }
+        },
+    ]
+    return pipeline
+
+
+async def rebuild_rollups(
+    logs: Collection,
+    rollups: Collection,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    timeseries: bool = False,
+):
+    """Recompute rollups for [start, end) from the raw logs.
+
+    `start`/`end` must be day boundaries.
+
+    Rollups are replaced in place by $merge and never cleared first, so readers
+    don't see a day disappear while it is rebuilt. Keys whose logs were all
+    deleted already lost their rollup through remove_log_rollups.
+    """
+    async for _ in logs.aggregate(
+        rebuild_rollups_pipeline(rollups.name, start, end, timeseries=timeseries),
+        allowDiskUse=True,
+    ):
+        pass
@@ -1,21 +1,88 @@
-from motor.motor_asyncio import AsyncIOMotorCollection
+from app.storage import Collection
+from pymongo import ReturnDocument
+from app.cache import CacheBackend
+from app.etag import ETAG_FIELD, new_etag
 from app.models.user import UserIn, UserDB
 
 
-async def create_user(collection: AsyncIOMotorCollection, user: UserDB) -> int | None:
-    await collection.insert_one(user.model_dump(by_alias=True))
+async def create_user(collection: Collection, user: UserDB) -> int | None:
+    doc = user.model_dump(by_alias=True)
+    doc[ETAG_FIELD] = new_etag()
+    await collection.insert_one(doc)
     return user.id
 
 
-async def read_user_by_id(collection: AsyncIOMotorCollection, id: int) -> dict | None:
-    return await collection.find_one({"_id": id})
+async def read_user_by_id(
+    collection: Collection,
+    id: int,
+    cache: CacheBackend | None = None,
+    fields: frozenset[str] | None = None,
+) -> dict | None:
+    """With a cache the whole (small) profile is read or served from it and `fields` is
+    left to the caller, otherwise only `fields` and the etag are fetched."""
+    if cache is not None:
+        return await cache.get_or_load(id, lambda: collection.find_one({"_id": id}))
+    if fields is None:
+        return await collection.find_one({"_id": id})
+    return await collection.find_one(
+        {"_id": id}, projection={**{field: 1 for field in fields}, ETAG_FIELD: 1}
+    )
 
 
-async def update_user_by_id(collection: AsyncIOMotorCollection, id: int, user: UserDB) -> bool:
-    result = await collection.replace_one({"_id": id}, user.model_dump(by_alias=True, exclude_unset=True))
+async def read_user_etag(collection: Collection, id: int) -> str | None:
+    doc = await collection.find_one({"_id": id}, projection={ETAG_FIELD: 1})
+    return doc.get(ETAG_FIELD) if doc else None
+
+
+async def update_user_by_id(
+    collection: Collection, id: int, user: UserDB, cache: CacheBackend | None = None
+) -> bool:
+    doc = user.model_dump(by_alias=True, exclude_unset=True)
+    doc[ETAG_FIELD] = new_etag()
+    result = await collection.replace_one({"_id": id}, doc)
+    if cache is not None:
+        await cache.invalidate(id)
     return result.modified_count > 0
 
 
-async def delete_user_by_id(collection: AsyncIOMotorCollection, id: int) -> bool:
+async def patch_user_by_id(
+    collection: Collection, id: int, fields: dict, cache: CacheBackend | None = None
+) -> dict | None:
+    if not fields:
+        return await read_user_by_id(collection, id, cache=cache)
+    doc = await collection.find_one_and_update(
+        {"_id": id},
+        {"$set": {**fields, ETAG_FIELD: new_etag()}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if cache is not None:
+        await cache.invalidate(id)
+    return doc
+
+
+async def record_user_launch(
+    collection: Collection,
+    id: int,
+    bundle_version: int | None = None,
+    cache: CacheBackend | None = None,
+) -> dict | None:
+    updates = {ETAG_FIELD: new_etag()}
+    if bundle_version is not None:
+        updates["current_bundle_version"] = bundle_version
+    doc = await collection.find_one_and_update(
+        {"_id": id},
+        {"$inc": {"launch_count": 1}, "$set": updates},
+        return_document=ReturnDocument.AFTER,
+    )
+    if cache is not None:
+        await cache.invalidate(id)
+    return doc
+
+
+async def delete_user_by_id(
+    collection: Collection, id: int, cache: CacheBackend | None = None
+) -> bool:
     result = await collection.delete_one({"_id": id})
-    return result.deleted_count > 0
\ No newline at end of file
+    if cache is not None:
+        await cache.invalidate(id)
+    return result.deleted_count > 0
@@ -1,17 +1,99 @@
+import asyncio
 import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from app.config import (
+    STORAGE_BACKEND,
+    LOG_TIMESERIES,
+    LOG_TIMESERIES_COLLECTION,
+    MONGO_DB_NAME,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    MONGO_MAX_IDLE_TIME_MS,
+    MONGO_COMPRESSORS,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_CONNECT_TIMEOUT_MS,
+    MONGO_SOCKET_TIMEOUT_MS,
+    METRICS_ENABLED,
+    PROFILING_ENABLED,
+)
+from app.metrics import mongo_listeners
+from app.slow_ops import slow_op_log
+from app.profiling import ProfileCommandListener
+from app.storage import Storage, MotorStorage, MemoryStorage
 
 
-MONGO_KEY = os.getenv("MONGO_KEY")
+_client: AsyncIOMotorClient | None = None
 
 
-if not MONGO_KEY:
-    raise ValueError("MONGODB_URI not set")
+def client_options() -> dict:
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+    }
+    if MONGO_MAX_IDLE_TIME_MS is not None:
+        options["maxIdleTimeMS"] = MONGO_MAX_IDLE_TIME_MS
+    if MONGO_SOCKET_TIMEOUT_MS is not None:
+        options["socketTimeoutMS"] = MONGO_SOCKET_TIMEOUT_MS
+    compressors = [
+        name.strip() for name in MONGO_COMPRESSORS.split(",") if name.strip()
+    ]
+    if compressors:
+        options["compressors"] = compressors
+    listeners = mongo_listeners() if METRICS_ENABLED else []
+    if slow_op_log is not None:
+        listeners.append(slow_op_log.listener())
+    if PROFILING_ENABLED:
+        listeners.append(ProfileCommandListener())
+    if listeners:
+        options["event_listeners"] = listeners
+    return options
 
 
-client = AsyncIOMotorClient(MONGO_KEY)
-db = client.swp_db
+def get_client() -> AsyncIOMotorClient:
+    """Return the shared client, creating it on first use."""
+    global _client
+    if _client is None:
+        mongo_key = os.getenv("MONGO_KEY")
+        if not mongo_key:
+            raise ValueError("MONGO_KEY not set")
+        _client = AsyncIOMotorClient(mongo_key, **client_options())
+    return _client
 
-users_collection = db.users_new
-logs_collection = db.logs_new
-conversations_collection = db.conversations
\ No newline at end of file
+
+def get_db() -> AsyncIOMotorDatabase:
+    return get_client()[MONGO_DB_NAME]
+
+
+def close_client():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+async def warm_up_pool(connections: int):
+    # concurrent pings each check out their own connection, so the pool opens
+    # `connections` sockets
+    client = get_client()
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(connections)))
+
+
+def create_storage() -> Storage:
+    if STORAGE_BACKEND == "memory":
+        return MemoryStorage(
+            timeseries=[LOG_TIMESERIES_COLLECTION] if LOG_TIMESERIES else []
+        )
+    return MotorStorage(get_client, MONGO_DB_NAME)
+
+
+storage = create_storage()
+
+users_collection = storage.collection("users_new")
+logs_collection = storage.collection(
+    LOG_TIMESERIES_COLLECTION if LOG_TIMESERIES else "logs_new"
+)
+conversations_collection = storage.collection("conversations")
+message_buckets_collection = storage.collection("message_buckets")
+log_rollups_collection = storage.collection("log_rollups")
@@ -0,0 +1,42 @@
+import hashlib
+from bson import ObjectId
+
+
+# Users and conversations carry an opaque version token in this field. Every
+# write replaces it, GET handlers return it as the ETag and answer a matching
+# If-None-Match with 304 after a projection-only lookup of the token. Partial
+# responses (?fields=) get a weak ETag naming the field set, so they never
+# validate against the full document or another field set.
+ETAG_FIELD = "etag"
+
+
+def new_etag() -> str:
+    return str(ObjectId())
+
+
+def _fields_hash(fields: frozenset[str]) -> str:
+    return hashlib.sha1(
+        ",".join(sorted(fields)).encode(), usedforsecurity=False
+    ).hexdigest()[:8]
+
+
+def format_etag(token: str, fields: frozenset[str] | None = None) -> str:
+    if fields is None:
+        return f'"{token}"'
+    return f'W/"{token};f={_fields_hash(fields)}"'
+
+
+def etag_matches(
+    if_none_match: str, token: str, fields: frozenset[str] | None = None
+) -> bool:
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored."""
+    if if_none_match.strip() == "*":
+        return True
+    expected = format_etag(token, fields).removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == expected:
+            return True
+    return False
@@ -0,0 +1,209 @@
+import logging
+from collections.abc import Mapping
+from pymongo import IndexModel, ASCENDING
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.config import LOG_TIMESERIES, LOG_TIMESERIES_COLLECTION
+
+
+logger = logging.getLogger(__name__)
+
+LOGS_COLLECTION = LOG_TIMESERIES_COLLECTION if LOG_TIMESERIES else "logs_new"
+
+
+# one index per query shape in log_crud.LOG_QUERY_INDEXES
+LOG_INDEXES = [
+    IndexModel([("start_time", ASCENDING), ("_id", ASCENDING)], name="start_time_id"),
+    IndexModel(
+        [("user_id", ASCENDING), ("start_time", ASCENDING), ("_id", ASCENDING)],
+        name="user_id_start_time_id",
+    ),
+    IndexModel(
+        [
+            ("user_id", ASCENDING),
+            ("type", ASCENDING),
+            ("start_time", ASCENDING),
+            ("_id", ASCENDING),
+        ],
+        name="user_id_type_start_time_id",
+    ),
+    IndexModel(
+        [
+            ("user_id", ASCENDING),
+            ("activity_id", ASCENDING),
+            ("start_time", ASCENDING),
+            ("_id", ASCENDING),
+        ],
+        name="user_id_activity_id_start_time_id",
+    ),
+    IndexModel(
+        [("activity_id", ASCENDING), ("start_time", ASCENDING), ("_id", ASCENDING)],
+        name="activity_id_start_time_id",
+    ),
+    IndexModel(
+        [("type", ASCENDING), ("start_time", ASCENDING), ("_id", ASCENDING)],
+        name="type_start_time_id",
+    ),
+    IndexModel(
+        [("build_version", ASCENDING), ("start_time", ASCENDING), ("_id", ASCENDING)],
+        name="build_version_start_time_id",
+    ),
+]
+
+
+def _meta_index(model: IndexModel) -> IndexModel:
+    keys = [
+        (f"meta.{field}" if field in ("user_id", "type") else field, direction)
+        for field, direction in model.document["key"].items()
+    ]
+    return IndexModel(keys, name=model.document["name"])
+
+
+# time-series logs keep user_id/type under meta, have no _id index and get
+# (meta, start_time) from the server
+TIMESERIES_LOG_INDEXES = [_meta_index(model) for model in LOG_INDEXES] + [
+    IndexModel([("_id", ASCENDING)], name="id"),
+    IndexModel(
+        [("meta", ASCENDING), ("start_time", ASCENDING)], name="meta_start_time"
+    ),
+]
+
+
+# Indexes every collection needs, keyed by collection name. Anything else found
+# in the database (besides _id) is reported as extra.
+INDEXES: dict[str, list[IndexModel]] = {
+    "users_new": [],
+    LOGS_COLLECTION: TIMESERIES_LOG_INDEXES if LOG_TIMESERIES else LOG_INDEXES,
+    "conversations": [
+        IndexModel([("user_id", ASCENDING), ("_id", ASCENDING)], name="user_id_id"),
+    ],
+    "log_rollups": [
+        IndexModel(
+            [
+                ("day", ASCENDING),
+                ("user_id", ASCENDING),
+                ("type", ASCENDING),
+                ("activity_id", ASCENDING),
+            ],
+            name="day_user_id_type_activity_id",
+            unique=True,
+        ),
+        IndexModel([("user_id", ASCENDING), ("day", ASCENDING)], name="user_id_day"),
+    ],
+    "message_buckets": [
+        IndexModel(
+            [("conversation_id", ASCENDING), ("seq", ASCENDING)],
+            name="conversation_id_seq",
+            unique=True,
+        ),
+    ],
+}
+
+
+# Declared indexes the last check found missing, by collection. Queries that
+# hint one of them are refused with MissingIndexError instead of failing on the
+# server; until the first check finishes nothing is known to be missing.
+missing_indexes: dict[str, set[str]] = {}
+
+
+class MissingIndexError(Exception):
+    pass
+
+
+def index_key(models: list[IndexModel], name: str) -> list[tuple[str, int]]:
+    """Key pattern of the declared index `name`, so hints work under any index name."""
+    for model in models:
+        if model.document["name"] == name:
+            return list(model.document["key"].items())
+    raise KeyError(name)
+
+
+def require_index(collection_name: str, name: str):
+    if name in missing_indexes.get(collection_name, ()):
+        raise MissingIndexError(f"Index {name} on {collection_name} is missing")
+
+
+def _key(spec) -> tuple:
+    items = spec.items() if isinstance(spec, Mapping) else spec
+    # the server may report directions as floats
+    return tuple(
+        (field, int(d) if isinstance(d, (int, float)) else d) for field, d in items
+    )
+
+
+async def index_drift(db: AsyncIOMotorDatabase) -> dict[str, dict[str, list[str]]]:
+    """Compare declared indexes with the ones present, matching on key pattern."""
+    report = {}
+    for name, models in INDEXES.items():
+        existing = await db[name].index_information()
+        existing_keys = {
+            _key(info["key"]): index_name for index_name, info in existing.items()
+        }
+        declared_keys = {
+            _key(model.document["key"]): model.document["name"] for model in models
+        }
+        missing_indexes[name] = {
+            declared_keys[key] for key in declared_keys if key not in existing_keys
+        }
+
+        report[name] = {
+            "present": sorted(
+                existing_keys[key] for key in declared_keys if key in existing_keys
+            ),
+            "missing": sorted(
+                declared_keys[key] for key in declared_keys if key not in existing_keys
+            ),
+            "extra": sorted(
+                index_name
+                for key, index_name in existing_keys.items()
+                if key not in declared_keys and index_name != "_id_"
+            ),
+        }
+    return report
+
+
+async def ensure_indexes(
+    db: AsyncIOMotorDatabase, create: bool = True
+) -> dict[str, dict[str, list[str]]]:
+    """Log index drift and, with `create`, build the missing indexes."""
+    report = await index_drift(db)
+    for name, drift in report.items():
+        if drift["extra"]:
+            logger.warning(
+                "Collection %s has undeclared indexes: %s",
+                name,
+                ", ".join(drift["extra"]),
+            )
+        if not drift["missing"]:
+            continue
+        if not create:
+            logger.warning(
+                "Collection %s is missing indexes: %s",
+                name,
+                ", ".join(drift["missing"]),
+            )
+            continue
+        models = [
+            model
+            for model in INDEXES[name]
+            if model.document["name"] in drift["missing"]
+        ]
+        logger.info("Building indexes on %s: %s", name, ", ".join(drift["missing"]))
+        await db[name].create_indexes(models)
+        missing_indexes[name].clear()
+    return report
+
+
+async def ensure_timeseries_collection(
+    db: AsyncIOMotorDatabase, name: str = LOG_TIMESERIES_COLLECTION
+):
+    """Create the time-series log collection; an insert would create a regular one."""
+    if name in await db.list_collection_names(filter={"name": name}):
+        return
+    await db.create_collection(
+        name,
+        timeseries={
+            "timeField": "start_time",
+            "metaField": "meta",
+            "granularity": "seconds",
+        },
+    )
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+from app.storage import Collection
+
+import app.cruds.log_crud as crud
+from app.config import (
+    LOG_WRITE_MODE,
+    LOG_BUFFER_MAX_SIZE,
+    LOG_BUFFER_FLUSH_SIZE,
+    LOG_BUFFER_FLUSH_INTERVAL,
+    LOG_ROLLUPS_ENABLED,
+    LOG_TIMESERIES,
+)
+from app.db import logs_collection, log_rollups_collection
+
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class LogWriter:
+    """Buffers single log inserts and flushes them to Mongo with insert_many.
+
+    A flush happens when `flush_size` logs are pending or `flush_interval`
+    seconds passed since the first pending log. The queue is bounded by
+    `max_size`, so producers wait once it is full.
+    """
+
+    def __init__(
+        self,
+        collection: Collection,
+        max_size: int = LOG_BUFFER_MAX_SIZE,
+        flush_size: int = LOG_BUFFER_FLUSH_SIZE,
+        flush_interval: float = LOG_BUFFER_FLUSH_INTERVAL,
+        rollups: Collection | None = None,
+        timeseries: bool = False,
+    ):
+        self.collection = collection
+        self.rollups = rollups
+        self.timeseries = timeseries
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        # set once stop() began, submit() refuses new logs from then on
+        self._closing = False
+        # submit() calls waiting for room in the queue, stop() lets them finish
+        self._putting = 0
+        self._no_putters = asyncio.Event()
+        self._no_putters.set()
+        # logs accepted without a waiter ("accepted" mode) whose write failed
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._closing = False
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self.running or self._closing:
+            return
+        self._closing = True
+        # the stop marker goes in behind every log already being submitted
+        await self._no_putters.wait()
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def submit(self, doc: dict, wait: bool = True) -> str:
+        """Queue a prepared log document; with `wait` return only once it is written."""
+        if not self.running or self._closing:
+            raise RuntimeError("Log writer is not running")
+        future = asyncio.get_running_loop().create_future()
+        if not wait:
+            future.add_done_callback(self._count_dropped)
+        self._putting += 1
+        self._no_putters.clear()
+        try:
+            await self._queue.put((doc, future))
+        finally:
+            self._putting -= 1
+            if not self._putting:
+                self._no_putters.set()
+        if wait:
+            return await future
+        return str(doc["_id"])
+
+    def _count_dropped(self, future: asyncio.Future):
+        # nobody awaits this future, retrieving the exception here keeps asyncio
+        # from reporting it as never retrieved
+        if not future.cancelled() and future.exception() is not None:
+            self.dropped += 1
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.flush_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+        # nothing should follow the stop marker, but never leave a log unwritten
+        leftover = []
+        while not self._queue.empty():
+            leftover.append(self._queue.get_nowait())
+        if leftover:
+            await self._flush(leftover)
+
+    async def _flush(self, batch: list[tuple[dict, asyncio.Future]]):
+        docs = [doc for doc, _ in batch]
+        try:
+            results = await crud.insert_log_docs(
+                self.collection, docs, rollups=self.rollups, timeseries=self.timeseries
+            )
+        except Exception as e:
+            logger.exception("Failed to flush %d buffered logs", len(batch))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if result["error"] is None:
+                future.set_result(result["_id"])
+            else:
+                logger.error("Buffered log was not written: %s", result["error"])
+                future.set_exception(RuntimeError(result["error"]))
+
+
+log_writer = LogWriter(
+    logs_collection,
+    rollups=log_rollups_collection if LOG_ROLLUPS_ENABLED else None,
+    timeseries=LOG_TIMESERIES,
+) if LOG_WRITE_MODE != "direct" else None
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from app.config import LOOP_LAG_INTERVAL, LOOP_BLOCK_THRESHOLD_MS
+from app.metrics import event_loop_lag
+
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop runs a task that sleeps `interval` seconds.
+
+    Every request, Motor callback and background task shares the loop, so the
+    lag is how long any of them waited behind whatever was holding it. With
+    `block_threshold_ms` a watchdog thread also logs the loop thread's stack
+    while the loop has been blocked for longer than that, once per stall.
+    """
+
+    def __init__(
+        self, interval: float, block_threshold_ms: int | None = None, window: int = 120
+    ):
+        self.interval = interval
+        self.block_threshold_ms = block_threshold_ms
+        self._recent: deque[float] = deque(maxlen=window)
+        self._task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._last_tick = time.monotonic()
+        self._reported_tick: float | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopping = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+        if self.block_threshold_ms is not None:
+            self._stopping.clear()
+            self._watchdog = threading.Thread(
+                target=self._watch, name="loop-watchdog", daemon=True
+            )
+            self._watchdog.start()
+
+    async def stop(self):
+        if self._watchdog is not None:
+            self._stopping.set()
+            # the watchdog may still be logging a stack, wait for it off the loop
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def record(self, lag: float):
+        self._recent.append(lag)
+        event_loop_lag.observe((), lag)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            due = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self._last_tick = time.monotonic()
+            self.record(max(loop.time() - due, 0.0))
+
+    def _watch(self):
+        check_every = max(self.block_threshold_ms / 2000, 0.01)
+        while not self._stopping.wait(check_every):
+            tick = self._last_tick
+            blocked_ms = (time.monotonic() - tick - self.interval) * 1000
+            if blocked_ms < self.block_threshold_ms or self._reported_tick == tick:
+                continue
+            self._reported_tick = tick
+            self.report_blocked(blocked_ms)
+
+    def report_blocked(self, blocked_ms: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = (
+            "".join(traceback.format_stack(frame))
+            if frame is not None
+            else "<loop thread not found>\n"
+        )
+        try:
+            task = asyncio.current_task(self._loop)
+        except RuntimeError:
+            task = None
+        logger.warning(
+            "Event loop blocked for %.0f ms so far, running %s:\n%s",
+            blocked_ms,
+            task.get_name() if task is not None else "a callback outside any task",
+            stack,
+        )
+
+    def stats(self) -> dict:
+        recent = list(self._recent)
+        return {
+            "lag_ms": recent[-1] * 1000 if recent else None,
+            "max_lag_ms": max(recent) * 1000 if recent else None,
+            "window_s": len(recent) * self.interval,
+        }
+
+
+loop_monitor = LoopLagMonitor(
+    LOOP_LAG_INTERVAL, block_threshold_ms=LOOP_BLOCK_THRESHOLD_MS
+) if LOOP_LAG_INTERVAL > 0 else None
@@ -4,19 +4,105 @@ from dotenv import load_dotenv
 # Загружаем переменные окружения из .env файла
 load_dotenv()
 
+import asyncio
+import logging
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from app.routes.conv_routes import router as conv_router
 from app.routes.user_routes import router as user_router
 from app.routes.log_routes import router as log_router
+from app.routes.admin_routes import router as admin_router
+from app.routes.analytics_routes import router as analytics_router
+from app.config import (
+    MONGO_INDEX_MODE,
+    LOG_TIMESERIES,
+    MONGO_WARMUP_CONNECTIONS,
+    STORAGE_BACKEND,
+    METRICS_ENABLED,
+    PROFILING_ENABLED,
+)
+from app.db import get_client, get_db, close_client, warm_up_pool
+from app.indexes import ensure_indexes, ensure_timeseries_collection
+from app.log_writer import log_writer
+from app.metrics import (
+    MetricsMiddleware,
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    render as render_metrics,
+)
+from app.request_context import RequestContextMiddleware
+from app.slow_ops import slow_op_log
+from app.profiling import ProfilingMiddleware
+from app.loop_monitor import loop_monitor
 
-app = FastAPI(title="SWP Database API", version="1.0.0")
+
+logger = logging.getLogger(__name__)
+
+
+async def sync_indexes():
+    try:
+        await ensure_indexes(get_db(), create=MONGO_INDEX_MODE == "create")
+    except Exception:
+        logger.exception("Index check failed")
+
+
+async def connect_mongo() -> asyncio.Task | None:
+    get_client()
+    if MONGO_WARMUP_CONNECTIONS > 0:
+        try:
+            await warm_up_pool(MONGO_WARMUP_CONNECTIONS)
+        except Exception:
+            logger.exception("Connection pool warm-up failed")
+    if LOG_TIMESERIES:
+        try:
+            await ensure_timeseries_collection(get_db())
+        except Exception:
+            logger.exception("Could not create the time-series log collection")
+    # index builds run in the background so startup never waits for them
+    return asyncio.create_task(sync_indexes()) if MONGO_INDEX_MODE != "off" else None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    index_task = await connect_mongo() if STORAGE_BACKEND == "mongo" else None
+    if slow_op_log is not None:
+        slow_op_log.start(get_client)
+    if loop_monitor is not None:
+        await loop_monitor.start()
+    if log_writer is not None:
+        await log_writer.start()
+    try:
+        yield
+    finally:
+        # flush buffered logs before the process exits
+        if log_writer is not None:
+            await log_writer.stop()
+        if index_task is not None and not index_task.done():
+            index_task.cancel()
+        if slow_op_log is not None:
+            await slow_op_log.stop()
+        if loop_monitor is not None:
+            await loop_monitor.stop()
+        close_client()
+
+
+app = FastAPI(title="SWP Database API", version="1.0.0", lifespan=lifespan)
 
 # Include routers
 app.include_router(user_router)
 app.include_router(log_router)
 app.include_router(conv_router)
+app.include_router(analytics_router)
+app.include_router(admin_router)
+
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+if slow_op_log is not None:
+    # lets the slow operation log name the route that issued a command
+    app.add_middleware(RequestContextMiddleware)
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
 
 
 @app.get("/")
@@ -28,14 +114,19 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint - doesn't require database access"""
-    return {"status": "healthy", "message": "Service is running"}
+    return {
+        "status": "healthy",
+        "message": "Service is running",
+        "event_loop": loop_monitor.stats() if loop_monitor is not None else None,
+    }
 
 
 @app.get("/health/db")
 async def database_health_check():
     """Database health check endpoint - tests database connectivity"""
+    if STORAGE_BACKEND == "memory":
+        return {"status": "healthy", "database": "memory"}
     try:
-        from app.db import get_client
         client = get_client()
         # Ping the database to check connectivity
         await client.admin.command('ping')
@@ -44,6 +135,14 @@ async def database_health_check():
         raise HTTPException(status_code=503, detail=f"Database connection failed: {str(e)}")
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Global exception handler for unhandled errors"""
@@ -54,4 +153,4 @@ async def global_exception_handler(request, exc):
 
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", reload=True)
\ No newline at end of file
+    uvicorn.run("main:app", reload=True)
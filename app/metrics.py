@@ -0,0 +1,299 @@
+import bisect
+import threading
+import time
+from pymongo import monitoring
+
+
+# A small Prometheus text-format registry. Samples are recorded from the event
+# loop (request middleware) and from pymongo's monitoring callbacks, which Motor
+# runs on its executor threads, so every series update takes the metric's lock.
+# Recording is a bisect plus a few additions; rendering only happens on scrape.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(
+    names: tuple[str, ...], values: tuple[str, ...], extra: str = ""
+) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...],
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # labels -> [per-bucket counts (last slot is +Inf), sum]
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, labels: tuple[str, ...], value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self, labels: tuple[str, ...]) -> tuple[list[int], float] | None:
+        """Non-cumulative bucket counts and sum for one series."""
+        with self._lock:
+            series = self._series.get(labels)
+            return (list(series[0]), series[1]) if series is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> list[str]:
+        with self._lock:
+            series = [
+                (labels, list(counts), total)
+                for labels, (counts, total) in self._series.items()
+            ]
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                label_text = _format_labels(self.labelnames, labels, le)
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, labels: tuple[str, ...], amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels: tuple[str, ...], amount: float = 1):
+        self.inc(labels, -amount)
+
+    def set(self, labels: tuple[str, ...], value: float):
+        with self._lock:
+            self._values[labels] = value
+
+    def value(self, labels: tuple[str, ...]) -> float:
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, value in values:
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}{label_text} {_format_value(value)}")
+        return lines
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template and status; _count is the request count.",
+    ("method", "route", "status"),
+)
+mongo_command_duration = Histogram(
+    "mongo_command_duration_seconds",
+    "MongoDB command latency by collection and command.",
+    ("collection", "command", "outcome"),
+)
+mongo_pool_checked_out = Gauge(
+    "mongo_pool_connections_checked_out",
+    "Pooled connections currently in use.",
+    ("address",),
+)
+mongo_pool_waiting = Gauge(
+    "mongo_pool_waiting",
+    "Operations waiting to check out a pooled connection.",
+    ("address",),
+)
+mongo_pool_open = Gauge(
+    "mongo_pool_connections_open",
+    "Open pooled connections, idle or in use.",
+    ("address",),
+)
+event_loop_lag = Histogram(
+    "event_loop_lag_seconds",
+    "Delay between when the loop lag probe was due and when it ran.",
+    (),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+REGISTRY = [
+    http_request_duration,
+    mongo_command_duration,
+    mongo_pool_checked_out,
+    mongo_pool_waiting,
+    mongo_pool_open,
+    event_loop_lag,
+]
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request.
+
+    Requests are labelled with the matched route template (/users/{user_id}),
+    never the raw path, so ids don't create new series; requests no route
+    matched share the "unmatched" label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_request_duration.observe(
+                (scope["method"], route, str(status)), time.perf_counter() - start
+            )
+
+
+def command_collection(command_name: str, command) -> str:
+    """Collection a command targets, "" for database and admin commands."""
+    value = command.get("collection" if command_name == "getMore" else command_name)
+    return value if isinstance(value, str) else ""
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    def __init__(self):
+        # succeeded/failed events carry the command name but not the command,
+        # so the collection is remembered from the started event
+        self._started: dict[tuple, str] = {}
+
+    def started(self, event):
+        self._started[(event.connection_id, event.request_id)] = command_collection(
+            event.command_name, event.command
+        )
+
+    def _finish(self, event, outcome: str):
+        collection = self._started.pop((event.connection_id, event.request_id), "")
+        mongo_command_duration.observe(
+            (collection, event.command_name, outcome), event.duration_micros / 1e6
+        )
+
+    def succeeded(self, event):
+        self._finish(event, "succeeded")
+
+    def failed(self, event):
+        self._finish(event, "failed")
+
+
+def _address(event) -> tuple[str]:
+    host, port = event.address
+    return (f"{host}:{port}",)
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        mongo_pool_open.inc(_address(event))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        mongo_pool_open.dec(_address(event))
+
+    def connection_check_out_started(self, event):
+        mongo_pool_waiting.inc(_address(event))
+
+    def connection_check_out_failed(self, event):
+        mongo_pool_waiting.dec(_address(event))
+
+    def connection_checked_out(self, event):
+        address = _address(event)
+        mongo_pool_waiting.dec(address)
+        mongo_pool_checked_out.inc(address)
+
+    def connection_checked_in(self, event):
+        mongo_pool_checked_out.dec(_address(event))
+
+
+def mongo_listeners() -> list:
+    return [CommandMetricsListener(), PoolMetricsListener()]
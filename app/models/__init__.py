@@ -1,9 +1,13 @@
-from .user import UserIn, UserOut, UserDB
-from .conv import ConversationIn, ConversationOut, ConversationDB
-from .log import LogIn, LogOut, LogDB
+from .common import ReturnMode, IdOut
+from .user import UserIn, UserOut, UserDB, UserPatch, UserLaunch
+from .conv import ConversationIn, ConversationOut, ConversationDB, Message, MessagePage
+from .log import LogIn, LogOut, LogDB, LogBatchItem, LogBatchOut
+from .analytics import DurationStats, LogRollup
 
 __all__ = [
-    "UserIn", "UserOut", "UserDB",
-    "ConversationIn", "ConversationOut", "ConversationDB", 
-    "LogIn", "LogOut", "LogDB"
+    "ReturnMode", "IdOut",
+    "UserIn", "UserOut", "UserDB", "UserPatch", "UserLaunch",
+    "ConversationIn", "ConversationOut", "ConversationDB", "Message", "MessagePage",
+    "LogIn", "LogOut", "LogDB", "LogBatchItem", "LogBatchOut",
+    "DurationStats", "LogRollup"
 ] 
\ No newline at end of file
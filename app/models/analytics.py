@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from datetime import datetime
+
+
+class DurationStats(BaseModel):
+    day: datetime
+    type: str
+    count: int
+    mean_ms: float
+    p50_ms: float
+    p90_ms: float
+    p99_ms: float
+
+
+class LogRollup(BaseModel):
+    day: datetime
+    user_id: int
+    type: str
+    activity_id: str
+    count: int
+    total_duration_ms: int
+    min_duration_ms: int
+    max_duration_ms: int
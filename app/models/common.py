@@ -0,0 +1,12 @@
+from pydantic import BaseModel, Field, ConfigDict
+from typing import Literal, Union
+
+
+# Value of the `?return=` query parameter on create endpoints
+ReturnMode = Literal["representation", "minimal"]
+
+
+class IdOut(BaseModel):
+    id: Union[int, str, None] = Field(alias="_id")
+
+    model_config = ConfigDict(populate_by_name=True)
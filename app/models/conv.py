@@ -54,3 +54,8 @@ class ConversationOut(ConversationIn):
     id: str = Field(default="", alias="_id")
 
     model_config = ConfigDict(populate_by_name=True)
+
+
+class MessagePage(BaseModel):
+    messages: List[Message]
+    next_cursor: Optional[str] = None
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, ConfigDict, GetJsonSchemaHandler
 from datetime import datetime
-from typing import Optional, Any
+from typing import Optional, Any, List
 from bson import ObjectId
 from pydantic_core import core_schema
 
@@ -49,3 +49,16 @@ class LogOut(LogIn):
     id: str = Field(default="", alias="_id")
 
     model_config = ConfigDict(populate_by_name=True)
+
+
+class LogBatchItem(BaseModel):
+    index: int
+    id: Optional[str] = Field(default=None, alias="_id")
+    error: Optional[str] = None
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+class LogBatchOut(BaseModel):
+    inserted_count: int
+    results: List[LogBatchItem]
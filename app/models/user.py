@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, field_validator
 from typing import Optional, Literal
 
 
@@ -21,4 +21,31 @@ class UserDB(UserIn):
 
 
 class UserOut(UserDB):
-    pass
\ No newline at end of file
+    pass
+
+
+class UserPatch(BaseModel):
+    """Fields for PATCH /users/{user_id}; only the ones sent are written."""
+    name: Optional[str] = Field(default=None, min_length=1, max_length=50)
+    gender: Optional[Literal["male", "female"]] = None
+    language: Optional[Literal["ru", "en"]] = None
+    recommendation_method: Optional[Literal["fixed", "kb", "cf"]] = None
+    launch_count: Optional[int] = None
+    current_bundle_version: Optional[int] = None
+    bundle_version_at_install: Optional[int] = None
+
+    model_config = ConfigDict(extra="forbid")
+
+    @field_validator("name", "launch_count")
+    @classmethod
+    def not_null(cls, value):
+        # None is only the "not sent" default, these fields can't be cleared
+        if value is None:
+            raise ValueError("must not be null")
+        return value
+
+
+class UserLaunch(BaseModel):
+    current_bundle_version: Optional[int] = None
+
+    model_config = ConfigDict(extra="forbid")
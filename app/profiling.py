@@ -0,0 +1,222 @@
+import asyncio
+import cProfile
+import hmac
+import json
+import logging
+import pstats
+import random
+import re
+import sysconfig
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from bson import ObjectId
+from pymongo import monitoring
+
+from app.config import PROFILE_TOKEN, PROFILE_SAMPLE_RATE, PROFILE_DIR
+from app.metrics import command_collection
+
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile-token"
+PROFILE_ID_HEADER = b"x-profile-id"
+TOP_FUNCTIONS = 30
+
+_APP_DIR = str(Path(__file__).resolve().parent)
+_STDLIB_DIR = sysconfig.get_paths()["stdlib"]
+
+
+class RequestProfile:
+    """Mongo commands issued while one profiled request was running."""
+
+    def __init__(self):
+        self.commands: list[dict] = []
+
+
+# set only while a profiled request runs; Motor copies it into its executor threads
+_active_profile: ContextVar[RequestProfile | None] = ContextVar(
+    "active_profile", default=None
+)
+
+
+class ProfileCommandListener(monitoring.CommandListener):
+    def __init__(self):
+        self._started: dict[tuple, str] = {}
+
+    def started(self, event):
+        if _active_profile.get() is not None:
+            self._started[(event.connection_id, event.request_id)] = command_collection(
+                event.command_name, event.command
+            )
+
+    def _finish(self, event):
+        profile = _active_profile.get()
+        collection = self._started.pop((event.connection_id, event.request_id), None)
+        if profile is None or collection is None:
+            return
+        profile.commands.append({
+            "command": event.command_name,
+            "collection": collection,
+            "duration_ms": event.duration_micros / 1000,
+        })
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+
+def package_of(filename: str) -> str:
+    """Group profiled functions: "app", a third-party package, "stdlib", "builtins"."""
+    if filename == "~":
+        return "builtins"
+    if filename.startswith(_APP_DIR):
+        return "app"
+    marker = filename.rfind("-packages/")
+    if marker != -1:
+        return filename[marker + len("-packages/"):].split("/", 1)[0]
+    if filename.startswith(_STDLIB_DIR):
+        return "stdlib"
+    return "other"
+
+
+def profile_summary(profiler: cProfile.Profile) -> dict:
+    stats = pstats.Stats(profiler).stats
+    packages: dict[str, float] = {}
+    functions = []
+    for (filename, line, name), (_, calls, tottime, cumtime, _) in stats.items():
+        package = package_of(filename)
+        packages[package] = packages.get(package, 0.0) + tottime * 1000
+        location = name if filename == "~" else f"{filename}:{line}({name})"
+        functions.append({
+            "function": location,
+            "package": package,
+            "calls": calls,
+            "own_ms": tottime * 1000,
+            "cumulative_ms": cumtime * 1000,
+        })
+    functions.sort(key=lambda function: function["cumulative_ms"], reverse=True)
+    return {
+        "own_ms_by_package": dict(
+            sorted(packages.items(), key=lambda item: item[1], reverse=True)
+        ),
+        "top_functions": functions[:TOP_FUNCTIONS],
+    }
+
+
+def _slug(route: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+
+
+def write_profile(
+    directory: Path, profile_id: str, profiler: cProfile.Profile, summary: dict
+) -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    started = summary["started_at"][:19].replace(":", "")
+    base = directory / f"{started}-{_slug(summary['route'])}-{profile_id}"
+    profiler.dump_stats(f"{base}.prof")
+    summary.update(profile_summary(profiler))
+    Path(f"{base}.json").write_text(json.dumps(summary, indent=2))
+    return base
+
+
+class ProfilingMiddleware:
+    """Profiles requests that carry the profile token or are sampled.
+
+    Each profile is a cProfile `.prof` (open it with pstats or snakeviz) and a
+    JSON summary: wall time, time spent waiting on Mongo commands issued by the
+    request, the remaining in-app time, CPU time, own time per package and the
+    top functions. cProfile sees the whole event loop thread, so other requests
+    running concurrently show up in the profile as well; only one request is
+    profiled at a time and the others run unprofiled meanwhile. The response
+    carries an X-Profile-Id header naming the files.
+    """
+
+    def __init__(
+        self,
+        app,
+        token: str | None = PROFILE_TOKEN,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        directory: str | Path = PROFILE_DIR,
+    ):
+        self.app = app
+        self.token = token.encode() if token else None
+        self.sample_rate = sample_rate
+        self.directory = Path(directory)
+        self._busy = False
+
+    def should_profile(self, scope) -> bool:
+        if self.token is not None:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return hmac.compare_digest(value, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._busy or not self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self._busy = True
+        profile_id = str(ObjectId())
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (PROFILE_ID_HEADER, profile_id.encode()),
+                    ],
+                }
+            await send(message)
+
+        profile = RequestProfile()
+        token = _active_profile.set(profile)
+        profiler = cProfile.Profile()
+        started_at = datetime.now(timezone.utc)
+        start, cpu_start = time.perf_counter(), time.process_time()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profiler.disable()
+            wall_ms = (time.perf_counter() - start) * 1000
+            cpu_ms = (time.process_time() - cpu_start) * 1000
+            _active_profile.reset(token)
+            self._busy = False
+            mongo_ms = sum(command["duration_ms"] for command in profile.commands)
+            summary = {
+                "id": profile_id,
+                "started_at": started_at.isoformat(),
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(scope.get("route"), "path", None) or scope["path"],
+                "status": status,
+                "wall_ms": wall_ms,
+                "mongo_ms": mongo_ms,
+                # Mongo commands of one request can overlap (gather), so this is
+                # a lower bound
+                "app_ms": max(wall_ms - mongo_ms, 0.0),
+                "cpu_ms": cpu_ms,
+                "mongo_commands": profile.commands,
+            }
+            try:
+                path = await asyncio.to_thread(
+                    write_profile, self.directory, profile_id, profiler, summary
+                )
+                logger.info(
+                    "Profiled %s %s in %.1f ms: %s.prof",
+                    scope["method"],
+                    scope["path"],
+                    wall_ms,
+                    path,
+                )
+            except Exception:
+                logger.exception("Could not write request profile %s", profile_id)
@@ -0,0 +1,31 @@
+from contextvars import ContextVar
+
+
+# The ASGI scope of the request being handled. Motor copies the context into
+# its executor threads, so pymongo listeners can see which request issued a
+# command. The router adds the matched route to the same scope dict, so the
+# template is looked up when it is needed rather than when the request starts.
+current_scope: ContextVar[dict | None] = ContextVar("current_scope", default=None)
+
+
+def current_route() -> str | None:
+    """Route template (/users/{user_id}) of the current request, None outside one."""
+    scope = current_scope.get()
+    if scope is None:
+        return None
+    return getattr(scope.get("route"), "path", None) or scope.get("path")
+
+
+class RequestContextMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_scope.reset(token)
@@ -1,5 +1,13 @@
 from .user_routes import router as user_router
 from .conv_routes import router as conv_router
 from .log_routes import router as log_router
+from .admin_routes import router as admin_router
+from .analytics_routes import router as analytics_router
 
-__all__ = ["user_router", "conv_router", "log_router"] 
\ No newline at end of file
+__all__ = [
+    "user_router",
+    "conv_router",
+    "log_router",
+    "admin_router",
+    "analytics_router",
+]
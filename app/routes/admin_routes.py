@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException
+from app.config import STORAGE_BACKEND
+from app.db import get_db
+from app.cache import user_cache
+from app.slow_ops import slow_op_log
+from app.indexes import index_drift
+
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+@router.get("/indexes")
+async def get_index_drift():
+    if STORAGE_BACKEND != "mongo":
+        raise HTTPException(
+            status_code=400, detail="Indexes are only kept by the mongo storage backend"
+        )
+    return await index_drift(get_db())
+
+
+@router.get("/cache")
+async def get_cache_stats():
+    return {"users": user_cache.stats() if user_cache is not None else None}
+
+
+@router.get("/slow-ops")
+async def get_slow_operations():
+    if slow_op_log is None:
+        return {"threshold_ms": None, "operations": []}
+    return {"threshold_ms": slow_op_log.threshold_ms, "operations": slow_op_log.stats()}
@@ -0,0 +1,74 @@
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query
+from app.models.analytics import DurationStats, LogRollup
+from app.config import LOG_TIMESERIES
+from app.db import logs_collection, log_rollups_collection
+from app.indexes import MissingIndexError
+
+import app.cruds.log_crud as crud
+import app.cruds.rollup_crud as rollup_crud
+
+router = APIRouter(prefix="/analytics", tags=["Analytics"])
+
+
+async def get_duration_stats(
+    filters: dict, start: datetime | None, end: datetime | None
+) -> list[DurationStats]:
+    try:
+        stats = await crud.duration_stats(
+            logs_collection, filters, start, end, timeseries=LOG_TIMESERIES
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except MissingIndexError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return [DurationStats(**group) for group in stats]
+
+
+@router.get("/users/{user_id}/durations", response_model=list[DurationStats])
+async def user_durations(
+    user_id: int,
+    type: str | None = None,
+    activity_id: str | None = None,
+    from_: datetime | None = Query(None, alias="from"),
+    to: datetime | None = None,
+):
+    filters = {"user_id": user_id}
+    if type is not None:
+        filters["type"] = type
+    if activity_id is not None:
+        filters["activity_id"] = activity_id
+    return await get_duration_stats(filters, from_, to)
+
+
+@router.get("/activities/{activity_id}/durations", response_model=list[DurationStats])
+async def activity_durations(
+    activity_id: str,
+    from_: datetime | None = Query(None, alias="from"),
+    to: datetime | None = None,
+):
+    return await get_duration_stats({"activity_id": activity_id}, from_, to)
+
+
+@router.get("/daily", response_model=list[LogRollup])
+async def daily_rollups(
+    user_id: int | None = None,
+    type: str | None = None,
+    activity_id: str | None = None,
+    from_: datetime | None = Query(None, alias="from"),
+    to: datetime | None = None,
+    limit: int = Query(1000, ge=1, le=10000),
+):
+    filters = {
+        field: value
+        for field, value in (
+            ("user_id", user_id),
+            ("type", type),
+            ("activity_id", activity_id),
+        )
+        if value is not None
+    }
+    rollups = await rollup_crud.read_rollups(
+        log_rollups_collection, filters, from_, to, limit=limit
+    )
+    return [LogRollup(**rollup) for rollup in rollups]
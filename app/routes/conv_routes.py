@@ -1,59 +1,249 @@
-from fastapi import APIRouter, HTTPException
-from app.models.conv import ConversationIn, ConversationOut, Message
+from typing import Union
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, Header
+from app.models.common import ReturnMode, IdOut
+from app.models.conv import ConversationIn, ConversationOut, Message, MessagePage
+from app.pagination import encode_cursor, decode_cursor
+from app.etag import ETAG_FIELD, format_etag, etag_matches
+from app.serialization import (
+    dumps_trusted,
+    trusted_response,
+    trusted_list_response,
+    fields_param,
+)
+from app.streaming import stream_response, wants_ndjson
 import app.cruds.conv_crud as crud
-from app.db import conversations_collection
+from app.config import CONV_STORAGE_MODE, MESSAGE_BUCKET_SIZE, CONV_STREAM_BATCH_SIZE
+from app.db import conversations_collection, message_buckets_collection
 
 
 router = APIRouter(prefix="/conversations", tags=["Conversations"])
 
 
-@router.post("/", response_model=ConversationOut)
-async def create_conversation(conv: ConversationIn):
-    conv_id = await crud.create_conv(conversations_collection, conv)
-    conversation = await crud.read_conv(conversations_collection, conv_id)
-    if not conversation:
-        raise HTTPException(status_code=500, detail="Conversation creation failed")
-    
-    conversation["_id"] = str(conversation["_id"])
-    
-    return ConversationOut(**conversation)
+def write_buckets():
+    """Bucket collection for writes, None while conversations are stored embedded."""
+    return message_buckets_collection if CONV_STORAGE_MODE == "bucketed" else None
+
+
+MAX_MESSAGE_BATCH_SIZE = 1000
+
+
+@router.post("/", response_model=Union[ConversationOut, IdOut])
+async def create_conversation(
+    conv: ConversationIn,
+    return_: ReturnMode = Query("representation", alias="return"),
+):
+    conv_id = await crud.create_conv(
+        conversations_collection,
+        conv,
+        buckets=write_buckets(),
+        bucket_size=MESSAGE_BUCKET_SIZE,
+    )
+    if return_ == "minimal":
+        return IdOut(_id=conv_id)
+    return ConversationOut(**conv.model_dump(), _id=conv_id)
 
 
 @router.post("/{conv_id}/messages", response_model=bool)
 async def add_message(conv_id: str, message: Message):
-    success = await crud.create_message(conversations_collection, conv_id, message)
+    success = await crud.create_message(
+        conversations_collection,
+        conv_id,
+        message,
+        buckets=message_buckets_collection,
+        bucketed_first=CONV_STORAGE_MODE == "bucketed",
+    )
     if not success:
         raise HTTPException(status_code=404, detail="Conversation not found or message not added")
     return True
 
 
-@router.get("/{conv_id}", response_model=ConversationOut)
-async def get_conversation(conv_id: str):
-    conversation = await crud.read_conv(conversations_collection, conv_id)
+@router.post("/{conv_id}/messages/batch", response_model=bool)
+async def add_messages(
+    conv_id: str,
+    messages: list[Message],
+    max_history: int | None = Query(None, ge=1),
+):
+    """Append messages; `max_history` trims embedded conversations to their last
+    messages, which shifts the `before` cursors of GET /{conv_id}/messages."""
+    if not messages:
+        raise HTTPException(status_code=400, detail="No messages given")
+    if len(messages) > MAX_MESSAGE_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413, detail=f"Batch exceeds {MAX_MESSAGE_BATCH_SIZE} messages"
+        )
+    try:
+        success = await crud.create_messages(
+            conversations_collection,
+            conv_id,
+            messages,
+            buckets=message_buckets_collection,
+            bucketed_first=CONV_STORAGE_MODE == "bucketed",
+            max_history=max_history,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not success:
+        raise HTTPException(
+            status_code=404, detail="Conversation not found or messages not added"
+        )
+    return True
+
+
+@router.get("/{conv_id}/messages", response_model=MessagePage)
+async def get_messages(
+    conv_id: str,
+    before: str | None = None,
+    limit: int = Query(30, ge=1, le=200),
+):
+    before_index = None
+    if before is not None:
+        try:
+            before_index = int(decode_cursor(before)["before"])
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    page = await crud.read_messages(
+        conversations_collection,
+        conv_id,
+        limit,
+        before=before_index,
+        buckets=message_buckets_collection,
+    )
+    if page is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    messages, start = page
+    next_cursor = encode_cursor({"before": start}) if start > 0 else None
+    return MessagePage(messages=messages, next_cursor=next_cursor)
+
+
+@router.get(
+    "/{conv_id}",
+    response_model=ConversationOut,
+    responses={304: {"description": "Not Modified"}},
+)
+async def get_conversation(
+    conv_id: str,
+    if_none_match: str | None = Header(None),
+    fields: frozenset[str] | None = Depends(fields_param(ConversationOut)),
+):
+    if if_none_match is not None:
+        etag = await crud.read_conv_etag(conversations_collection, conv_id)
+        if etag is not None and etag_matches(if_none_match, etag, fields):
+            return Response(
+                status_code=304, headers={"ETag": format_etag(etag, fields)}
+            )
+
+    conversation = await crud.read_conv(
+        conversations_collection,
+        conv_id,
+        buckets=message_buckets_collection,
+        fields=fields,
+    )
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
-    conversation["_id"] = str(conversation["_id"])
-    return ConversationOut(**conversation)
+    etag = conversation.get(ETAG_FIELD)
+    headers = {"ETag": format_etag(etag, fields)} if etag else None
+    return trusted_response(
+        ConversationOut, conversation, headers=headers, fields=fields
+    )
+
 
+async def serialize_user_conversations(
+    user_id: int,
+    after: str | None,
+    limit: int = 0,
+    fields: frozenset[str] | None = None,
+):
+    async for conv in crud.iter_user_conv(
+        conversations_collection,
+        user_id,
+        after=after,
+        limit=limit,
+        batch_size=CONV_STREAM_BATCH_SIZE,
+        buckets=message_buckets_collection,
+        fields=fields,
+    ):
+        yield dumps_trusted(ConversationOut, conv, fields)
 
 
-@router.get("/user/{user_id}", response_model=list[ConversationOut])
-async def get_user_conversations(user_id: int):
-    conversations = await crud.read_user_conv(conversations_collection, user_id)
-    if not conversations:
+@router.get(
+    "/user/{user_id}",
+    response_model=list[ConversationOut],
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def get_user_conversations(
+    user_id: int,
+    request: Request,
+    limit: int = Query(100, ge=1, le=1000),
+    after: str | None = None,
+    fields: frozenset[str] | None = Depends(fields_param(ConversationOut)),
+):
+    """List a user's conversations oldest first, `limit` per page.
+
+    JSON pages carry X-Next-After when they are full; pass it as `after` to get
+    the next page, which may be empty. NDJSON responses (Accept:
+    application/x-ndjson) honour `limit` but carry no header, the next page
+    starts after the `_id` of the last line.
+    """
+    if after is not None and not ObjectId.is_valid(after):
+        raise HTTPException(status_code=400, detail="Invalid after id")
+    if wants_ndjson(request):
+        return stream_response(
+            request, serialize_user_conversations(user_id, after, limit, fields)
+        )
+
+    conversations = await crud.read_user_conv(
+        conversations_collection,
+        user_id,
+        limit=limit,
+        after=after,
+        buckets=message_buckets_collection,
+        fields=fields,
+    )
+    if not conversations and after is None:
         raise HTTPException(status_code=404, detail="Conversations not found")
-    
-    for conv in conversations:
-        conv["_id"] = str(conv["_id"])
-    
-    return [ConversationOut(**conv) for conv in conversations]
+
+    headers = (
+        {"X-Next-After": str(conversations[-1]["_id"])}
+        if len(conversations) == limit
+        else None
+    )
+    return trusted_list_response(
+        ConversationOut, conversations, headers=headers, fields=fields
+    )
 
 
+@router.get(
+    "/user/{user_id}/stream",
+    response_model=list[ConversationOut],
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def stream_user_conversations(
+    user_id: int,
+    request: Request,
+    after: str | None = None,
+    fields: frozenset[str] | None = Depends(fields_param(ConversationOut)),
+):
+    if after is not None and not ObjectId.is_valid(after):
+        raise HTTPException(status_code=400, detail="Invalid after id")
+    return stream_response(
+        request, serialize_user_conversations(user_id, after, fields=fields)
+    )
+
 
 @router.put("/{conv_id}", response_model=bool)
 async def update_conversation(conv_id: str, conv: ConversationIn):
-    success = await crud.update_conv(conversations_collection, conv_id, conv)
+    success = await crud.update_conv(
+        conversations_collection,
+        conv_id,
+        conv,
+        buckets=message_buckets_collection,
+        bucket_size=MESSAGE_BUCKET_SIZE,
+        bucketed=CONV_STORAGE_MODE == "bucketed",
+    )
     if not success:
         raise HTTPException(status_code=404, detail="Conversation not found or not updated")
     return True
@@ -61,7 +251,9 @@ async def update_conversation(conv_id: str, conv: ConversationIn):
 
 @router.delete("/{conv_id}", response_model=bool)
 async def delete_conversation(conv_id: str):
-    success = await crud.delete_conv(conversations_collection, conv_id)
+    success = await crud.delete_conv(
+        conversations_collection, conv_id, buckets=message_buckets_collection
+    )
     if not success:
         raise HTTPException(status_code=404, detail="Conversation not found or not deleted")
-    return True
\ No newline at end of file
+    return True
@@ -1,38 +1,196 @@
-from fastapi import APIRouter, HTTPException
-from app.models.log import LogIn, LogOut
-from app.db import logs_collection
+from datetime import datetime
+from typing import Any, Union
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import ValidationError
+from pymongo.errors import PyMongoError
+from app.models.common import ReturnMode, IdOut
+from app.models.log import LogIn, LogOut, LogBatchOut
+from app.db import logs_collection, log_rollups_collection
+from app.config import LOG_WRITE_MODE, LOG_ROLLUPS_ENABLED, LOG_TIMESERIES
+from app.log_writer import log_writer
+from app.indexes import MissingIndexError
+from app.pagination import encode_cursor, decode_cursor
+from app.streaming import stream_response, wants_ndjson
+from app.serialization import (
+    dumps_trusted,
+    trusted_response,
+    trusted_list_response,
+    fields_param,
+)
 
 import app.cruds.log_crud as crud
 
 router = APIRouter(prefix="/logs", tags=["Logs"])
 
 
-@router.post("/", response_model=LogOut)
-async def create_log(log: LogIn):
-    inserted_id = await crud.create_log(logs_collection, log)
-    log_doc = await crud.read_log(logs_collection, inserted_id)
-    if not log_doc:
-        raise HTTPException(status_code=500, detail="Log creation failed")
+def write_rollups():
+    """Rollup collection to maintain on writes, None while rollups are disabled."""
+    return log_rollups_collection if LOG_ROLLUPS_ENABLED else None
+
+
+MAX_LOG_BATCH_SIZE = 10000
+
+
+@router.post("/", response_model=Union[LogOut, IdOut])
+async def create_log(
+    log: LogIn,
+    response: Response,
+    return_: ReturnMode = Query("representation", alias="return"),
+):
+    if log_writer is not None:
+        doc = crud.build_log_doc(log)
+        try:
+            await log_writer.submit(doc, wait=LOG_WRITE_MODE == "acknowledged")
+        except RuntimeError:
+            raise HTTPException(status_code=500, detail="Log creation failed")
+        except PyMongoError:
+            raise HTTPException(status_code=503, detail="Log storage unavailable")
+        if LOG_WRITE_MODE == "accepted":
+            response.status_code = 202
+        inserted_id = str(doc["_id"])
+    else:
+        inserted_id = await crud.create_log(
+            logs_collection, log, rollups=write_rollups(), timeseries=LOG_TIMESERIES
+        )
+
+    if return_ == "minimal":
+        return IdOut(_id=inserted_id)
+    return LogOut(**log.model_dump(), _id=inserted_id)
+
+
+@router.post("/batch", response_model=LogBatchOut)
+async def create_logs_batch(logs: list[dict[str, Any]]):
+    if len(logs) > MAX_LOG_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413, detail=f"Batch exceeds {MAX_LOG_BATCH_SIZE} logs"
+        )
+
+    valid_indexes, valid_logs = [], []
+    results = [None] * len(logs)
+    for index, raw in enumerate(logs):
+        try:
+            valid_logs.append(LogIn.model_validate(raw))
+            valid_indexes.append(index)
+        except ValidationError as e:
+            error = "; ".join(
+                f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()
+            )
+            results[index] = {"index": index, "_id": None, "error": error}
+
+    written = await crud.create_logs(
+        logs_collection, valid_logs, rollups=write_rollups(), timeseries=LOG_TIMESERIES
+    )
+    for index, item in zip(valid_indexes, written):
+        results[index] = {"index": index, **item}
+
+    inserted_count = sum(1 for item in results if item["error"] is None)
+    return LogBatchOut(inserted_count=inserted_count, results=results)
 
-    log_doc["_id"] = str(log_doc["_id"])
 
-    return LogOut(**log_doc)
+def decode_log_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+    try:
+        data = decode_cursor(cursor)
+        return datetime.fromisoformat(data["t"]), ObjectId(data["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def encode_log_cursor(log_doc: dict) -> str:
+    return encode_cursor(
+        {"t": log_doc["start_time"].isoformat(), "id": str(log_doc["_id"])}
+    )
+
+
+@router.get(
+    "/",
+    response_model=list[LogOut],
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def list_logs(
+    request: Request,
+    user_id: int | None = None,
+    type: str | None = None,
+    activity_id: str | None = None,
+    build_version: str | None = None,
+    from_: datetime | None = Query(None, alias="from"),
+    to: datetime | None = None,
+    after: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    filters = {
+        field: value
+        for field, value in (
+            ("user_id", user_id),
+            ("type", type),
+            ("activity_id", activity_id),
+            ("build_version", build_version),
+        )
+        if value is not None
+    }
+    after_key = decode_log_cursor(after) if after is not None else None
+    try:
+        _, index = crud.build_log_query(filters, from_, to, after_key)
+        # refuse up front, a stream can't change its status once it started
+        crud.log_index_hint(logs_collection, index, timeseries=LOG_TIMESERIES)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except MissingIndexError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    if wants_ndjson(request):
+        async def serialize():
+            log_docs = crud.iter_logs(
+                logs_collection,
+                filters,
+                from_,
+                to,
+                after_key,
+                limit=limit,
+                timeseries=LOG_TIMESERIES,
+            )
+            async for log_doc in log_docs:
+                yield dumps_trusted(LogOut, log_doc)
+
+        return stream_response(request, serialize())
+
+    try:
+        log_docs = await crud.find_logs(
+            logs_collection,
+            filters,
+            from_,
+            to,
+            after_key,
+            limit=limit,
+            timeseries=LOG_TIMESERIES,
+        )
+    except MissingIndexError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    headers = (
+        {"X-Next-Cursor": encode_log_cursor(log_docs[-1])}
+        if len(log_docs) == limit
+        else None
+    )
+    return trusted_list_response(LogOut, log_docs, headers=headers)
 
 
 @router.get("/{log_id}", response_model=LogOut)
-async def read_log(log_id: str):
-    log_doc = await crud.read_log(logs_collection, log_id)
+async def read_log(
+    log_id: str, fields: frozenset[str] | None = Depends(fields_param(LogOut))
+):
+    log_doc = await crud.read_log(
+        logs_collection, log_id, fields=fields, timeseries=LOG_TIMESERIES
+    )
     if not log_doc:
         raise HTTPException(status_code=404, detail="Log not found")
-
-    log_doc["_id"] = str(log_doc["_id"])
-
-    return LogOut(**log_doc)
+    return trusted_response(LogOut, log_doc, fields=fields)
 
 
 @router.put("/{log_id}", response_model=bool)
 async def update_log(log_id: str, log: LogIn):
-    updated_count = await crud.update_log(logs_collection, log_id, log)
+    updated_count = await crud.update_log(
+        logs_collection, log_id, log, rollups=write_rollups(), timeseries=LOG_TIMESERIES
+    )
     if updated_count == 0:
         raise HTTPException(status_code=404, detail="Log not updated")
     return True
@@ -40,7 +198,9 @@ async def update_log(log_id: str, log: LogIn):
 
 @router.delete("/{log_id}", response_model=bool)
 async def delete_log(log_id: str):
-    deleted_count = await crud.delete_log(logs_collection, log_id)
+    deleted_count = await crud.delete_log(
+        logs_collection, log_id, rollups=write_rollups(), timeseries=LOG_TIMESERIES
+    )
     if deleted_count == 0:
         raise HTTPException(status_code=404, detail="Log not deleted")
-    return True
\ No newline at end of file
+    return True
@@ -1,42 +1,98 @@
-from fastapi import APIRouter, HTTPException
-from app.models import UserIn, UserOut, UserDB
+from typing import Union
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Response
+from app.models import UserIn, UserOut, UserDB, UserPatch, UserLaunch, ReturnMode, IdOut
 from app.db import users_collection
-from app.cruds import create_user, read_user_by_id, update_user_by_id, delete_user_by_id
+from app.cache import user_cache
+from app.etag import ETAG_FIELD, format_etag, etag_matches
+from app.serialization import trusted_response, fields_param
+from app.cruds import (
+    create_user,
+    read_user_by_id,
+    read_user_etag,
+    update_user_by_id,
+    patch_user_by_id,
+    record_user_launch,
+    delete_user_by_id,
+)
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
 
-@router.post("/", response_model=UserOut)
-async def create_user_endpoint(user: UserIn):
+def user_response(
+    user_doc: dict | None, fields: frozenset[str] | None = None
+) -> Response:
+    if not user_doc:
+        raise HTTPException(status_code=404, detail="User not found")
+    etag = user_doc.get(ETAG_FIELD)
+    headers = {"ETag": format_etag(etag, fields)} if etag else None
+    return trusted_response(UserOut, user_doc, headers=headers, fields=fields)
+
+
+@router.post("/", response_model=Union[UserOut, IdOut])
+async def create_user_endpoint(
+    user: UserIn,
+    return_: ReturnMode = Query("representation", alias="return"),
+):
     user_db = UserDB(**user.model_dump())
     user_id = await create_user(users_collection, user_db)
-    user_doc = await read_user_by_id(users_collection, user_id)
+    if return_ == "minimal":
+        return IdOut(_id=user_id)
+    return UserOut(**user_db.model_dump())
 
-    if not user_doc:
-        raise HTTPException(status_code=500, detail="User creation failed")
 
-    return UserOut(**user_doc)
+@router.get(
+    "/{user_id}",
+    response_model=UserOut,
+    responses={304: {"description": "Not Modified"}},
+)
+async def read_user_endpoint(
+    user_id: int,
+    if_none_match: str | None = Header(None),
+    fields: frozenset[str] | None = Depends(fields_param(UserOut)),
+):
+    if if_none_match is not None:
+        etag = await read_user_etag(users_collection, user_id)
+        if etag is not None and etag_matches(if_none_match, etag, fields):
+            return Response(
+                status_code=304, headers={"ETag": format_etag(etag, fields)}
+            )
 
-
-@router.get("/{user_id}", response_model=UserOut)
-async def read_user_endpoint(user_id: int):
-    user_doc = await read_user_by_id(users_collection, user_id)
-    if not user_doc:
-        raise HTTPException(status_code=404, detail="User not found")
-    return UserOut(**user_doc)
+    user_doc = await read_user_by_id(
+        users_collection, user_id, cache=user_cache, fields=fields
+    )
+    return user_response(user_doc, fields)
 
 
 @router.put("/{user_id}", response_model=bool)
 async def update_user_endpoint(user_id: int, user: UserDB):
-    success = await update_user_by_id(users_collection, user_id, user)
+    success = await update_user_by_id(users_collection, user_id, user, cache=user_cache)
     if not success:
         raise HTTPException(status_code=404, detail="User not updated")
     return True
 
 
+@router.patch("/{user_id}", response_model=UserOut)
+async def patch_user_endpoint(user_id: int, user: UserPatch):
+    user_doc = await patch_user_by_id(
+        users_collection, user_id, user.model_dump(exclude_unset=True), cache=user_cache
+    )
+    return user_response(user_doc)
+
+
+@router.post("/{user_id}/launch", response_model=UserOut)
+async def record_launch_endpoint(user_id: int, launch: UserLaunch | None = None):
+    user_doc = await record_user_launch(
+        users_collection,
+        user_id,
+        launch.current_bundle_version if launch else None,
+        cache=user_cache,
+    )
+    return user_response(user_doc)
+
+
 @router.delete("/{user_id}", response_model=bool)
 async def delete_user_endpoint(user_id: int):
-    success = await delete_user_by_id(users_collection, user_id)
+    success = await delete_user_by_id(users_collection, user_id, cache=user_cache)
     if not success:
         raise HTTPException(status_code=404, detail="User not found")
-    return True
\ No newline at end of file
+    return True
@@ -0,0 +1,113 @@
+from functools import lru_cache
+from typing import Iterable
+from bson import ObjectId
+from fastapi import HTTPException, Query, Response
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+
+# Documents read from our own collections were validated when they were written,
+# so read routes can skip building Out models (and FastAPI re-validating them
+# against response_model) and encode the stored fields straight to JSON. The
+# output matches what the Out model would produce: the model's fields in order,
+# keyed by alias, defaults for missing ones and extra stored fields dropped.
+# pydantic_core.to_json encodes datetimes exactly like the models do.
+
+_REQUIRED = object()
+
+
+@lru_cache(maxsize=None)
+def _field_table(model: type[BaseModel]) -> tuple[tuple[str, str, object], ...]:
+    return tuple(
+        (field.alias or name, name, _REQUIRED if field.is_required() else field)
+        for name, field in model.model_fields.items()
+    )
+
+
+def parse_fields(model: type[BaseModel], fields: str) -> frozenset[str]:
+    """Map a comma separated `fields=` value (names or aliases) to keys of `model`."""
+    known = {}
+    for key, name, _ in _field_table(model):
+        known[key] = known[name] = key
+    selected = set()
+    for part in fields.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if part not in known:
+            raise ValueError(f"Unknown field: {part}")
+        selected.add(known[part])
+    if not selected:
+        raise ValueError("No fields given")
+    return frozenset(selected)
+
+
+def fields_param(model: type[BaseModel]):
+    """Dependency parsing the `fields=` partial response parameter for `model`."""
+    async def dependency(
+        fields: str | None = Query(
+            None, description="Comma separated fields to return, all by default"
+        ),
+    ) -> frozenset[str] | None:
+        if fields is None:
+            return None
+        try:
+            return parse_fields(model, fields)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return dependency
+
+
+def trusted_dict(
+    model: type[BaseModel], doc: dict, fields: frozenset[str] | None = None
+) -> dict:
+    out = {}
+    for key, name, field in _field_table(model):
+        if fields is not None and key not in fields:
+            continue
+        if key in doc:
+            out[key] = doc[key]
+        elif name in doc:
+            out[key] = doc[name]
+        elif field is _REQUIRED:
+            raise ValueError(f"Stored document has no {key!r} for {model.__name__}")
+        else:
+            out[key] = field.get_default(call_default_factory=True)
+    return out
+
+
+def _encode(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_trusted(
+    model: type[BaseModel], doc: dict, fields: frozenset[str] | None = None
+) -> bytes:
+    return to_json(trusted_dict(model, doc, fields), fallback=_encode)
+
+
+def trusted_response(
+    model: type[BaseModel],
+    doc: dict,
+    headers: dict | None = None,
+    fields: frozenset[str] | None = None,
+) -> Response:
+    return Response(
+        dumps_trusted(model, doc, fields),
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+def trusted_list_response(
+    model: type[BaseModel],
+    docs: Iterable[dict],
+    headers: dict | None = None,
+    fields: frozenset[str] | None = None,
+) -> Response:
+    content = to_json(
+        [trusted_dict(model, doc, fields) for doc in docs], fallback=_encode
+    )
+    return Response(content, media_type="application/json", headers=headers)
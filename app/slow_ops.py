@@ -0,0 +1,272 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable
+from pymongo import monitoring
+
+from app.config import (
+    MONGO_SLOW_OP_MS,
+    MONGO_SLOW_OP_EXPLAIN,
+    MONGO_SLOW_OP_EXPLAIN_INTERVAL,
+)
+from app.metrics import command_collection
+from app.request_context import current_route
+
+
+logger = logging.getLogger(__name__)
+
+# command fields that describe what a command does; documents, session and
+# cluster fields are left out of the shape
+SHAPE_FIELDS = (
+    "filter",
+    "query",
+    "sort",
+    "projection",
+    "hint",
+    "pipeline",
+    "update",
+    "updates",
+    "deletes",
+    "key",
+)
+# bulk update/delete commands carry one statement per write, the first one stands
+# for the batch
+STATEMENT_LISTS = ("updates", "deletes")
+EXPLAINABLE = frozenset(
+    {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+)
+SESSION_FIELDS = frozenset({"lsid", "txnNumber", "autocommit", "startTransaction"})
+
+
+def redact(value):
+    """Replace every parameter value with "?", keeping keys, operators and stages."""
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, list) and any(isinstance(item, dict) for item in value):
+        return [redact(item) for item in value]
+    return "?"
+
+
+def command_shape(command_name: str, command) -> dict:
+    shape = {command_name: command_collection(command_name, command)}
+    for field in SHAPE_FIELDS:
+        if field in command:
+            value = command[field]
+            if field in STATEMENT_LISTS:
+                value = value[:1]
+            shape[field] = redact(value)
+    return shape
+
+
+def explain_command(command) -> dict:
+    explained = {}
+    for key, value in command.items():
+        if key.startswith("$") or key in SESSION_FIELDS:
+            continue
+        explained[key] = value[:1] if key in STATEMENT_LISTS else value
+    return explained
+
+
+def plan_stages(plan: dict) -> list[str]:
+    """Stage names of a winning plan from the root down, e.g. ["FETCH", "IXSCAN"]."""
+    stages = []
+    plan = plan.get("queryPlan", plan)
+    while plan:
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        if "inputStage" in plan:
+            plan = plan["inputStage"]
+        elif plan.get("inputStages"):
+            # OR / SORT_MERGE plans, follow the first branch
+            plan = plan["inputStages"][0]
+        else:
+            break
+    return stages
+
+
+def explain_summary(result: dict) -> dict:
+    # aggregate explains nest the find part of the pipeline under its first $cursor
+    # stage
+    if "queryPlanner" not in result and result.get("stages"):
+        result = result["stages"][0].get("$cursor", {})
+    stats = result.get("executionStats", {})
+    stages = plan_stages(result.get("queryPlanner", {}).get("winningPlan", {}))
+    return {
+        "stages": stages,
+        "collection_scan": "COLLSCAN" in stages,
+        "n_returned": stats.get("nReturned"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "execution_time_ms": stats.get("executionTimeMillis"),
+    }
+
+
+class SlowOperationLog:
+    """Logs Mongo commands slower than `threshold_ms` and keeps per-shape stats.
+
+    Commands are grouped by their redacted shape. With `explain`, the first slow
+    occurrence of an explainable shape, and then at most one per
+    `explain_interval` seconds, is explained on the event loop passed to
+    `start`.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: int,
+        explain: bool = False,
+        explain_interval: float = 600.0,
+        max_shapes: int = 500,
+    ):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.explain_interval = explain_interval
+        self.max_shapes = max_shapes
+        self._lock = threading.Lock()
+        self._shapes: OrderedDict[str, dict] = OrderedDict()
+        self._explain_after: dict[str, float] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._get_client: Callable | None = None
+        self._pending: set = set()
+
+    def start(self, get_client: Callable):
+        self._loop = asyncio.get_running_loop()
+        self._get_client = get_client
+
+    async def stop(self):
+        self._loop = None
+        for future in list(self._pending):
+            future.cancel()
+        self._pending.clear()
+
+    def listener(self) -> monitoring.CommandListener:
+        return SlowOperationListener(self)
+
+    def record(
+        self,
+        command_name: str,
+        database: str,
+        command,
+        duration_ms: float,
+        failed: bool = False,
+    ):
+        shape = command_shape(command_name, command)
+        key = json.dumps(shape, sort_keys=True, default=str)
+        route = current_route()
+        logger.warning(
+            "Slow Mongo %s on %s.%s took %.1f ms%s (route %s): %s",
+            command_name,
+            database,
+            shape[command_name] or "-",
+            duration_ms,
+            " and failed" if failed else "",
+            route or "-",
+            key,
+        )
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._shapes.get(key)
+            if entry is None:
+                entry = self._shapes[key] = {
+                    "shape": shape,
+                    "database": database,
+                    "count": 0,
+                    "max_ms": 0.0,
+                    "explain": None,
+                }
+                if len(self._shapes) > self.max_shapes:
+                    evicted, _ = self._shapes.popitem(last=False)
+                    self._explain_after.pop(evicted, None)
+            else:
+                self._shapes.move_to_end(key)
+            entry["count"] += 1
+            entry["last_ms"] = duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["last_route"] = route
+            entry["last_seen"] = datetime.now(timezone.utc).isoformat()
+            due = (
+                self.explain
+                and command_name in EXPLAINABLE
+                and self._explain_after.get(key, 0.0) <= now
+            )
+            if due:
+                self._explain_after[key] = now + self.explain_interval
+        if due:
+            self._schedule_explain(key, database, command)
+
+    def _schedule_explain(self, key: str, database: str, command):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        # listeners run on Motor's executor threads, the explain itself runs on the loop
+        future = asyncio.run_coroutine_threadsafe(
+            self._explain(key, database, explain_command(command)), loop
+        )
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+
+    async def _explain(self, key: str, database: str, command: dict):
+        try:
+            result = await self._get_client()[database].command(
+                {"explain": command, "verbosity": "executionStats"}
+            )
+        except Exception:
+            logger.exception("Could not explain slow Mongo operation %s", key)
+            return
+        summary = explain_summary(result)
+        with self._lock:
+            entry = self._shapes.get(key)
+            if entry is not None:
+                entry["explain"] = summary
+                entry["explained_at"] = datetime.now(timezone.utc).isoformat()
+        logger.warning("Explain for slow Mongo operation %s: %s", key, summary)
+
+    def stats(self) -> list[dict]:
+        """Slow shapes, slowest first."""
+        with self._lock:
+            entries = [dict(entry) for entry in self._shapes.values()]
+        return sorted(entries, key=lambda entry: entry["max_ms"], reverse=True)
+
+
+class SlowOperationListener(monitoring.CommandListener):
+    def __init__(self, log: SlowOperationLog):
+        self.log = log
+        # the command is only on the started event, duration only on succeeded/failed
+        self._started: dict[tuple, tuple[str, object]] = {}
+
+    def started(self, event):
+        self._started[(event.connection_id, event.request_id)] = (
+            event.database_name,
+            event.command,
+        )
+
+    def _finish(self, event, failed: bool):
+        started = self._started.pop((event.connection_id, event.request_id), None)
+        duration_ms = event.duration_micros / 1000
+        if started is None or duration_ms < self.log.threshold_ms:
+            return
+        database, command = started
+        try:
+            self.log.record(
+                event.command_name, database, command, duration_ms, failed=failed
+            )
+        except Exception:
+            # never let logging break the command that was monitored
+            logger.exception("Could not record slow Mongo operation")
+
+    def succeeded(self, event):
+        self._finish(event, False)
+
+    def failed(self, event):
+        self._finish(event, True)
+
+
+slow_op_log = SlowOperationLog(
+    MONGO_SLOW_OP_MS,
+    explain=MONGO_SLOW_OP_EXPLAIN,
+    explain_interval=MONGO_SLOW_OP_EXPLAIN_INTERVAL,
+) if MONGO_SLOW_OP_MS is not None else None
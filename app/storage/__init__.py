@@ -0,0 +1,9 @@
+from .base import Collection, Cursor, Storage
+from .motor import LazyCollection, MotorStorage
+from .memory import MemoryCollection, MemoryStorage
+
+__all__ = [
+    "Collection", "Cursor", "Storage",
+    "LazyCollection", "MotorStorage",
+    "MemoryCollection", "MemoryStorage"
+]
@@ -0,0 +1,92 @@
+from typing import Any, AsyncIterator, Protocol, Sequence
+
+
+class Cursor(Protocol):
+    def __aiter__(self) -> AsyncIterator[dict]:
+        ...
+
+    async def to_list(self, length: int | None) -> list[dict]:
+        ...
+
+
+class Collection(Protocol):
+    """The subset of the Motor collection API used by app/cruds and the commands.
+
+    Results follow pymongo: insert results have `inserted_id(s)`, update results
+    `matched_count`/`modified_count`/`upserted_id`, delete results `deleted_count`.
+    """
+
+    name: str
+
+    async def insert_one(self, document: dict) -> Any:
+        ...
+
+    async def insert_many(self, documents: Sequence[dict], ordered: bool = True) -> Any:
+        ...
+
+    async def find_one(
+        self,
+        filter: dict,
+        projection: dict | None = None,
+        sort: list[tuple[str, int]] | None = None,
+    ) -> dict | None:
+        ...
+
+    def find(
+        self,
+        filter: dict,
+        projection: dict | None = None,
+        sort: list[tuple[str, int]] | None = None,
+        limit: int = 0,
+        **kwargs,
+    ) -> Cursor:
+        ...
+
+    async def find_one_and_update(
+        self,
+        filter: dict,
+        update: dict,
+        projection: dict | None = None,
+        upsert: bool = False,
+        return_document=False,
+    ) -> dict | None:
+        ...
+
+    async def find_one_and_replace(
+        self,
+        filter: dict,
+        replacement: dict,
+        projection: dict | None = None,
+        return_document=False,
+    ) -> dict | None:
+        ...
+
+    async def find_one_and_delete(
+        self, filter: dict, projection: dict | None = None
+    ) -> dict | None:
+        ...
+
+    async def update_one(self, filter: dict, update: dict, upsert: bool = False) -> Any:
+        ...
+
+    async def replace_one(
+        self, filter: dict, replacement: dict, upsert: bool = False
+    ) -> Any:
+        ...
+
+    async def delete_one(self, filter: dict) -> Any:
+        ...
+
+    async def delete_many(self, filter: dict) -> Any:
+        ...
+
+    async def bulk_write(self, requests: Sequence[Any], ordered: bool = True) -> Any:
+        ...
+
+    def aggregate(self, pipeline: list[dict], **kwargs) -> Cursor:
+        ...
+
+
+class Storage(Protocol):
+    def collection(self, name: str) -> Collection:
+        ...
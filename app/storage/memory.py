@@ -0,0 +1,724 @@
+from dataclasses import dataclass
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Any, Sequence
+from bson import ObjectId
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+
+# In-process stand-in for Motor collections with the query and update semantics
+# app/cruds relies on. Every operation runs without awaiting anything, so each
+# one is atomic with respect to other coroutines just like a single-document
+# write in Mongo. Documents are copied on the way in and out.
+
+_MISSING = object()
+
+
+@dataclass
+class InsertOneResult:
+    inserted_id: Any
+
+
+@dataclass
+class InsertManyResult:
+    inserted_ids: list
+
+
+@dataclass
+class UpdateResult:
+    matched_count: int
+    modified_count: int
+    upserted_id: Any = None
+
+
+@dataclass
+class DeleteResult:
+    deleted_count: int
+
+
+@dataclass
+class BulkWriteResult:
+    matched_count: int
+    modified_count: int
+    upserted_count: int
+
+
+def _clone(value):
+    if isinstance(value, dict):
+        return {k: _clone(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_clone(v) for v in value]
+    return value
+
+
+def _get(doc: dict, path: str):
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return _MISSING
+    return value
+
+
+def _set(doc: dict, path: str, value):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+
+def _unset(doc: dict, path: str):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(last, None)
+
+
+def _type_class(value):
+    if isinstance(value, bool):
+        return bool
+    if isinstance(value, (int, float)):
+        return float
+    for cls in (str, ObjectId, datetime):
+        if isinstance(value, cls):
+            return cls
+    return type(value)
+
+
+def _type_name(value) -> str:
+    if value is None:
+        return "null"
+    return {
+        bool: "bool",
+        float: "number",
+        str: "string",
+        ObjectId: "objectId",
+        datetime: "date",
+    }.get(
+        _type_class(value),
+        (
+            "object"
+            if isinstance(value, dict)
+            else "array" if isinstance(value, list) else "unknown"
+        ),
+    )
+
+
+def _compare(a, b) -> int | None:
+    """-1/0/1 for values of the same BSON type, None otherwise.
+
+    Mongo does not match across types.
+    """
+    if _type_class(a) is not _type_class(b):
+        return None
+    try:
+        return (a > b) - (a < b)
+    except TypeError:
+        return None
+
+
+def _equals(value, expected) -> bool:
+    if value is _MISSING:
+        return expected is None
+    if value == expected:
+        return True
+    # a scalar condition matches any element of an array field
+    return (
+        isinstance(value, list) and not isinstance(expected, list) and expected in value
+    )
+
+
+def _match_operator(value, operator: str, operand) -> bool:
+    if operator == "$eq":
+        return _equals(value, operand)
+    if operator == "$ne":
+        return not _equals(value, operand)
+    if operator == "$in":
+        return any(_equals(value, item) for item in operand)
+    if operator == "$nin":
+        return not any(_equals(value, item) for item in operand)
+    if operator == "$exists":
+        return (value is not _MISSING) == bool(operand)
+    if operator == "$type":
+        return value is not _MISSING and _type_name(value) == operand
+    if operator == "$size":
+        return isinstance(value, list) and len(value) == operand
+    if operator in ("$gt", "$gte", "$lt", "$lte"):
+        candidates = value if isinstance(value, list) else [value]
+        for candidate in candidates:
+            if candidate is _MISSING:
+                continue
+            order = _compare(candidate, operand)
+            if order is None:
+                continue
+            if {
+                "$gt": order > 0,
+                "$gte": order >= 0,
+                "$lt": order < 0,
+                "$lte": order <= 0,
+            }[operator]:
+                return True
+        return False
+    raise NotImplementedError(
+        f"Query operator {operator} is not supported by the memory storage"
+    )
+
+
+def matches(doc: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, sub) for sub in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, sub) for sub in condition):
+                return False
+        elif key.startswith("$"):
+            raise NotImplementedError(
+                f"Query operator {key} is not supported by the memory storage"
+            )
+        elif (
+            isinstance(condition, dict)
+            and condition
+            and all(op.startswith("$") for op in condition)
+        ):
+            value = _get(doc, key)
+            if not all(
+                _match_operator(value, op, operand) for op, operand in condition.items()
+            ):
+                return False
+        elif not _equals(_get(doc, key), condition):
+            return False
+    return True
+
+
+def _push(doc: dict, path: str, spec) -> bool:
+    items = _get(doc, path)
+    if items is _MISSING:
+        items = []
+        _set(doc, path, items)
+    elif not isinstance(items, list):
+        raise ValueError(f"The field {path!r} must be an array")
+    each = spec["$each"] if isinstance(spec, dict) and "$each" in spec else [spec]
+    before = len(items)
+    items.extend(_clone(item) for item in each)
+    if isinstance(spec, dict) and "$slice" in spec:
+        limit = spec["$slice"]
+        items[:] = items[len(items) + limit:] if limit < 0 else items[:limit]
+    return bool(each) or len(items) != before
+
+
+def _assign(doc: dict, path: str, value) -> bool:
+    if _get(doc, path) == value:
+        return False
+    _set(doc, path, _clone(value))
+    return True
+
+
+def apply_update(doc: dict, update: dict, inserting: bool = False) -> bool:
+    """Apply an update document to `doc` in place, return whether anything changed."""
+    changed = False
+    for operator, fields in update.items():
+        if operator == "$setOnInsert":
+            if inserting:
+                for path, value in fields.items():
+                    changed |= _assign(doc, path, value)
+        elif operator == "$set":
+            for path, value in fields.items():
+                changed |= _assign(doc, path, value)
+        elif operator == "$unset":
+            for path in fields:
+                changed |= _get(doc, path) is not _MISSING
+                _unset(doc, path)
+        elif operator == "$inc":
+            for path, amount in fields.items():
+                current = _get(doc, path)
+                changed |= _assign(
+                    doc, path, (0 if current is _MISSING else current) + amount
+                )
+        elif operator in ("$min", "$max"):
+            for path, value in fields.items():
+                current = _get(doc, path)
+                order = None if current is _MISSING else _compare(value, current)
+                if current is _MISSING or (
+                    order is not None
+                    and (order < 0 if operator == "$min" else order > 0)
+                ):
+                    changed |= _assign(doc, path, value)
+        elif operator == "$push":
+            for path, spec in fields.items():
+                changed |= _push(doc, path, spec)
+        else:
+            raise NotImplementedError(
+                f"Update operator {operator} is not supported by the memory storage"
+            )
+    return changed
+
+
+def _evaluate(doc: dict, expression):
+    if isinstance(expression, str) and expression.startswith("$"):
+        value = _get(doc, expression[1:])
+        return None if value is _MISSING else value
+    if isinstance(expression, dict) and len(expression) == 1:
+        (operator, args), = expression.items()
+        if operator == "$size":
+            return len(_evaluate(doc, args))
+        if operator == "$ifNull":
+            value = _evaluate(doc, args[0])
+            return _evaluate(doc, args[1]) if value is None else value
+        if operator == "$subtract":
+            left, right = (_evaluate(doc, arg) for arg in args)
+            if isinstance(left, datetime) and isinstance(right, datetime):
+                return _epoch_ms(left) - _epoch_ms(right)
+            return left - right
+        if operator == "$dateTrunc":
+            return _date_trunc(_evaluate(doc, args["date"]), args["unit"])
+        if operator == "$mergeObjects":
+            merged = {}
+            for item in args:
+                merged.update(_evaluate(doc, item) or {})
+            return merged
+        if operator.startswith("$"):
+            raise NotImplementedError(
+                f"Expression {operator} is not supported by the memory storage"
+            )
+    if isinstance(expression, dict):
+        return {key: _evaluate(doc, value) for key, value in expression.items()}
+    if isinstance(expression, list):
+        return [_evaluate(doc, item) for item in expression]
+    return expression
+
+
+def _as_naive_utc(value: datetime) -> datetime:
+    # BSON dates are UTC without a timezone
+    return (
+        value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+    )
+
+
+def _epoch_ms(value: datetime) -> int:
+    return (_as_naive_utc(value) - datetime(1970, 1, 1)) // timedelta(milliseconds=1)
+
+
+def _date_trunc(value: datetime, unit: str) -> datetime:
+    value = _as_naive_utc(value)
+    if unit == "day":
+        return datetime(value.year, value.month, value.day)
+    if unit == "hour":
+        return datetime(value.year, value.month, value.day, value.hour)
+    raise NotImplementedError(
+        f"$dateTrunc unit {unit} is not supported by the memory storage"
+    )
+
+
+def _percentile(values: list, p: float):
+    # nearest rank; Mongo's approximate method may pick a neighbouring value
+    ranked = sorted(values)
+    return ranked[max(math.ceil(p * len(ranked)) - 1, 0)] if ranked else None
+
+
+def _accumulate(operator: str, args, docs: list[dict]):
+    if operator == "$sum":
+        return sum(_evaluate(doc, args) or 0 for doc in docs)
+    input_ = args["input"] if operator == "$percentile" else args
+    values = [
+        value for value in (_evaluate(doc, input_) for doc in docs) if value is not None
+    ]
+    if operator == "$avg":
+        return sum(values) / len(values) if values else None
+    if operator == "$min":
+        return min(values, default=None)
+    if operator == "$max":
+        return max(values, default=None)
+    if operator == "$percentile":
+        return [_percentile(values, p) for p in args["p"]]
+    raise NotImplementedError(
+        f"Accumulator {operator} is not supported by the memory storage"
+    )
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _group(docs: list[dict], spec: dict) -> list[dict]:
+    groups: dict[Any, tuple[Any, list[dict]]] = {}
+    for doc in docs:
+        key = _evaluate(doc, spec["_id"])
+        groups.setdefault(_freeze(key), (key, []))[1].append(doc)
+    out = []
+    for key, members in groups.values():
+        group = {"_id": key}
+        for field, accumulator in spec.items():
+            if field != "_id":
+                (operator, args), = accumulator.items()
+                group[field] = _accumulate(operator, args, members)
+        out.append(group)
+    return out
+
+
+def _slice(items, spec):
+    if not isinstance(items, list):
+        return items
+    if isinstance(spec, list):
+        skip, count = spec
+        start = max(len(items) + skip, 0) if skip < 0 else skip
+        return items[start:start + count]
+    return items[spec:] if spec < 0 else items[:spec]
+
+
+def project(doc: dict, projection: dict | None) -> dict:
+    if not projection:
+        return _clone(doc)
+    include_id = projection.get("_id", 1) not in (0, False)
+    rest = {k: v for k, v in projection.items() if k != "_id"}
+    inclusive = any(
+        v not in (0, False) and not (isinstance(v, dict) and "$slice" in v)
+        for v in rest.values()
+    )
+
+    if inclusive:
+        out = {}
+        if include_id and "_id" in doc:
+            out["_id"] = doc["_id"]
+        for path, spec in rest.items():
+            if isinstance(spec, dict) and "$slice" in spec:
+                value = _get(doc, path)
+                if value is not _MISSING:
+                    _set(out, path, _slice(value, spec["$slice"]))
+            elif isinstance(spec, (dict, str)) and not isinstance(spec, bool):
+                _set(out, path, _evaluate(doc, spec))
+            else:
+                value = _get(doc, path)
+                if value is not _MISSING:
+                    _set(out, path, value)
+        return _clone(out)
+
+    out = _clone(doc)
+    if not include_id:
+        out.pop("_id", None)
+    for path, spec in rest.items():
+        if isinstance(spec, dict) and "$slice" in spec:
+            value = _get(out, path)
+            if value is not _MISSING:
+                _set(out, path, _slice(value, spec["$slice"]))
+        else:
+            _unset(out, path)
+    return out
+
+
+def _sort_key(path: str):
+    def key(doc):
+        value = _get(doc, path)
+        # missing and null sort before everything else, like in Mongo
+        return (0,) if value is _MISSING or value is None else (1, value)
+    return key
+
+
+def sort_docs(docs: list[dict], sort: list[tuple[str, int]] | None) -> list[dict]:
+    for path, direction in reversed(sort or []):
+        docs.sort(key=_sort_key(path), reverse=direction < 0)
+    return docs
+
+
+class MemoryCursor:
+    def __init__(self, docs: list[dict]):
+        self._docs = docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self._docs:
+            yield doc
+
+    async def to_list(self, length: int | None = None) -> list[dict]:
+        return self._docs if not length else self._docs[:length]
+
+
+class MemoryCollection:
+    def __init__(
+        self,
+        name: str,
+        storage: "MemoryStorage | None" = None,
+        timeseries: bool = False,
+    ):
+        self.name = name
+        self._storage = storage
+        # time-series collections have no unique _id index, their documents are
+        # keyed by identity instead
+        self.timeseries = timeseries
+        self._docs: dict[Any, dict] = {}
+
+    def _key(self, doc: dict) -> Any:
+        return id(doc) if self.timeseries else doc["_id"]
+
+    def _find(self, query: dict) -> list[dict]:
+        if (
+            set(query) == {"_id"}
+            and not isinstance(query["_id"], dict)
+            and not self.timeseries
+        ):
+            doc = self._docs.get(query["_id"])
+            return [doc] if doc is not None else []
+        return [doc for doc in self._docs.values() if matches(doc, query)]
+
+    def _insert(self, document: dict) -> dict:
+        doc = _clone(document)
+        if "_id" not in doc:
+            doc["_id"] = ObjectId()
+        if self._key(doc) in self._docs:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error collection: {self.name} "
+                f"dup key: {{ _id: {doc['_id']!r} }}"
+            )
+        self._docs[self._key(doc)] = doc
+        # callers rely on insert_one setting _id on their document like pymongo does
+        document.setdefault("_id", doc["_id"])
+        return doc
+
+    def _upsert_doc(self, query: dict, update: dict, replacement: bool) -> dict:
+        doc = {
+            key: value
+            for key, value in query.items()
+            if not key.startswith("$")
+            and not (isinstance(value, dict) and any(k.startswith("$") for k in value))
+        }
+        if replacement:
+            doc = {**({"_id": doc["_id"]} if "_id" in doc else {}), **update}
+        else:
+            apply_update(doc, update, inserting=True)
+        return self._insert(doc)
+
+    def _update(self, doc: dict, update: dict, replacement: bool) -> bool:
+        if not replacement:
+            return apply_update(doc, update)
+        replacement_doc = {k: v for k, v in update.items() if k != "_id"}
+        if {k: v for k, v in doc.items() if k != "_id"} == replacement_doc:
+            return False
+        doc_id = doc["_id"]
+        doc.clear()
+        doc["_id"] = doc_id
+        doc.update(_clone(replacement_doc))
+        return True
+
+    @staticmethod
+    def _is_replacement(update: dict) -> bool:
+        return not any(key.startswith("$") for key in update)
+
+    async def insert_one(self, document: dict) -> InsertOneResult:
+        return InsertOneResult(self._insert(document)["_id"])
+
+    async def insert_many(
+        self, documents: Sequence[dict], ordered: bool = True
+    ) -> InsertManyResult:
+        inserted, errors = [], []
+        for index, document in enumerate(documents):
+            try:
+                inserted.append(self._insert(document)["_id"])
+            except DuplicateKeyError as e:
+                errors.append({"index": index, "code": 11000, "errmsg": str(e)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted)})
+        return InsertManyResult(inserted)
+
+    async def find_one(
+        self,
+        filter: dict,
+        projection: dict | None = None,
+        sort: list[tuple[str, int]] | None = None,
+        **kwargs,
+    ) -> dict | None:
+        docs = sort_docs(self._find(filter), sort)
+        return project(docs[0], projection) if docs else None
+
+    def find(
+        self,
+        filter: dict | None = None,
+        projection: dict | None = None,
+        sort: list[tuple[str, int]] | None = None,
+        limit: int = 0,
+        **kwargs,
+    ) -> MemoryCursor:
+        docs = sort_docs(self._find(filter or {}), sort)
+        if limit:
+            docs = docs[:limit]
+        return MemoryCursor([project(doc, projection) for doc in docs])
+
+    async def find_one_and_update(
+        self,
+        filter: dict,
+        update: dict,
+        projection: dict | None = None,
+        upsert: bool = False,
+        return_document: bool = False,
+        **kwargs,
+    ) -> dict | None:
+        docs = self._find(filter)
+        if not docs:
+            if not upsert:
+                return None
+            doc = self._upsert_doc(filter, update, self._is_replacement(update))
+            return project(doc, projection) if return_document else None
+        doc = docs[0]
+        before = project(doc, projection)
+        self._update(doc, update, self._is_replacement(update))
+        # ReturnDocument.AFTER is True, BEFORE is False
+        return project(doc, projection) if return_document else before
+
+    async def find_one_and_replace(
+        self,
+        filter: dict,
+        replacement: dict,
+        projection: dict | None = None,
+        upsert: bool = False,
+        return_document: bool = False,
+        **kwargs,
+    ) -> dict | None:
+        if not self._is_replacement(replacement):
+            raise ValueError("replacement can not include $ operators")
+        return await self.find_one_and_update(
+            filter,
+            replacement,
+            projection=projection,
+            upsert=upsert,
+            return_document=return_document,
+        )
+
+    async def find_one_and_delete(
+        self, filter: dict, projection: dict | None = None, **kwargs
+    ) -> dict | None:
+        docs = self._find(filter)
+        if not docs:
+            return None
+        del self._docs[self._key(docs[0])]
+        return project(docs[0], projection)
+
+    async def update_one(
+        self, filter: dict, update: dict, upsert: bool = False, **kwargs
+    ) -> UpdateResult:
+        if self._is_replacement(update):
+            raise ValueError("update only works with $ operators")
+        docs = self._find(filter)
+        if not docs:
+            if not upsert:
+                return UpdateResult(0, 0)
+            return UpdateResult(0, 0, self._upsert_doc(filter, update, False)["_id"])
+        return UpdateResult(1, int(self._update(docs[0], update, False)))
+
+    async def replace_one(
+        self, filter: dict, replacement: dict, upsert: bool = False, **kwargs
+    ) -> UpdateResult:
+        if not self._is_replacement(replacement):
+            raise ValueError("replacement can not include $ operators")
+        docs = self._find(filter)
+        if not docs:
+            if not upsert:
+                return UpdateResult(0, 0)
+            return UpdateResult(
+                0, 0, self._upsert_doc(filter, replacement, True)["_id"]
+            )
+        return UpdateResult(1, int(self._update(docs[0], replacement, True)))
+
+    async def delete_one(self, filter: dict, **kwargs) -> DeleteResult:
+        docs = self._find(filter)
+        if docs:
+            del self._docs[self._key(docs[0])]
+        return DeleteResult(len(docs[:1]))
+
+    async def delete_many(self, filter: dict, **kwargs) -> DeleteResult:
+        docs = self._find(filter)
+        for doc in docs:
+            del self._docs[self._key(doc)]
+        return DeleteResult(len(docs))
+
+    async def bulk_write(
+        self, requests: Sequence[UpdateOne | DeleteOne], ordered: bool = True, **kwargs
+    ) -> BulkWriteResult:
+        matched = modified = upserted = 0
+        for request in requests:
+            if isinstance(request, DeleteOne):
+                await self.delete_one(request._filter)
+                continue
+            if not isinstance(request, UpdateOne):
+                raise NotImplementedError(
+                    f"{type(request).__name__} is not supported by the memory storage"
+                )
+            result = await self.update_one(
+                request._filter, request._doc, upsert=bool(request._upsert)
+            )
+            matched += result.matched_count
+            modified += result.modified_count
+            upserted += result.upserted_id is not None
+        return BulkWriteResult(matched, modified, upserted)
+
+    def aggregate(self, pipeline: list[dict], **kwargs) -> MemoryCursor:
+        """$match, $project, $group, $sort, $limit, $replaceWith and a final $merge."""
+        docs = [_clone(doc) for doc in self._docs.values()]
+        for stage in pipeline:
+            (name, spec), = stage.items()
+            if name == "$match":
+                docs = [doc for doc in docs if matches(doc, spec)]
+            elif name == "$project":
+                docs = [project(doc, spec) for doc in docs]
+            elif name == "$group":
+                docs = _group(docs, spec)
+            elif name == "$sort":
+                docs = sort_docs(docs, list(spec.items()))
+            elif name == "$limit":
+                docs = docs[:spec]
+            elif name == "$replaceWith":
+                docs = [_evaluate(doc, spec) for doc in docs]
+            elif name == "$merge":
+                self._merge(docs, spec)
+                docs = []
+            else:
+                raise NotImplementedError(
+                    f"Aggregation stage {name} is not supported by the memory storage"
+                )
+        return MemoryCursor(docs)
+
+    def _merge(self, docs: list[dict], spec: dict):
+        if (
+            self._storage is None
+            or spec.get("whenMatched") != "replace"
+            or spec.get("whenNotMatched") != "insert"
+        ):
+            raise NotImplementedError(
+                "Only $merge into a storage collection with replace/insert is supported"
+            )
+        target = self._storage.collection(spec["into"])
+        for doc in docs:
+            existing = target._find({field: doc.get(field) for field in spec["on"]})
+            if existing:
+                target._update(existing[0], doc, replacement=True)
+            else:
+                target._insert(doc)
+
+
+class MemoryStorage:
+    def __init__(self, timeseries: Sequence[str] = ()):
+        self._collections: dict[str, MemoryCollection] = {}
+        self._timeseries = frozenset(timeseries)
+
+    def collection(self, name: str) -> MemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(
+                name, self, timeseries=name in self._timeseries
+            )
+        return self._collections[name]
+
+    def clear(self):
+        for collection in self._collections.values():
+            collection._docs.clear()
@@ -0,0 +1,41 @@
+from typing import Callable
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+
+
+class LazyCollection:
+    """Collection of the shared client, importable before the client exists."""
+
+    def __init__(
+        self, get_client: Callable[[], AsyncIOMotorClient], db_name: str, name: str
+    ):
+        self._get_client = get_client
+        self._db_name = db_name
+        self._name = name
+        self._client = None
+        self._collection = None
+
+    def resolve(self) -> AsyncIOMotorCollection:
+        client = self._get_client()
+        if self._client is not client:
+            self._collection = client[self._db_name][self._name]
+            self._client = client
+        return self._collection
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def __getattr__(self, attr):
+        return getattr(self.resolve(), attr)
+
+    def __repr__(self):
+        return f"LazyCollection({self._name!r})"
+
+
+class MotorStorage:
+    def __init__(self, get_client: Callable[[], AsyncIOMotorClient], db_name: str):
+        self._get_client = get_client
+        self._db_name = db_name
+
+    def collection(self, name: str) -> LazyCollection:
+        return LazyCollection(self._get_client, self._db_name, name)
@@ -0,0 +1,41 @@
+from typing import AsyncIterator
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def wants_ndjson(request: Request) -> bool:
+    accept = request.headers.get("accept", "")
+    return any(
+        part.split(";")[0].strip() == NDJSON_MEDIA_TYPE for part in accept.split(",")
+    )
+
+
+async def json_array_stream(items: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    yield b"["
+    separator = b""
+    async for item in items:
+        yield separator + item
+        separator = b","
+    yield b"]"
+
+
+async def ndjson_stream(items: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    async for item in items:
+        yield item + b"\n"
+
+
+def stream_response(
+    request: Request, items: AsyncIterator[bytes], headers: dict | None = None
+) -> StreamingResponse:
+    """Stream already serialized JSON documents as NDJSON when the client asks for it,
+    otherwise as a JSON array."""
+    if wants_ndjson(request):
+        return StreamingResponse(
+            ndjson_stream(items), media_type=NDJSON_MEDIA_TYPE, headers=headers
+        )
+    return StreamingResponse(
+        json_array_stream(items), media_type="application/json", headers=headers
+    )
@@ -0,0 +1,313 @@
+"""Load-test the API in process and report throughput and latency per endpoint.
+
+Usage: python -m benchmarks.load [--backend memory|mongo]
+           [--scenarios users logs conversations] [--concurrency N]
+           [--duration SECONDS] [--baseline REPORT]
+
+Concurrent async clients drive the real app from app/main.py through httpx's
+ASGI transport, with the app lifespan running. The clients share the event loop
+with the app, so the numbers are the app's own per-request cost without network
+or server overhead. --backend mongo uses MONGO_KEY and writes into --db-name.
+Results are printed and saved as JSON under reports/.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from httpx import ASGITransport, AsyncClient
+
+
+REPORTS_DIR = Path(__file__).resolve().parent.parent / "reports"
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(samples: list[tuple[float, int]], elapsed: float) -> dict:
+    latencies = sorted(latency for latency, _ in samples)
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, status in samples if status >= 400),
+        "rps": len(samples) / elapsed if elapsed > 0 else 0.0,
+        "mean_ms": sum(latencies) / len(latencies) if latencies else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": latencies[-1] if latencies else 0.0,
+    }
+
+
+class Recorder:
+    def __init__(self, client: AsyncClient):
+        self.client = client
+        self.samples: dict[str, list[tuple[float, int]]] = defaultdict(list)
+
+    async def request(self, label: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        response = await self.client.request(method, url, **kwargs)
+        self.samples[label].append(
+            ((time.perf_counter() - start) * 1000, response.status_code)
+        )
+        return response
+
+
+def make_message(i: int) -> dict:
+    return {
+        "sender": "user" if i % 2 else "bot",
+        "text": f"Benchmark message {i}",
+        "time": datetime.now().isoformat(),
+    }
+
+
+def make_log(user_id: int) -> dict:
+    start = datetime.now(timezone.utc) - timedelta(seconds=random.randint(60, 86400))
+    return {
+        "user_id": user_id,
+        "activity_id": f"activity_{random.randint(1, 50)}",
+        "type": random.choice(["lesson", "quiz", "game"]),
+        "start_time": start.isoformat(),
+        "completion_time": (
+            start + timedelta(seconds=random.randint(5, 600))
+        ).isoformat(),
+        "build_version": "bench",
+    }
+
+
+class UsersScenario:
+    """App start: record a launch, then read the profile."""
+
+    name = "users"
+
+    def __init__(self, users: int = 1000):
+        self.user_ids = [900_000_000 + i for i in range(users)]
+
+    async def setup(self, recorder: Recorder):
+        for user_id in self.user_ids:
+            await recorder.client.delete(f"/users/{user_id}")
+            await recorder.client.post(
+                "/users/", json={"_id": user_id, "name": f"Bench {user_id}"}
+            )
+
+    async def step(self, recorder: Recorder):
+        user_id = random.choice(self.user_ids)
+        await recorder.request(
+            "POST /users/{user_id}/launch",
+            "POST",
+            f"/users/{user_id}/launch",
+            json={"current_bundle_version": 1},
+        )
+        await recorder.request("GET /users/{user_id}", "GET", f"/users/{user_id}")
+
+
+class LogsScenario:
+    """Log ingest: mostly single inserts with an occasional client-side batch."""
+
+    name = "logs"
+
+    def __init__(self, batch_size: int = 50):
+        self.batch_size = batch_size
+
+    async def setup(self, recorder: Recorder):
+        pass
+
+    async def step(self, recorder: Recorder):
+        user_id = random.randint(1, 1000)
+        if random.random() < 0.1:
+            batch = [make_log(user_id) for _ in range(self.batch_size)]
+            await recorder.request(
+                "POST /logs/batch", "POST", "/logs/batch", json=batch
+            )
+        else:
+            await recorder.request(
+                "POST /logs/",
+                "POST",
+                "/logs/",
+                params={"return": "minimal"},
+                json=make_log(user_id),
+            )
+
+
+class ConversationsScenario:
+    """Chat turn: append a message, read the latest page, sometimes the whole thread."""
+
+    name = "conversations"
+
+    def __init__(self, conversations: int = 200, history: int = 100):
+        self.conversations = conversations
+        self.history = history
+        self.conv_ids: list[str] = []
+
+    async def setup(self, recorder: Recorder):
+        for i in range(self.conversations):
+            response = await recorder.client.post(
+                "/conversations/",
+                params={"return": "minimal"},
+                json={
+                    "user_id": 800_000_000 + i,
+                    "messages": [make_message(j) for j in range(self.history)],
+                },
+            )
+            response.raise_for_status()
+            self.conv_ids.append(response.json()["_id"])
+
+    async def step(self, recorder: Recorder):
+        conv_id = random.choice(self.conv_ids)
+        await recorder.request(
+            "POST /conversations/{conv_id}/messages",
+            "POST",
+            f"/conversations/{conv_id}/messages",
+            json=make_message(random.randint(0, 1000)),
+        )
+        await recorder.request(
+            "GET /conversations/{conv_id}/messages",
+            "GET",
+            f"/conversations/{conv_id}/messages",
+            params={"limit": 30},
+        )
+        if random.random() < 0.1:
+            await recorder.request(
+                "GET /conversations/{conv_id}", "GET", f"/conversations/{conv_id}"
+            )
+
+
+SCENARIOS = {
+    "users": UsersScenario,
+    "logs": LogsScenario,
+    "conversations": ConversationsScenario,
+}
+
+
+async def run_scenario(
+    client: AsyncClient, scenario, concurrency: int, duration: float
+) -> dict:
+    recorder = Recorder(client)
+    await scenario.setup(recorder)
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            await scenario.step(recorder)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        label: summarize(samples, elapsed)
+        for label, samples in sorted(recorder.samples.items())
+    }
+
+
+async def run(scenarios: list[str], concurrency: int, duration: float) -> dict:
+    # app modules read STORAGE_BACKEND / MONGO_DB_NAME at import, main() sets them first
+    from app.main import app
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://bench"
+        ) as client:
+            for name in scenarios:
+                results[name] = await run_scenario(
+                    client, SCENARIOS[name](), concurrency, duration
+                )
+    return results
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: dict, baseline: dict | None = None):
+    print(
+        f"{'endpoint':<42} {'requests':>8} {'errors':>6} {'rps':>9} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    for scenario, endpoints in results.items():
+        print(f"[{scenario}]")
+        for label, stats in endpoints.items():
+            line = (
+                f"  {label:<40} {stats['requests']:>8} {stats['errors']:>6} "
+                f"{stats['rps']:>9.1f} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} "
+                f"{stats['p99_ms']:>8.2f}"
+            )
+            previous = (baseline or {}).get(scenario, {}).get(label)
+            if previous and previous["p95_ms"] and previous["rps"]:
+                line += (
+                    f"  rps {stats['rps'] / previous['rps'] - 1:+.0%}"
+                    f" p95 {stats['p95_ms'] / previous['p95_ms'] - 1:+.0%}"
+                )
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["memory", "mongo"], default="memory")
+    parser.add_argument(
+        "--db-name", default="swp_db_bench", help="database used with --backend mongo"
+    )
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS)
+    )
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument(
+        "--duration", type=float, default=10.0, help="seconds per scenario"
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="report path, reports/load-<time>.json by default",
+    )
+    parser.add_argument(
+        "--baseline", type=Path, default=None, help="earlier report to compare against"
+    )
+    args = parser.parse_args()
+
+    os.environ["STORAGE_BACKEND"] = args.backend
+    os.environ["MONGO_DB_NAME"] = args.db_name
+    os.environ.setdefault("MONGO_INDEX_MODE", "create")
+
+    started = datetime.now(timezone.utc)
+    results = asyncio.run(run(args.scenarios, args.concurrency, args.duration))
+    baseline = (
+        json.loads(args.baseline.read_text())["results"] if args.baseline else None
+    )
+    print_results(results, baseline)
+
+    output = args.output or REPORTS_DIR / f"load-{started:%Y%m%dT%H%M%SZ}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "created_at": started.isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "backend": args.backend,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "results": results,
+    }, indent=2))
+    print(f"Saved {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Compare trusted serialization of stored documents with building Out models.
+
+Usage: python -m benchmarks.serialization [--messages N ...] [--requests N]
+
+Both endpoints serve the same in-memory conversation through FastAPI, so the
+numbers are the per-request cost of validation plus serialization only.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from app.models import ConversationOut
+from app.serialization import trusted_response
+
+
+def make_conversation(messages: int) -> dict:
+    start = datetime(2024, 1, 1)
+    return {
+        "_id": ObjectId(),
+        "user_id": 123,
+        "messages": [
+            {
+                "sender": "user" if i % 2 else "bot",
+                "text": f"Message number {i}",
+                "time": start + timedelta(seconds=i),
+            }
+            for i in range(messages)
+        ],
+    }
+
+
+def make_app(doc: dict) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/validated", response_model=ConversationOut)
+    async def validated():
+        conv = dict(doc)
+        conv["_id"] = str(conv["_id"])
+        return ConversationOut(**conv)
+
+    @app.get("/trusted", response_model=ConversationOut)
+    async def trusted():
+        return trusted_response(ConversationOut, doc)
+
+    return app
+
+
+async def measure(client: AsyncClient, path: str, requests: int) -> float:
+    for _ in range(min(requests, 20)):
+        await client.get(path)
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = await client.get(path)
+        response.raise_for_status()
+    return (time.perf_counter() - start) / requests * 1000
+
+
+async def run(message_counts: list[int], requests: int):
+    print(
+        f"{'messages':>8} {'validated ms':>13} {'trusted ms':>11} "
+        f"{'saved ms':>9} {'speedup':>8}"
+    )
+    for messages in message_counts:
+        app = make_app(make_conversation(messages))
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://bench"
+        ) as client:
+            validated = await measure(client, "/validated", requests)
+            trusted = await measure(client, "/trusted", requests)
+        print(
+            f"{messages:>8} {validated:>13.3f} {trusted:>11.3f} "
+            f"{validated - trusted:>9.3f} {validated / trusted:>7.1f}x"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--messages", type=int, nargs="+", default=[10, 100, 1000, 5000]
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.messages, args.requests))
+
+
+if __name__ == "__main__":
+    main()
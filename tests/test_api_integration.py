@@ -1,11 +1,15 @@
 
+import json
 import unittest
-from unittest.mock import patch, AsyncMock
+from unittest.mock import patch, AsyncMock, MagicMock
 from fastapi.testclient import TestClient
 from datetime import datetime
 from bson import ObjectId
+from pymongo.errors import ServerSelectionTimeoutError
 
 from app.main import app
+from app.cache import LRUTTLCache
+from app.slow_ops import SlowOperationLog
 
 
 class TestUserAPI(unittest.TestCase):
@@ -16,6 +20,10 @@ class TestUserAPI(unittest.TestCase):
         self.user_data = {
             "name": "Test User"
         }
+        self.cache = LRUTTLCache(max_size=100, ttl=60)
+        cache_patcher = patch('app.routes.user_routes.user_cache', self.cache)
+        cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
 
     @patch('app.routes.user_routes.users_collection')
     def test_create_user_success(self, mock_collection):
@@ -41,6 +49,29 @@ class TestUserAPI(unittest.TestCase):
         data = response.json()
         self.assertEqual(data["name"], "Test User")
 
+    @patch('app.routes.user_routes.users_collection')
+    def test_create_user_without_read_back(self, mock_collection):
+        mock_collection.insert_one = AsyncMock()
+        mock_collection.find_one = AsyncMock()
+
+        response = self.client.post("/users/", json={"_id": 7, "name": "Test User"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["_id"], 7)
+        self.assertEqual(response.json()["launch_count"], 0)
+        mock_collection.find_one.assert_not_called()
+
+    @patch('app.routes.user_routes.users_collection')
+    def test_create_user_return_minimal(self, mock_collection):
+        mock_collection.insert_one = AsyncMock()
+
+        response = self.client.post(
+            "/users/?return=minimal", json={"_id": 7, "name": "Test User"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"_id": 7})
+
     @patch('app.routes.user_routes.users_collection')
     def test_create_user_invalid_data(self, mock_collection):
         response = self.client.post("/users/", json={"name": ""})
@@ -67,6 +98,52 @@ class TestUserAPI(unittest.TestCase):
         data = response.json()
         self.assertEqual(data["name"], "Test User")
 
+    @patch('app.routes.user_routes.users_collection')
+    def test_read_user_etag(self, mock_collection):
+        mock_collection.find_one = AsyncMock(
+            return_value={"_id": 123, "name": "Test User", "etag": "v1"}
+        )
+
+        response = self.client.get("/users/123")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["ETag"], '"v1"')
+        self.assertNotIn("etag", response.json())
+
+    @patch('app.routes.user_routes.users_collection')
+    def test_read_user_not_modified(self, mock_collection):
+        mock_collection.find_one = AsyncMock(return_value={"_id": 123, "etag": "v1"})
+
+        response = self.client.get("/users/123", headers={"If-None-Match": '"v1"'})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        mock_collection.find_one.assert_called_once_with(
+            {"_id": 123}, projection={"etag": 1}
+        )
+
+    @patch('app.routes.user_routes.users_collection')
+    def test_read_user_etag_changed(self, mock_collection):
+        mock_collection.find_one = AsyncMock(
+            return_value={"_id": 123, "name": "Test User", "etag": "v2"}
+        )
+
+        response = self.client.get("/users/123", headers={"If-None-Match": '"v1"'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["ETag"], '"v2"')
+
+    @patch('app.routes.user_routes.users_collection')
+    def test_read_user_fields(self, mock_collection):
+        mock_collection.find_one = AsyncMock(
+            return_value={"_id": 123, "name": "Test User", "launch_count": 5}
+        )
+
+        response = self.client.get("/users/123", params={"fields": "launch_count"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"launch_count": 5})
+
     @patch('app.routes.user_routes.users_collection')
     def test_read_user_not_found(self, mock_collection):
         mock_collection.find_one = AsyncMock(return_value=None)
@@ -76,6 +153,36 @@ class TestUserAPI(unittest.TestCase):
         self.assertEqual(response.status_code, 404)
         self.assertIn("User not found", response.json()["detail"])
 
+    @patch('app.routes.user_routes.users_collection')
+    def test_read_user_cached(self, mock_collection):
+        mock_collection.find_one = AsyncMock(
+            return_value={"_id": 123, "name": "Test User"}
+        )
+
+        first = self.client.get("/users/123")
+        second = self.client.get("/users/123")
+
+        self.assertEqual(first.json(), second.json())
+        mock_collection.find_one.assert_called_once()
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    @patch('app.routes.user_routes.users_collection')
+    def test_update_user_invalidates_cache(self, mock_collection):
+        mock_collection.find_one = AsyncMock(
+            return_value={"_id": 123, "name": "Test User"}
+        )
+        mock_result = AsyncMock()
+        mock_result.modified_count = 1
+        mock_collection.replace_one = AsyncMock(return_value=mock_result)
+
+        self.client.get("/users/123")
+        mock_collection.find_one.return_value = {"_id": 123, "name": "Renamed"}
+        self.client.put("/users/123", json={"name": "Renamed"})
+        response = self.client.get("/users/123")
+
+        self.assertEqual(response.json()["name"], "Renamed")
+        self.assertEqual(mock_collection.find_one.call_count, 2)
+
     @patch('app.routes.user_routes.users_collection')
     def test_update_user_success(self, mock_collection):
         mock_result = AsyncMock()
@@ -98,6 +205,70 @@ class TestUserAPI(unittest.TestCase):
         self.assertEqual(response.status_code, 404)
         self.assertIn("User not updated", response.json()["detail"])
 
+    @patch('app.routes.user_routes.users_collection')
+    def test_patch_user(self, mock_collection):
+        updated = {"_id": 123, "name": "Test User", "language": "en", "etag": "v2"}
+        mock_collection.find_one_and_update = AsyncMock(return_value=updated)
+
+        response = self.client.patch(
+            "/users/123", json={"language": "en", "gender": None}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["language"], "en")
+        self.assertEqual(response.headers["ETag"], '"v2"')
+        query, update = mock_collection.find_one_and_update.call_args[0]
+        self.assertEqual(query, {"_id": 123})
+        self.assertEqual(set(update["$set"]), {"language", "gender", "etag"})
+
+    @patch('app.routes.user_routes.users_collection')
+    def test_patch_user_rejects_null_name(self, mock_collection):
+        response = self.client.patch("/users/123", json={"name": None})
+
+        self.assertEqual(response.status_code, 422)
+        response = self.client.patch("/users/123", json={"launch_count": None})
+        self.assertEqual(response.status_code, 422)
+
+    @patch('app.routes.user_routes.users_collection')
+    def test_patch_user_not_found(self, mock_collection):
+        mock_collection.find_one_and_update = AsyncMock(return_value=None)
+
+        response = self.client.patch("/users/999", json={"language": "en"})
+
+        self.assertEqual(response.status_code, 404)
+
+    @patch('app.routes.user_routes.users_collection')
+    def test_record_launch(self, mock_collection):
+        updated = {
+            "_id": 123,
+            "name": "Test User",
+            "launch_count": 6,
+            "current_bundle_version": 3,
+        }
+        mock_collection.find_one_and_update = AsyncMock(return_value=updated)
+
+        response = self.client.post(
+            "/users/123/launch", json={"current_bundle_version": 3}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["launch_count"], 6)
+        update = mock_collection.find_one_and_update.call_args[0][1]
+        self.assertEqual(update["$inc"], {"launch_count": 1})
+        self.assertEqual(update["$set"]["current_bundle_version"], 3)
+
+    @patch('app.routes.user_routes.users_collection')
+    def test_record_launch_without_body(self, mock_collection):
+        updated = {"_id": 5, "name": "Test User", "launch_count": 1}
+        mock_collection.find_one_and_update = AsyncMock(return_value=updated)
+
+        response = self.client.post("/users/5/launch")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["launch_count"], 1)
+        update = mock_collection.find_one_and_update.call_args[0][1]
+        self.assertNotIn("current_bundle_version", update.get("$set", {}))
+
     @patch('app.routes.user_routes.users_collection')
     def test_delete_user_success(self, mock_collection):
         mock_result = AsyncMock()
@@ -150,6 +321,22 @@ class TestConversationAPI(unittest.TestCase):
         data = response.json()
         self.assertIn("_id", data)
 
+    @patch('app.routes.conv_routes.conversations_collection')
+    def test_create_conversation_return_minimal(self, mock_collection):
+        inserted_id = ObjectId()
+        mock_result = AsyncMock()
+        mock_result.inserted_id = inserted_id
+        mock_collection.insert_one = AsyncMock(return_value=mock_result)
+        mock_collection.find_one = AsyncMock()
+
+        response = self.client.post(
+            "/conversations/?return=minimal", json=self.conv_data
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"_id": str(inserted_id)})
+        mock_collection.find_one.assert_not_called()
+
     @patch('app.routes.conv_routes.conversations_collection')
     def test_read_conversation_found(self, mock_collection):
         conv_doc = {
@@ -165,6 +352,114 @@ class TestConversationAPI(unittest.TestCase):
         data = response.json()
         self.assertEqual(data["user_id"], 123)
 
+    @patch('app.routes.conv_routes.conversations_collection')
+    def test_add_messages_batch(self, mock_collection):
+        mock_result = MagicMock()
+        mock_result.modified_count = 1
+        mock_collection.update_one = AsyncMock(return_value=mock_result)
+        messages = [
+            {"sender": "bot", "text": f"Part {i}", "time": "2024-01-01T00:00:00"}
+            for i in range(3)
+        ]
+
+        response = self.client.post(
+            f"/conversations/{str(ObjectId())}/messages/batch",
+            params={"max_history": 50},
+            json=messages,
+        )
+
+        self.assertEqual(response.status_code, 200)
+        mock_collection.update_one.assert_called_once()
+        push = mock_collection.update_one.call_args[0][1]["$push"]["messages"]
+        self.assertEqual(push["$slice"], -50)
+
+    @patch('app.routes.conv_routes.conversations_collection')
+    def test_add_messages_batch_rejects_invalid_message(self, mock_collection):
+        messages = [
+            {"sender": "bot", "text": "ok", "time": "2024-01-01T00:00:00"},
+            {"sender": "bot", "text": ""},
+        ]
+
+        response = self.client.post(
+            f"/conversations/{str(ObjectId())}/messages/batch", json=messages
+        )
+
+        self.assertEqual(response.status_code, 422)
+
+    @patch('app.routes.conv_routes.conversations_collection')
+    def test_add_messages_batch_empty(self, mock_collection):
+        response = self.client.post(
+            f"/conversations/{str(ObjectId())}/messages/batch", json=[]
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    @patch('app.routes.conv_routes.conversations_collection')
+    def test_read_conversation_not_modified(self, mock_collection):
+        conv_id = ObjectId()
+        mock_collection.find_one = AsyncMock(
+            return_value={"_id": conv_id, "etag": "v1"}
+        )
+
+        response = self.client.get(
+            f"/conversations/{conv_id}", headers={"If-None-Match": 'W/"v0", "v1"'}
+        )
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], '"v1"')
+        mock_collection.find_one.assert_called_once_with(
+            {"_id": conv_id}, projection={"etag": 1}
+        )
+
+    @patch('app.routes.conv_routes.conversations_collection')
+    def test_read_conversation_etag(self, mock_collection):
+        conv_doc = {"_id": ObjectId(), "user_id": 123, "messages": [], "etag": "v1"}
+        mock_collection.find_one = AsyncMock(return_value=conv_doc)
+
+        response = self.client.get(f"/conversations/{conv_doc['_id']}")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["ETag"], '"v1"')
+
+    @patch('app.routes.conv_routes.conversations_collection')
+    def test_get_messages_page(self, mock_collection):
+        messages = [
+            {"sender": "user", "text": f"Message {i}", "time": datetime.now()}
+            for i in range(2)
+        ]
+        mock_collection.find_one = AsyncMock(
+            return_value={"_id": ObjectId(), "total": 5, "messages": messages}
+        )
+
+        response = self.client.get(f"/conversations/{str(ObjectId())}/messages?limit=2")
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data["messages"]), 2)
+        self.assertIsNotNone(data["next_cursor"])
+
+        mock_collection.find_one = AsyncMock(
+            return_value={"_id": ObjectId(), "messages": messages}
+        )
+        response = self.client.get(
+            f"/conversations/{str(ObjectId())}/messages",
+            params={"limit": 2, "before": data["next_cursor"]},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            mock_collection.find_one.call_args[1]["projection"]["messages"],
+            {"$slice": [1, 2]},
+        )
+        self.assertNotEqual(response.json()["next_cursor"], data["next_cursor"])
+
+    @patch('app.routes.conv_routes.conversations_collection')
+    def test_get_messages_invalid_cursor(self, mock_collection):
+        response = self.client.get(
+            f"/conversations/{str(ObjectId())}/messages?before=???"
+        )
+
+        self.assertEqual(response.status_code, 400)
+
     @patch('app.routes.conv_routes.conversations_collection')
     def test_read_conversation_not_found(self, mock_collection):
         mock_collection.find_one = AsyncMock(return_value=None)
@@ -207,6 +502,98 @@ class TestConversationAPI(unittest.TestCase):
         data = response.json()
         self.assertEqual(len(data), 2)
 
+    @patch('app.routes.conv_routes.conversations_collection')
+    def test_get_user_conversations_fields(self, mock_collection):
+        convs = [
+            {"_id": ObjectId(), "user_id": 123},
+            {"_id": ObjectId(), "user_id": 123},
+        ]
+        mock_cursor = AsyncMock()
+        mock_cursor.to_list.return_value = convs
+        mock_collection.find.return_value = mock_cursor
+
+        response = self.client.get(
+            "/conversations/user/123", params={"fields": "id,user_id"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()[0], {"user_id": 123, "_id": str(convs[0]["_id"])}
+        )
+        self.assertEqual(
+            mock_collection.find.call_args[1]["projection"],
+            {"_id": 1, "user_id": 1, "etag": 1},
+        )
+
+    @patch('app.routes.conv_routes.conversations_collection')
+    def test_get_user_conversations_unknown_field(self, mock_collection):
+        response = self.client.get(
+            "/conversations/user/123", params={"fields": "user_id,secret"}
+        )
+
+        self.assertEqual(response.status_code, 400)
+        mock_collection.find.assert_not_called()
+
+    @patch('app.routes.conv_routes.conversations_collection')
+    def test_get_user_conversations_next_page_header(self, mock_collection):
+        convs = [
+            {"_id": ObjectId(), "user_id": 123, "messages": []},
+            {"_id": ObjectId(), "user_id": 123, "messages": []}
+        ]
+        mock_cursor = AsyncMock()
+        mock_cursor.to_list.return_value = convs
+        mock_collection.find.return_value = mock_cursor
+
+        response = self.client.get("/conversations/user/123?limit=2")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["X-Next-After"], str(convs[1]["_id"]))
+        self.assertEqual(
+            self.client.get("/conversations/user/123?after=bad").status_code, 400
+        )
+
+    @patch('app.routes.conv_routes.conversations_collection')
+    def test_stream_user_conversations(self, mock_collection):
+        convs = [
+            {"_id": ObjectId(), "user_id": 123, "messages": []}
+            for _ in range(3)
+        ]
+        mock_cursor = MagicMock()
+        mock_cursor.__aiter__.return_value = convs
+        mock_collection.find.return_value = mock_cursor
+
+        response = self.client.get("/conversations/user/123/stream")
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            [conv["_id"] for conv in data], [str(conv["_id"]) for conv in convs]
+        )
+
+    @patch('app.routes.conv_routes.conversations_collection')
+    def test_get_user_conversations_ndjson(self, mock_collection):
+        convs = [
+            {"_id": ObjectId(), "user_id": 123, "messages": []}
+            for _ in range(3)
+        ]
+        mock_cursor = MagicMock()
+        mock_cursor.__aiter__.return_value = convs
+        mock_collection.find.return_value = mock_cursor
+
+        response = self.client.get(
+            "/conversations/user/123?limit=5",
+            headers={"Accept": "application/x-ndjson"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(
+            response.headers["content-type"].startswith("application/x-ndjson")
+        )
+        lines = response.text.splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(json.loads(lines[0])["_id"], str(convs[0]["_id"]))
+        self.assertEqual(mock_collection.find.call_args[1]["limit"], 5)
+
 
 class TestLogAPI(unittest.TestCase):
     """Integration tests for log api"""
@@ -243,6 +630,83 @@ class TestLogAPI(unittest.TestCase):
         data = response.json()
         self.assertIn("_id", data)
 
+    @patch('app.routes.log_routes.logs_collection')
+    def test_create_log_without_read_back(self, mock_collection):
+        inserted_id = ObjectId()
+        mock_result = AsyncMock()
+        mock_result.inserted_id = inserted_id
+        mock_collection.insert_one = AsyncMock(return_value=mock_result)
+        mock_collection.find_one = AsyncMock()
+
+        response = self.client.post("/logs/", json=self.log_data)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["_id"], str(inserted_id))
+        self.assertEqual(data["activity_id"], "test_activity")
+        mock_collection.find_one.assert_not_called()
+
+        response = self.client.post("/logs/?return=minimal", json=self.log_data)
+        self.assertEqual(response.json(), {"_id": str(inserted_id)})
+
+    @patch('app.routes.log_routes.LOG_WRITE_MODE', "accepted")
+    @patch('app.routes.log_routes.log_writer')
+    def test_create_log_accepted_mode(self, mock_writer):
+        mock_writer.submit = AsyncMock()
+
+        response = self.client.post("/logs/", json=self.log_data)
+
+        self.assertEqual(response.status_code, 202)
+        self.assertIn("_id", response.json())
+        self.assertFalse(mock_writer.submit.call_args[1]["wait"])
+
+    @patch('app.routes.log_routes.LOG_WRITE_MODE', "acknowledged")
+    @patch('app.routes.log_routes.log_writer')
+    def test_create_log_storage_unavailable(self, mock_writer):
+        mock_writer.submit = AsyncMock(
+            side_effect=ServerSelectionTimeoutError("no servers")
+        )
+
+        response = self.client.post("/logs/", json=self.log_data)
+
+        self.assertEqual(response.status_code, 503)
+
+    @patch('app.routes.log_routes.logs_collection')
+    def test_create_logs_batch(self, mock_collection):
+        mock_collection.insert_many = AsyncMock()
+        invalid_log = {**self.log_data, "type": ""}
+
+        response = self.client.post(
+            "/logs/batch", json=[self.log_data, invalid_log, self.log_data]
+        )
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["inserted_count"], 2)
+        self.assertEqual([item["index"] for item in data["results"]], [0, 1, 2])
+        self.assertIsNotNone(data["results"][0]["_id"])
+        self.assertIsNone(data["results"][1]["_id"])
+        self.assertIn("type", data["results"][1]["error"])
+        self.assertEqual(len(mock_collection.insert_many.call_args[0][0]), 2)
+
+    @patch('app.routes.log_routes.logs_collection')
+    def test_list_logs_missing_index(self, mock_collection):
+        mock_collection.name = "logs_new"
+
+        with patch.dict(
+            'app.indexes.missing_indexes', {"logs_new": {"user_id_start_time_id"}}
+        ):
+            response = self.client.get("/logs/", params={"user_id": 123})
+            streamed = self.client.get(
+                "/logs/",
+                params={"user_id": 123},
+                headers={"Accept": "application/x-ndjson"},
+            )
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(streamed.status_code, 503)
+        mock_collection.find.assert_not_called()
+
     @patch('app.routes.log_routes.logs_collection')
     def test_read_log_found(self, mock_collection):
         log_doc = {
@@ -261,6 +725,68 @@ class TestLogAPI(unittest.TestCase):
         data = response.json()
         self.assertEqual(data["user_id"], 123)
 
+    @patch('app.routes.log_routes.logs_collection')
+    def test_read_log_fields(self, mock_collection):
+        log_doc = {"_id": ObjectId(), "type": "test_type"}
+        mock_collection.find_one = AsyncMock(return_value=log_doc)
+
+        response = self.client.get(
+            f"/logs/{str(log_doc['_id'])}", params={"fields": "type"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"type": "test_type"})
+        self.assertEqual(
+            mock_collection.find_one.call_args[1]["projection"], {"type": 1}
+        )
+
+    @patch('app.routes.log_routes.logs_collection')
+    def test_list_logs(self, mock_collection):
+        log_docs = [
+            {
+                "_id": ObjectId(),
+                "user_id": 123,
+                "activity_id": "test_activity",
+                "type": "test_type",
+                "start_time": datetime(2024, 1, 1, 10, i),
+                "completion_time": datetime(2024, 1, 1, 11, i)
+            }
+            for i in range(2)
+        ]
+        last_id = log_docs[-1]["_id"]
+        mock_cursor = AsyncMock()
+        mock_cursor.to_list.return_value = log_docs
+        mock_collection.find.return_value = mock_cursor
+
+        response = self.client.get(
+            "/logs/", params={"user_id": 123, "type": "test_type", "limit": 2}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+        self.assertIn("X-Next-Cursor", response.headers)
+        self.assertEqual(
+            mock_collection.find.call_args[1]["hint"],
+            [("user_id", 1), ("type", 1), ("start_time", 1), ("_id", 1)],
+        )
+
+        response = self.client.get(
+            "/logs/",
+            params={"user_id": 123, "after": response.headers["X-Next-Cursor"]},
+        )
+        self.assertEqual(response.status_code, 200)
+        query = mock_collection.find.call_args[0][0]
+        self.assertEqual(query["$or"][1]["_id"], {"$gt": last_id})
+
+    @patch('app.routes.log_routes.logs_collection')
+    def test_list_logs_rejects_unsupported_shape(self, mock_collection):
+        response = self.client.get("/logs/", params={"value": "x"})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get("/logs/", params={"type": "a", "build_version": "1"})
+        self.assertEqual(response.status_code, 400)
+        mock_collection.find.assert_not_called()
+
     @patch('app.routes.log_routes.logs_collection')
     def test_update_log_success(self, mock_collection):
         mock_result = AsyncMock()
@@ -284,6 +810,115 @@ class TestLogAPI(unittest.TestCase):
         self.assertTrue(response.json())
 
 
+class TestAnalyticsAPI(unittest.TestCase):
+    """Integration tests for analytics api"""
+
+    def setUp(self):
+        self.client = TestClient(app)
+
+    @patch('app.routes.analytics_routes.logs_collection')
+    def test_user_durations(self, mock_collection):
+        groups = [{
+            "_id": {"day": datetime(2024, 1, 1), "type": "quiz"},
+            "count": 2,
+            "mean_ms": 1500.0,
+            "percentiles": [1000.0, 2000.0, 2000.0],
+        }]
+        mock_cursor = MagicMock()
+        mock_cursor.__aiter__.return_value = groups
+        mock_collection.aggregate.return_value = mock_cursor
+
+        response = self.client.get(
+            "/analytics/users/123/durations", params={"type": "quiz"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data[0]["count"], 2)
+        self.assertEqual(data[0]["p90_ms"], 2000.0)
+        pipeline = mock_collection.aggregate.call_args[0][0]
+        self.assertEqual(pipeline[0]["$match"], {"user_id": 123, "type": "quiz"})
+
+    @patch('app.routes.analytics_routes.log_rollups_collection')
+    def test_daily_rollups(self, mock_collection):
+        rollup = {
+            "day": datetime(2024, 1, 1),
+            "user_id": 123,
+            "type": "quiz",
+            "activity_id": "a1",
+            "count": 4,
+            "total_duration_ms": 4000,
+            "min_duration_ms": 500,
+            "max_duration_ms": 1500,
+        }
+        mock_cursor = AsyncMock()
+        mock_cursor.to_list.return_value = [rollup]
+        mock_collection.find.return_value = mock_cursor
+
+        response = self.client.get(
+            "/analytics/daily", params={"user_id": 123, "from": "2024-01-01T00:00:00"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["count"], 4)
+        query = mock_collection.find.call_args[0][0]
+        self.assertEqual(query, {"user_id": 123, "day": {"$gte": datetime(2024, 1, 1)}})
+
+    @patch('app.routes.analytics_routes.logs_collection')
+    def test_user_durations_unsupported_filters(self, mock_collection):
+        response = self.client.get(
+            "/analytics/users/123/durations",
+            params={"type": "quiz", "activity_id": "a"},
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+
+class TestAdminAPI(unittest.TestCase):
+    """Integration tests for admin api"""
+
+    def setUp(self):
+        self.client = TestClient(app)
+
+    @patch('app.routes.admin_routes.index_drift')
+    def test_get_index_drift(self, mock_drift):
+        report = {
+            "conversations": {"present": [], "missing": ["user_id_id"], "extra": []}
+        }
+        mock_drift.return_value = report
+
+        response = self.client.get("/admin/indexes")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), report)
+
+    def test_get_cache_stats(self):
+        with patch(
+            'app.routes.admin_routes.user_cache', LRUTTLCache(max_size=10, ttl=5)
+        ):
+            response = self.client.get("/admin/cache")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["users"]["max_size"], 10)
+
+    def test_get_slow_operations(self):
+        slow_log = SlowOperationLog(threshold_ms=100)
+        slow_log.record(
+            "find", "swp_db", {"find": "conversations", "filter": {"user_id": 7}}, 250.0
+        )
+
+        with patch('app.routes.admin_routes.slow_op_log', slow_log):
+            response = self.client.get("/admin/slow-ops")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["threshold_ms"], 100)
+        operation = response.json()["operations"][0]
+        self.assertEqual(
+            operation["shape"], {"find": "conversations", "filter": {"user_id": "?"}}
+        )
+        self.assertEqual(operation["count"], 1)
+
+
 class TestRootEndpoint(unittest.TestCase):
 
     def setUp(self):
@@ -296,6 +931,25 @@ class TestRootEndpoint(unittest.TestCase):
         data = response.json()
         self.assertEqual(data["message"], "API is running")
 
+    @patch('app.main.get_client')
+    def test_database_health_check(self, mock_get_client):
+        mock_get_client.return_value.admin.command = AsyncMock(return_value={"ok": 1})
+
+        response = self.client.get("/health/db")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["database"], "connected")
+
+    @patch('app.main.get_client')
+    def test_database_health_check_unavailable(self, mock_get_client):
+        mock_get_client.return_value.admin.command = AsyncMock(
+            side_effect=Exception("timed out")
+        )
+
+        response = self.client.get("/health/db")
+
+        self.assertEqual(response.status_code, 503)
+
 
 if __name__ == '__main__':
-    unittest.main() 
\ No newline at end of file
+    unittest.main() 
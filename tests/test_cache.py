@@ -0,0 +1,116 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.cache import LRUTTLCache
+
+
+class TestLRUTTLCache:
+    """Tests for in-process user cache"""
+
+    @pytest.mark.asyncio
+    async def test_hit_after_miss(self):
+        cache = LRUTTLCache(max_size=10, ttl=60)
+        loader = AsyncMock(return_value={"_id": 1})
+
+        first = await cache.get_or_load(1, loader)
+        second = await cache.get_or_load(1, loader)
+
+        assert first == second == {"_id": 1}
+        loader.assert_called_once()
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    @pytest.mark.asyncio
+    async def test_returns_copies(self):
+        cache = LRUTTLCache(max_size=10, ttl=60)
+        loader = AsyncMock(return_value={"_id": 1})
+
+        first = await cache.get_or_load(1, loader)
+        first["_id"] = "changed"
+
+        assert await cache.get_or_load(1, loader) == {"_id": 1}
+
+    @pytest.mark.asyncio
+    async def test_entry_expires(self):
+        cache = LRUTTLCache(max_size=10, ttl=5)
+        loader = AsyncMock(return_value={"_id": 1})
+
+        with patch("app.cache.time.monotonic", return_value=100.0):
+            await cache.get_or_load(1, loader)
+        with patch("app.cache.time.monotonic", return_value=106.0):
+            await cache.get_or_load(1, loader)
+
+        assert loader.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_evicts_least_recently_used(self):
+        cache = LRUTTLCache(max_size=2, ttl=60)
+        loader = AsyncMock(side_effect=lambda: {"v": 1})
+
+        await cache.get_or_load(1, loader)
+        await cache.get_or_load(2, loader)
+        await cache.get_or_load(1, loader)
+        await cache.get_or_load(3, loader)
+        await cache.get_or_load(1, loader)
+        await cache.get_or_load(2, loader)
+
+        assert loader.call_count == 4
+        assert cache.stats()["size"] == 2
+
+    @pytest.mark.asyncio
+    async def test_none_not_cached(self):
+        cache = LRUTTLCache(max_size=10, ttl=60)
+        loader = AsyncMock(return_value=None)
+
+        assert await cache.get_or_load(1, loader) is None
+        assert await cache.get_or_load(1, loader) is None
+        assert loader.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_load(self):
+        cache = LRUTTLCache(max_size=10, ttl=60)
+        release = asyncio.Event()
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return {"_id": 1}
+
+        tasks = [asyncio.create_task(cache.get_or_load(1, loader)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks)
+
+        assert calls == 1
+        assert all(result == {"_id": 1} for result in results)
+
+    @pytest.mark.asyncio
+    async def test_invalidate_during_load_discards_result(self):
+        cache = LRUTTLCache(max_size=10, ttl=60)
+        release = asyncio.Event()
+
+        async def stale_loader():
+            await release.wait()
+            return {"name": "old"}
+
+        task = asyncio.create_task(cache.get_or_load(1, stale_loader))
+        await asyncio.sleep(0)
+        await cache.invalidate(1)
+        release.set()
+        await task
+
+        fresh = await cache.get_or_load(1, AsyncMock(return_value={"name": "new"}))
+        assert fresh == {"name": "new"}
+
+    @pytest.mark.asyncio
+    async def test_loader_error_propagates(self):
+        cache = LRUTTLCache(max_size=10, ttl=60)
+
+        with pytest.raises(RuntimeError):
+            await cache.get_or_load(1, AsyncMock(side_effect=RuntimeError("db down")))
+        assert await cache.get_or_load(1, AsyncMock(return_value={"_id": 1})) == {
+            "_id": 1
+        }
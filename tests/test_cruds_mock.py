@@ -1,14 +1,51 @@
 import pytest
-from unittest.mock import AsyncMock, Mock
+from unittest.mock import AsyncMock, Mock, patch
 from bson import ObjectId
+from pymongo.errors import BulkWriteError, OperationFailure
 from datetime import datetime
 
-from app.cruds.user_crud import create_user, read_user_by_id, update_user_by_id, delete_user_by_id
-from app.cruds.conv_crud import create_conv, create_message, read_conv, read_user_conv, update_conv, delete_conv
-from app.cruds.log_crud import create_log, read_log, update_log, delete_log
+from app.cruds.user_crud import (
+    create_user,
+    read_user_by_id,
+    update_user_by_id,
+    delete_user_by_id,
+    patch_user_by_id,
+    record_user_launch,
+)
+from app.cruds.conv_crud import (
+    create_conv,
+    create_message,
+    create_messages,
+    read_conv,
+    read_user_conv,
+    update_conv,
+    delete_conv,
+    split_into_buckets,
+    migrate_conv_to_buckets,
+    read_messages,
+    iter_user_conv,
+)
+from app.commands.migrate_logs_timeseries import copy_logs, id_ranges
+from app.cruds.log_crud import (
+    build_log_doc,
+    insert_log_docs,
+    create_log,
+    create_logs,
+    build_log_query,
+    find_logs,
+    duration_stats,
+    read_log,
+    update_log,
+    delete_log,
+    with_meta,
+)
 from app.models.user import UserDB
 from app.models.conv import ConversationIn, Message
 from app.models.log import LogIn
+from app.cache import LRUTTLCache
+from app.indexes import MissingIndexError
+from app.storage import MemoryStorage
+from app.storage.memory import matches
 
 
 class TestUserCRUDMock:
@@ -69,6 +106,7 @@ class TestUserCRUDMock:
         
         assert result is True
         mock_collection.replace_one.assert_called_once()
+        assert mock_collection.replace_one.call_args[0][1]["etag"]
 
     @pytest.mark.asyncio
     async def test_update_user_by_id_not_found(self):
@@ -109,6 +147,82 @@ class TestUserCRUDMock:
         assert result is False
         mock_collection.delete_one.assert_called_once_with({"_id": 999})
 
+    @pytest.mark.asyncio
+    async def test_read_user_by_id_uses_cache(self):
+        mock_collection = AsyncMock()
+        mock_collection.find_one.return_value = {"_id": 123, "name": "John Doe"}
+        cache = LRUTTLCache(max_size=10, ttl=60)
+
+        await read_user_by_id(mock_collection, 123, cache=cache)
+        result = await read_user_by_id(mock_collection, 123, cache=cache)
+
+        assert result == {"_id": 123, "name": "John Doe"}
+        mock_collection.find_one.assert_called_once_with({"_id": 123})
+
+    @pytest.mark.asyncio
+    async def test_write_invalidates_cache(self):
+        mock_collection = AsyncMock()
+        mock_collection.find_one.return_value = {"_id": 123, "name": "John Doe"}
+        mock_collection.replace_one.return_value = Mock(modified_count=1)
+        mock_collection.delete_one.return_value = Mock(deleted_count=1)
+        cache = LRUTTLCache(max_size=10, ttl=60)
+
+        await read_user_by_id(mock_collection, 123, cache=cache)
+        await update_user_by_id(
+            mock_collection, 123, UserDB(name="Jane Doe"), cache=cache
+        )
+        assert cache.stats()["size"] == 0
+
+        await read_user_by_id(mock_collection, 123, cache=cache)
+        await delete_user_by_id(mock_collection, 123, cache=cache)
+        assert cache.stats()["size"] == 0
+        assert mock_collection.find_one.call_count == 2
+
+
+class TestUserPartialUpdateCRUDMock:
+    """Mock tests for atomic user updates"""
+
+    @pytest.mark.asyncio
+    async def test_patch_sets_only_given_fields(self):
+        mock_collection = AsyncMock()
+        mock_collection.find_one_and_update.return_value = {
+            "_id": 123,
+            "name": "John Doe",
+            "language": "en",
+        }
+
+        result = await patch_user_by_id(mock_collection, 123, {"language": "en"})
+
+        assert result["language"] == "en"
+        update = mock_collection.find_one_and_update.call_args[0][1]
+        assert list(update) == ["$set"]
+        assert update["$set"]["language"] == "en"
+        assert "name" not in update["$set"]
+
+    @pytest.mark.asyncio
+    async def test_empty_patch_reads_user(self):
+        mock_collection = AsyncMock()
+        mock_collection.find_one.return_value = {"_id": 123, "name": "John Doe"}
+
+        result = await patch_user_by_id(mock_collection, 123, {})
+
+        assert result == {"_id": 123, "name": "John Doe"}
+        mock_collection.find_one_and_update.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_launch_without_bundle_version(self):
+        mock_collection = AsyncMock()
+        cache = LRUTTLCache(max_size=10, ttl=60)
+        mock_collection.find_one.return_value = {"_id": 123, "name": "John Doe"}
+        await read_user_by_id(mock_collection, 123, cache=cache)
+
+        await record_user_launch(mock_collection, 123, cache=cache)
+
+        update = mock_collection.find_one_and_update.call_args[0][1]
+        assert update["$inc"] == {"launch_count": 1}
+        assert "current_bundle_version" not in update["$set"]
+        assert cache.stats()["size"] == 0
+
 
 class TestConversationCRUDMock:
     """Mock tests for conv crud"""
@@ -204,9 +318,38 @@ class TestConversationCRUDMock:
         result = await read_user_conv(mock_collection, 123)
         
         assert result == convs
-        mock_collection.find.assert_called_once_with({"user_id": 123})
+        mock_collection.find.assert_called_once_with(
+            {"user_id": 123}, projection=None, sort=[("_id", 1)], limit=100
+        )
         mock_cursor.to_list.assert_called_once_with(length=100)
 
+    @pytest.mark.asyncio
+    async def test_read_user_conv_after(self):
+        mock_collection = Mock()
+        mock_cursor = AsyncMock()
+        mock_cursor.to_list.return_value = []
+        mock_collection.find.return_value = mock_cursor
+        after = ObjectId()
+
+        await read_user_conv(mock_collection, 123, limit=10, after=str(after))
+
+        query = mock_collection.find.call_args[0][0]
+        assert query == {"user_id": 123, "_id": {"$gt": after}}
+        assert mock_collection.find.call_args[1]["limit"] == 10
+
+    @pytest.mark.asyncio
+    async def test_iter_user_conv(self):
+        convs = [{"_id": ObjectId(), "user_id": 123, "messages": []} for _ in range(3)]
+        mock_collection = Mock()
+        mock_collection.find.return_value = AsyncCursor(convs)
+
+        result = [
+            conv async for conv in iter_user_conv(mock_collection, 123, batch_size=2)
+        ]
+
+        assert result == convs
+        assert mock_collection.find.call_args[1]["batch_size"] == 2
+
     @pytest.mark.asyncio
     async def test_update_conv_success(self):
         mock_collection = AsyncMock()
@@ -222,6 +365,27 @@ class TestConversationCRUDMock:
         assert result is True
         mock_collection.replace_one.assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_update_conv_removes_buckets_of_bucketed_conversation(self):
+        conv_id = ObjectId()
+        mock_collection = AsyncMock()
+        mock_collection.find_one_and_replace.return_value = {
+            "_id": conv_id,
+            "bucket_size": 2,
+        }
+        mock_buckets = AsyncMock()
+        conv = ConversationIn(user_id=123, messages=[])
+
+        result = await update_conv(
+            mock_collection, str(conv_id), conv, buckets=mock_buckets, bucketed=False
+        )
+
+        assert result is True
+        replacement = mock_collection.find_one_and_replace.call_args[0][1]
+        assert "bucket_size" not in replacement
+        mock_buckets.delete_many.assert_called_once_with({"conversation_id": conv_id})
+        mock_buckets.insert_many.assert_not_called()
+
     @pytest.mark.asyncio
     async def test_update_conv_invalid_id(self):
         mock_collection = AsyncMock()
@@ -255,6 +419,487 @@ class TestConversationCRUDMock:
         mock_collection.delete_one.assert_not_called()
 
 
+class AsyncCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self.docs:
+            yield doc
+
+
+class TestBucketedConversationCRUDMock:
+    """Mock tests for bucketed conv storage"""
+
+    def make_messages(self, count):
+        return [
+            {"sender": "user", "text": f"Message {i}", "time": datetime(2024, 1, 1)}
+            for i in range(count)
+        ]
+
+    def test_split_into_buckets(self):
+        conv_id = ObjectId()
+        buckets = split_into_buckets(conv_id, self.make_messages(5), 2)
+
+        assert [b["seq"] for b in buckets] == [0, 1, 2]
+        assert [b["count"] for b in buckets] == [2, 2, 1]
+        assert all(b["conversation_id"] == conv_id for b in buckets)
+
+    @pytest.mark.asyncio
+    async def test_create_conv_bucketed(self):
+        mock_collection = AsyncMock()
+        mock_buckets = AsyncMock()
+        messages = [
+            Message(sender="user", text=f"Hi {i}", time=datetime.now())
+            for i in range(3)
+        ]
+        conv = ConversationIn(user_id=123, messages=messages)
+
+        await create_conv(mock_collection, conv, buckets=mock_buckets, bucket_size=2)
+
+        header = mock_collection.insert_one.call_args[0][0]
+        assert "messages" not in header
+        assert header["message_count"] == 3
+        assert header["bucket_size"] == 2
+        assert len(mock_buckets.insert_many.call_args[0][0]) == 2
+
+    @pytest.mark.asyncio
+    async def test_create_conv_bucketed_removes_header_on_failure(self):
+        mock_collection = AsyncMock()
+        mock_buckets = AsyncMock()
+        mock_buckets.insert_many.side_effect = OperationFailure("write failed")
+        messages = [Message(sender="user", text="Hi", time=datetime.now())]
+        conv = ConversationIn(user_id=123, messages=messages)
+
+        with pytest.raises(OperationFailure):
+            await create_conv(mock_collection, conv, buckets=mock_buckets)
+
+        conv_id = mock_collection.insert_one.call_args[0][0]["_id"]
+        mock_buckets.delete_many.assert_called_once_with({"conversation_id": conv_id})
+        mock_collection.delete_one.assert_called_once_with({"_id": conv_id})
+
+    @pytest.mark.asyncio
+    async def test_create_message_bucketed(self):
+        mock_collection = AsyncMock()
+        mock_collection.find_one_and_update.return_value = {
+            "_id": ObjectId(),
+            "message_count": 5,
+            "bucket_size": 2,
+        }
+        mock_buckets = AsyncMock()
+        message = Message(sender="bot", text="Hello", time=datetime.now())
+
+        result = await create_message(
+            mock_collection, str(ObjectId()), message, buckets=mock_buckets
+        )
+
+        assert result is True
+        bucket_filter = mock_buckets.update_one.call_args[0][0]
+        assert bucket_filter["seq"] == 2
+        assert mock_buckets.update_one.call_args[1]["upsert"] is True
+        mock_collection.update_one.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_create_message_bucketed_undoes_reservation_on_failure(self):
+        conv_id = ObjectId()
+        mock_collection = AsyncMock()
+        mock_collection.find_one_and_update.return_value = {
+            "_id": conv_id,
+            "message_count": 5,
+            "bucket_size": 2,
+        }
+        mock_buckets = AsyncMock()
+        mock_buckets.update_one.side_effect = OperationFailure("write failed")
+        message = Message(sender="bot", text="Hello", time=datetime.now())
+
+        with pytest.raises(OperationFailure):
+            await create_message(
+                mock_collection, str(conv_id), message, buckets=mock_buckets
+            )
+
+        query, update = mock_collection.update_one.call_args[0]
+        assert query == {"_id": conv_id, "message_count": 5}
+        assert update["$inc"] == {"message_count": -1}
+
+    @pytest.mark.asyncio
+    async def test_create_message_falls_back_to_embedded(self):
+        mock_collection = AsyncMock()
+        mock_collection.find_one_and_update.return_value = None
+        mock_collection.update_one.return_value.modified_count = 1
+        mock_buckets = AsyncMock()
+        message = Message(sender="bot", text="Hello", time=datetime.now())
+
+        result = await create_message(
+            mock_collection, str(ObjectId()), message, buckets=mock_buckets
+        )
+
+        assert result is True
+        mock_buckets.update_one.assert_not_called()
+        assert "$push" in mock_collection.update_one.call_args[0][1]
+
+    @pytest.mark.asyncio
+    async def test_create_message_embedded_first_falls_back_to_buckets(self):
+        mock_collection = AsyncMock()
+        mock_collection.update_one.return_value.modified_count = 0
+        mock_collection.find_one_and_update.return_value = {
+            "_id": ObjectId(),
+            "message_count": 1,
+            "bucket_size": 2,
+        }
+        mock_buckets = AsyncMock()
+        message = Message(sender="bot", text="Hello", time=datetime.now())
+
+        result = await create_message(
+            mock_collection,
+            str(ObjectId()),
+            message,
+            buckets=mock_buckets,
+            bucketed_first=False,
+        )
+
+        assert result is True
+        mock_collection.update_one.assert_called_once()
+        assert mock_buckets.update_one.call_args[0][0]["seq"] == 0
+
+    @pytest.mark.asyncio
+    async def test_read_conv_bucketed(self):
+        conv_id = ObjectId()
+        messages = self.make_messages(5)
+        mock_collection = AsyncMock()
+        mock_collection.find_one.return_value = {
+            "_id": conv_id, "user_id": 123, "message_count": 5, "bucket_size": 2
+        }
+        mock_buckets = Mock()
+        mock_buckets.find.return_value = AsyncCursor(
+            split_into_buckets(conv_id, messages, 2)
+        )
+
+        result = await read_conv(mock_collection, str(conv_id), buckets=mock_buckets)
+
+        assert result == {"_id": conv_id, "user_id": 123, "messages": messages}
+
+    @pytest.mark.asyncio
+    async def test_create_messages_embedded(self):
+        mock_collection = AsyncMock()
+        mock_collection.update_one.return_value.modified_count = 1
+        messages = [
+            Message(sender="bot", text=f"Hello {i}", time=datetime.now())
+            for i in range(3)
+        ]
+
+        result = await create_messages(
+            mock_collection, str(ObjectId()), messages, max_history=100
+        )
+
+        assert result is True
+        push = mock_collection.update_one.call_args[0][1]["$push"]["messages"]
+        assert len(push["$each"]) == 3
+        assert push["$slice"] == -100
+
+    @pytest.mark.asyncio
+    async def test_create_messages_bucketed_spans_buckets(self):
+        conv_id = ObjectId()
+        mock_collection = AsyncMock()
+        mock_collection.find_one_and_update.return_value = {
+            "_id": conv_id,
+            "message_count": 5,
+            "bucket_size": 2,
+        }
+        mock_buckets = AsyncMock()
+        messages = [
+            Message(sender="bot", text=f"Hello {i}", time=datetime.now())
+            for i in range(3)
+        ]
+
+        result = await create_messages(
+            mock_collection, str(conv_id), messages, buckets=mock_buckets
+        )
+
+        assert result is True
+        assert mock_collection.find_one_and_update.call_args[0][1]["$inc"] == {
+            "message_count": 3
+        }
+        updates = mock_buckets.bulk_write.call_args[0][0]
+        # messages 2, 3, 4 land in buckets 1 and 2
+        assert [
+            (u._filter["seq"], len(u._doc["$push"]["messages"]["$each"]))
+            for u in updates
+        ] == [(1, 2), (2, 1)]
+        mock_collection.update_one.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_create_messages_bucketed_undoes_reservation_on_failure(self):
+        conv_id = ObjectId()
+        mock_collection = AsyncMock()
+        mock_collection.find_one_and_update.return_value = {
+            "_id": conv_id,
+            "message_count": 6,
+            "bucket_size": 2,
+        }
+        mock_buckets = AsyncMock()
+        mock_buckets.bulk_write.side_effect = BulkWriteError(
+            {"writeErrors": [{"index": 1}]}
+        )
+        messages = [
+            Message(sender="bot", text=f"Hello {i}", time=datetime.now())
+            for i in range(3)
+        ]
+
+        with pytest.raises(BulkWriteError):
+            await create_messages(
+                mock_collection, str(conv_id), messages, buckets=mock_buckets
+            )
+
+        # messages 3, 4, 5: bucket 1 already held message 2, bucket 2 was new
+        undone = [call[0] for call in mock_buckets.update_one.call_args_list]
+        assert [
+            (query["seq"], query["count"], update["$push"]["messages"]["$slice"])
+            for query, update in undone
+        ] == [(1, 2, 1), (2, 2, 0)]
+        query, update = mock_collection.update_one.call_args[0]
+        assert query == {"_id": conv_id, "message_count": 6}
+        assert update["$inc"] == {"message_count": -3}
+
+    @pytest.mark.asyncio
+    async def test_create_messages_max_history_follows_stored_shape(self):
+        message = Message(sender="bot", text="Hello", time=datetime.now())
+        mock_collection = AsyncMock()
+        mock_collection.update_one.return_value.modified_count = 1
+
+        assert (
+            await create_messages(
+                mock_collection,
+                str(ObjectId()),
+                [message],
+                buckets=AsyncMock(),
+                max_history=10,
+            )
+            is True
+        )
+
+        mock_collection.update_one.return_value.modified_count = 0
+        mock_collection.find_one.return_value = {"_id": ObjectId()}
+        with pytest.raises(ValueError):
+            await create_messages(
+                mock_collection,
+                str(ObjectId()),
+                [message],
+                buckets=AsyncMock(),
+                max_history=10,
+            )
+
+    @pytest.mark.asyncio
+    async def test_read_conv_bucketed_drops_etag_while_message_pending(self):
+        conv_id = ObjectId()
+        messages = self.make_messages(2)
+        mock_collection = AsyncMock()
+        mock_collection.find_one.return_value = {
+            "_id": conv_id,
+            "user_id": 123,
+            "message_count": 3,
+            "bucket_size": 2,
+            "etag": "v3",
+        }
+        mock_buckets = Mock()
+        mock_buckets.find.return_value = AsyncCursor(
+            split_into_buckets(conv_id, messages, 2)
+        )
+
+        result = await read_conv(mock_collection, str(conv_id), buckets=mock_buckets)
+
+        assert result == {"_id": conv_id, "user_id": 123, "messages": messages}
+
+    @pytest.mark.asyncio
+    async def test_create_message_bucketed_bumps_etag(self):
+        conv_id = ObjectId()
+        mock_collection = AsyncMock()
+        mock_collection.find_one_and_update.return_value = {
+            "_id": conv_id,
+            "message_count": 1,
+            "bucket_size": 2,
+        }
+        mock_buckets = AsyncMock()
+        message = Message(sender="bot", text="Hello", time=datetime.now())
+
+        await create_message(
+            mock_collection, str(conv_id), message, buckets=mock_buckets
+        )
+
+        assert "etag" in mock_collection.find_one_and_update.call_args[0][1]["$set"]
+
+    @pytest.mark.asyncio
+    async def test_read_conv_fields_without_messages_skips_buckets(self):
+        conv_id = ObjectId()
+        mock_collection = AsyncMock()
+        mock_collection.find_one.return_value = {"_id": conv_id, "user_id": 123}
+        mock_buckets = Mock()
+
+        result = await read_conv(
+            mock_collection,
+            str(conv_id),
+            buckets=mock_buckets,
+            fields=frozenset({"user_id"}),
+        )
+
+        assert result == {"_id": conv_id, "user_id": 123}
+        assert mock_collection.find_one.call_args[1]["projection"] == {
+            "user_id": 1,
+            "etag": 1,
+        }
+        mock_buckets.find.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_read_conv_fields_with_messages_loads_buckets(self):
+        conv_id = ObjectId()
+        messages = self.make_messages(3)
+        mock_collection = AsyncMock()
+        mock_collection.find_one.return_value = {
+            "_id": conv_id,
+            "message_count": 3,
+            "bucket_size": 2,
+        }
+        mock_buckets = Mock()
+        mock_buckets.find.return_value = AsyncCursor(
+            split_into_buckets(conv_id, messages, 2)
+        )
+
+        result = await read_conv(
+            mock_collection,
+            str(conv_id),
+            buckets=mock_buckets,
+            fields=frozenset({"messages"}),
+        )
+
+        assert result == {"_id": conv_id, "messages": messages}
+        projection = mock_collection.find_one.call_args[1]["projection"]
+        assert projection["message_count"] == projection["bucket_size"] == 1
+
+    @pytest.mark.asyncio
+    async def test_read_conv_embedded_skips_buckets(self):
+        conv_doc = {"_id": ObjectId(), "user_id": 123, "messages": []}
+        mock_collection = AsyncMock()
+        mock_collection.find_one.return_value = conv_doc
+        mock_buckets = Mock()
+
+        result = await read_conv(
+            mock_collection, str(conv_doc["_id"]), buckets=mock_buckets
+        )
+
+        assert result == conv_doc
+        mock_buckets.find.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_delete_conv_bucketed(self):
+        conv_id = ObjectId()
+        mock_collection = AsyncMock()
+        mock_collection.find_one_and_delete.return_value = {
+            "_id": conv_id,
+            "bucket_size": 2,
+        }
+        mock_buckets = AsyncMock()
+
+        result = await delete_conv(mock_collection, str(conv_id), buckets=mock_buckets)
+
+        assert result is True
+        mock_buckets.delete_many.assert_called_once_with({"conversation_id": conv_id})
+
+    @pytest.mark.asyncio
+    async def test_migrate_conv_to_buckets(self):
+        conv_doc = {
+            "_id": ObjectId(),
+            "user_id": 123,
+            "messages": self.make_messages(3),
+        }
+        mock_collection = AsyncMock()
+        mock_collection.replace_one.return_value.modified_count = 1
+        mock_buckets = AsyncMock()
+
+        result = await migrate_conv_to_buckets(
+            mock_collection, mock_buckets, conv_doc, bucket_size=2
+        )
+
+        assert result is True
+        assert len(mock_buckets.insert_many.call_args[0][0]) == 2
+        replace_filter, header = mock_collection.replace_one.call_args[0]
+        assert replace_filter["messages"] == {"$size": 3}
+        assert header["message_count"] == 3 and "messages" not in header
+
+
+class TestMessagePaginationCRUDMock:
+    """Mock tests for paginated message reads"""
+
+    def make_messages(self, count):
+        return [
+            {"sender": "user", "text": f"Message {i}", "time": datetime(2024, 1, 1)}
+            for i in range(count)
+        ]
+
+    @pytest.mark.asyncio
+    async def test_read_latest_messages_embedded(self):
+        messages = self.make_messages(10)
+        mock_collection = AsyncMock()
+        mock_collection.find_one.return_value = {
+            "_id": ObjectId(),
+            "total": 10,
+            "messages": messages[-3:],
+        }
+
+        result = await read_messages(mock_collection, str(ObjectId()), 3)
+
+        assert result == (messages[-3:], 7)
+        projection = mock_collection.find_one.call_args[1]["projection"]
+        assert projection["messages"] == {"$slice": -3}
+        assert projection["bucket_size"] == 1
+
+    @pytest.mark.asyncio
+    async def test_read_messages_before_embedded(self):
+        messages = self.make_messages(10)
+        mock_collection = AsyncMock()
+        mock_collection.find_one.return_value = {
+            "_id": ObjectId(),
+            "messages": messages[4:7],
+        }
+
+        result = await read_messages(mock_collection, str(ObjectId()), 3, before=7)
+
+        assert result == (messages[4:7], 4)
+        projection = mock_collection.find_one.call_args[1]["projection"]
+        assert projection["messages"] == {"$slice": [4, 3]}
+
+    @pytest.mark.asyncio
+    async def test_read_messages_bucketed(self):
+        conv_id = ObjectId()
+        messages = self.make_messages(10)
+        mock_collection = AsyncMock()
+        mock_collection.find_one.return_value = {
+            "_id": conv_id,
+            "message_count": 10,
+            "bucket_size": 4,
+        }
+        buckets = split_into_buckets(conv_id, messages, 4)
+        mock_buckets = Mock()
+        mock_buckets.find.return_value = AsyncCursor(buckets[1:3])
+
+        result = await read_messages(
+            mock_collection, str(conv_id), 3, before=9, buckets=mock_buckets
+        )
+
+        assert result == (messages[6:9], 6)
+        bucket_filter = mock_buckets.find.call_args[0][0]
+        assert bucket_filter["seq"] == {"$gte": 1, "$lte": 2}
+
+    @pytest.mark.asyncio
+    async def test_read_messages_not_found(self):
+        mock_collection = AsyncMock()
+        mock_collection.find_one.return_value = None
+
+        assert await read_messages(mock_collection, str(ObjectId()), 3) is None
+        assert await read_messages(mock_collection, "invalid_id", 3) is None
+
+
 class TestLogCRUDMock:
     """Mock tests for log crud"""
 
@@ -279,6 +924,152 @@ class TestLogCRUDMock:
         assert result == str(mock_result.inserted_id)
         mock_collection.insert_one.assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_create_logs_unordered(self):
+        mock_collection = AsyncMock()
+        logs = [
+            LogIn(
+                user_id=i,
+                activity_id="a",
+                type="t",
+                start_time=datetime.now(),
+                completion_time=datetime.now(),
+            )
+            for i in range(3)
+        ]
+
+        result = await create_logs(mock_collection, logs)
+
+        assert len(result) == 3
+        assert all(item["error"] is None for item in result)
+        docs = mock_collection.insert_many.call_args[0][0]
+        assert [str(doc["_id"]) for doc in docs] == [item["_id"] for item in result]
+        assert mock_collection.insert_many.call_args[1]["ordered"] is False
+
+    @pytest.mark.asyncio
+    async def test_create_logs_partial_failure(self):
+        mock_collection = AsyncMock()
+        mock_collection.insert_many.side_effect = BulkWriteError(
+            {"writeErrors": [{"index": 1, "errmsg": "duplicate key"}]}
+        )
+        logs = [
+            LogIn(
+                user_id=i,
+                activity_id="a",
+                type="t",
+                start_time=datetime.now(),
+                completion_time=datetime.now(),
+            )
+            for i in range(3)
+        ]
+
+        result = await create_logs(mock_collection, logs)
+
+        assert result[1] == {"_id": None, "error": "duplicate key"}
+        assert result[0]["error"] is None and result[2]["error"] is None
+
+    @pytest.mark.asyncio
+    async def test_create_logs_empty(self):
+        mock_collection = AsyncMock()
+
+        result = await create_logs(mock_collection, [])
+
+        assert result == []
+        mock_collection.insert_many.assert_not_called()
+
+    def test_build_log_query_supported_shape(self):
+        start, end = datetime(2024, 1, 1), datetime(2024, 2, 1)
+        after = (datetime(2024, 1, 15), ObjectId())
+
+        query, index = build_log_query(
+            {"user_id": 123, "type": "quiz"}, start, end, after
+        )
+
+        assert index == "user_id_type_start_time_id"
+        assert query["user_id"] == 123 and query["type"] == "quiz"
+        assert query["start_time"] == {"$gte": start, "$lt": end}
+        assert query["$or"][1] == {"start_time": after[0], "_id": {"$gt": after[1]}}
+
+    def test_build_log_query_rejects_unsupported_shape(self):
+        with pytest.raises(ValueError):
+            build_log_query({"type": "quiz", "build_version": "1.0"})
+        with pytest.raises(ValueError):
+            build_log_query({})
+
+        _, index = build_log_query({}, start=datetime(2024, 1, 1))
+        assert index == "start_time_id"
+
+    @pytest.mark.asyncio
+    async def test_find_logs_uses_index_hint(self):
+        mock_collection = Mock()
+        mock_cursor = AsyncMock()
+        mock_cursor.to_list.return_value = []
+        mock_collection.find.return_value = mock_cursor
+
+        await find_logs(mock_collection, {"activity_id": "a"}, limit=10)
+
+        kwargs = mock_collection.find.call_args[1]
+        assert kwargs["hint"] == [("activity_id", 1), ("start_time", 1), ("_id", 1)]
+        assert kwargs["sort"] == [("start_time", 1), ("_id", 1)]
+        assert kwargs["limit"] == 10
+
+    @pytest.mark.asyncio
+    async def test_duration_stats(self):
+        mock_collection = Mock()
+        mock_collection.aggregate.return_value = AsyncCursor([
+            {
+                "_id": {"day": datetime(2024, 1, 1), "type": "quiz"},
+                "count": 3,
+                "mean_ms": 1500.0,
+                "percentiles": [1000.0, 2000.0, 2500.0],
+            }
+        ])
+
+        result = await duration_stats(
+            mock_collection, {"user_id": 123}, start=datetime(2024, 1, 1)
+        )
+
+        assert result == [{
+            "day": datetime(2024, 1, 1), "type": "quiz", "count": 3, "mean_ms": 1500.0,
+            "p50_ms": 1000.0, "p90_ms": 2000.0, "p99_ms": 2500.0,
+        }]
+        pipeline = mock_collection.aggregate.call_args[0][0]
+        assert pipeline[0] == {
+            "$match": {"user_id": 123, "start_time": {"$gte": datetime(2024, 1, 1)}}
+        }
+        assert pipeline[2]["$group"]["_id"] == {"day": "$day", "type": "$type"}
+        assert mock_collection.aggregate.call_args[1]["hint"] == [
+            ("user_id", 1),
+            ("start_time", 1),
+            ("_id", 1),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_find_logs_refuses_missing_index(self):
+        mock_collection = Mock()
+        mock_collection.name = "logs_new"
+
+        with patch.dict(
+            "app.indexes.missing_indexes", {"logs_new": {"type_start_time_id"}}
+        ):
+            with pytest.raises(MissingIndexError):
+                await find_logs(mock_collection, {"type": "quiz"})
+        mock_collection.find.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_find_logs_maps_bad_hint(self):
+        mock_collection = Mock()
+        mock_cursor = AsyncMock()
+        mock_cursor.to_list.side_effect = OperationFailure(
+            "error processing query :: caused by :: "
+            "hint provided does not correspond to an existing index",
+            2,
+        )
+        mock_collection.find.return_value = mock_cursor
+
+        with pytest.raises(MissingIndexError):
+            await find_logs(mock_collection, {"type": "quiz"})
+
     @pytest.mark.asyncio
     async def test_read_log_found(self):
         mock_collection = AsyncMock()
@@ -328,6 +1119,30 @@ class TestLogCRUDMock:
         assert result == 1
         mock_collection.replace_one.assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_update_log_with_rollups_replaces_the_read_document(self):
+        old = {"_id": ObjectId(), "user_id": 123, "type": "quiz"}
+        mock_collection = AsyncMock()
+        mock_collection.find_one.return_value = old
+        mock_collection.replace_one.return_value.matched_count = 1
+        mock_collection.replace_one.return_value.modified_count = 0
+        mock_rollups = AsyncMock()
+        log = LogIn(
+            user_id=123,
+            activity_id="test_activity",
+            type="test_type",
+            start_time=datetime.now(),
+            completion_time=datetime.now(),
+        )
+
+        result = await update_log(
+            mock_collection, str(old["_id"]), log, rollups=mock_rollups
+        )
+
+        assert result == 0
+        assert mock_collection.replace_one.call_args[0][0] == old
+        mock_rollups.bulk_write.assert_not_called()
+
     @pytest.mark.asyncio
     async def test_delete_log_success(self):
         mock_collection = AsyncMock()
@@ -339,4 +1154,179 @@ class TestLogCRUDMock:
         result = await delete_log(mock_collection, log_id)
         
         assert result == 1
-        mock_collection.delete_one.assert_called_once() 
\ No newline at end of file
+        mock_collection.delete_one.assert_called_once() 
+
+
+class TestTimeseriesLogCRUDMock:
+    """Mock tests for time-series log storage"""
+
+    @pytest.mark.asyncio
+    async def test_insert_moves_fields_into_meta(self):
+        mock_collection = AsyncMock()
+        doc = build_log_doc(
+            LogIn(
+                user_id=7,
+                activity_id="a",
+                type="test_type",
+                start_time=datetime.now(),
+                completion_time=datetime.now(),
+            )
+        )
+
+        await insert_log_docs(mock_collection, [doc], timeseries=True)
+
+        stored = mock_collection.insert_many.call_args[0][0][0]
+        assert stored["meta"] == {"user_id": 7, "type": "test_type"}
+        assert "user_id" not in stored and "type" not in stored
+        assert "meta" not in doc
+
+    @pytest.mark.asyncio
+    async def test_update_inserts_before_deleting_old_measurement(self):
+        log_id = ObjectId()
+        old = {
+            "_id": log_id,
+            "activity_id": "a",
+            "value": None,
+            "start_time": datetime(2024, 1, 1),
+            "completion_time": datetime(2024, 1, 1, 0, 1),
+            "meta": {"user_id": 7, "type": "t"},
+        }
+        mock_collection = AsyncMock()
+        mock_collection.find_one.return_value = old
+        log = LogIn(
+            user_id=7,
+            activity_id="a",
+            type="t",
+            start_time=datetime(2024, 1, 2),
+            completion_time=datetime(2024, 1, 2),
+        )
+
+        result = await update_log(mock_collection, str(log_id), log, timeseries=True)
+
+        assert result == 1
+        assert [call[0] for call in mock_collection.method_calls] == [
+            "find_one",
+            "insert_one",
+            "delete_many",
+        ]
+        stored = mock_collection.insert_one.call_args[0][0]
+        assert stored["_id"] == log_id and stored["meta"]["user_id"] == 7
+        old_filter = mock_collection.delete_many.call_args[0][0]
+        assert old_filter["_id"] == log_id and old_filter["meta.user_id"] == 7
+        assert old_filter["value"] == {"$type": "null"}
+        assert not matches(stored, old_filter)
+
+    @pytest.mark.asyncio
+    async def test_update_keeps_old_measurement_when_insert_fails(self):
+        mock_collection = AsyncMock()
+        mock_collection.find_one.return_value = {
+            "_id": ObjectId(),
+            "meta": {"user_id": 1, "type": "t"},
+        }
+        mock_collection.insert_one.side_effect = OperationFailure("write failed")
+        log = LogIn(
+            user_id=7,
+            activity_id="a",
+            type="t",
+            start_time=datetime.now(),
+            completion_time=datetime.now(),
+        )
+
+        with pytest.raises(OperationFailure):
+            await update_log(mock_collection, str(ObjectId()), log, timeseries=True)
+
+        mock_collection.delete_many.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_identical_update_is_not_written(self):
+        log = LogIn(
+            user_id=7,
+            activity_id="a",
+            type="t",
+            start_time=datetime(2024, 1, 1),
+            completion_time=datetime(2024, 1, 1),
+        )
+        log_id = ObjectId()
+        mock_collection = AsyncMock()
+        mock_collection.find_one.return_value = with_meta(
+            {**log.model_dump(by_alias=True, exclude_unset=True), "_id": log_id}
+        )
+        mock_rollups = AsyncMock()
+
+        result = await update_log(
+            mock_collection, str(log_id), log, rollups=mock_rollups, timeseries=True
+        )
+
+        assert result == 0
+        mock_collection.insert_one.assert_not_called()
+        mock_rollups.bulk_write.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_find_logs_filters_on_meta(self):
+        mock_collection = Mock()
+        mock_collection.name = "logs_timeseries"
+        stored = {
+            "_id": ObjectId(),
+            "start_time": datetime(2024, 1, 1),
+            "meta": {"user_id": 7, "type": "t"},
+        }
+        mock_collection.find.return_value.to_list = AsyncMock(return_value=[stored])
+
+        docs = await find_logs(
+            mock_collection, {"user_id": 7, "type": "t"}, timeseries=True
+        )
+
+        query = mock_collection.find.call_args[0][0]
+        assert query == {"meta.user_id": 7, "meta.type": "t"}
+        assert mock_collection.find.call_args[1]["hint"] == [
+            ("meta.user_id", 1), ("meta.type", 1), ("start_time", 1), ("_id", 1)
+        ]
+        assert (
+            docs[0]["user_id"] == 7 and docs[0]["type"] == "t" and "meta" not in docs[0]
+        )
+
+    @pytest.mark.asyncio
+    async def test_copy_logs_in_parallel_ranges(self):
+        storage = MemoryStorage()
+        source, target = storage.collection("logs_new"), storage.collection(
+            "logs_timeseries"
+        )
+        start = datetime(2024, 1, 1)
+        for i in range(9):
+            doc = build_log_doc(
+                LogIn(
+                    user_id=i,
+                    activity_id="a",
+                    type="t",
+                    start_time=start,
+                    completion_time=start,
+                )
+            )
+            doc["_id"] = ObjectId.from_datetime(datetime(2024, 1, 1, i))
+            await source.insert_one(doc)
+
+        copied = await copy_logs(source, target, batch_size=2, workers=2)
+
+        assert copied == 9
+        written = await target.find({}, sort=[("_id", 1)]).to_list(length=None)
+        assert [doc["meta"]["user_id"] for doc in written] == list(range(9))
+
+        resumed = storage.collection("logs_resumed")
+        assert (
+            await copy_logs(
+                source, resumed, batch_size=2, workers=2, after=written[5]["_id"]
+            )
+            == 3
+        )
+
+    def test_id_ranges_cover_the_whole_span(self):
+        first, last = ObjectId.from_datetime(
+            datetime(2024, 1, 1)
+        ), ObjectId.from_datetime(datetime(2024, 1, 2))
+
+        ranges = id_ranges(first, last, 4)
+
+        assert len(ranges) == 4
+        assert ranges[0][0] is None and ranges[-1][1] is None
+        assert all(high == low for (_, high), (low, _) in zip(ranges, ranges[1:]))
+        assert id_ranges(first, first, 4) == [(None, None)]
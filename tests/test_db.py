@@ -0,0 +1,67 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import app.db as db_module
+from app.db import client_options, get_client, close_client, warm_up_pool
+from app.storage import LazyCollection
+
+
+@pytest.fixture
+def fresh_client():
+    close_client()
+    yield
+    close_client()
+
+
+class TestClientSetup:
+    """Tests for lazy Mongo client setup"""
+
+    def test_client_options_defaults(self):
+        options = client_options()
+
+        assert options["maxPoolSize"] == 100
+        assert "compressors" not in options
+        assert "socketTimeoutMS" not in options
+
+    def test_client_options_from_config(self):
+        with patch.multiple(
+            db_module,
+            MONGO_COMPRESSORS="zstd, zlib",
+            MONGO_SOCKET_TIMEOUT_MS=5000,
+            MONGO_MAX_IDLE_TIME_MS=60000,
+        ):
+            options = client_options()
+
+        assert options["compressors"] == ["zstd", "zlib"]
+        assert options["socketTimeoutMS"] == 5000
+        assert options["maxIdleTimeMS"] == 60000
+
+    def test_get_client_requires_mongo_key(self, fresh_client, monkeypatch):
+        monkeypatch.delenv("MONGO_KEY", raising=False)
+
+        with pytest.raises(ValueError):
+            get_client()
+
+    def test_get_client_is_shared(self, fresh_client, monkeypatch):
+        monkeypatch.setenv("MONGO_KEY", "mongodb://localhost:27017")
+
+        assert get_client() is get_client()
+
+    def test_lazy_collection_follows_client(self, fresh_client, monkeypatch):
+        monkeypatch.setenv("MONGO_KEY", "mongodb://localhost:27017")
+        collection = LazyCollection(get_client, "swp_db", "users_new")
+
+        first = collection.resolve()
+        assert collection.name == "users_new"
+        close_client()
+        assert collection.resolve() is not first
+
+    @pytest.mark.asyncio
+    async def test_warm_up_pool_pings_concurrently(self):
+        client = MagicMock()
+        client.admin.command = AsyncMock()
+
+        with patch("app.db.get_client", return_value=client):
+            await warm_up_pool(3)
+
+        assert client.admin.command.await_count == 3
@@ -0,0 +1,32 @@
+from app.etag import etag_matches, format_etag, new_etag
+
+
+class TestEtag:
+    """Tests for etag helpers"""
+
+    def test_new_etag_changes(self):
+        assert new_etag() != new_etag()
+
+    def test_matches_exact(self):
+        assert etag_matches(format_etag("abc"), "abc")
+        assert not etag_matches(format_etag("abc"), "abd")
+
+    def test_matches_list_and_weak(self):
+        assert etag_matches('"x", W/"abc"', "abc")
+
+    def test_matches_wildcard(self):
+        assert etag_matches("*", "abc")
+
+    def test_unquoted_does_not_match(self):
+        assert not etag_matches("abc", "abc")
+
+    def test_partial_etag_names_the_field_set(self):
+        fields = frozenset({"name", "language"})
+        partial = format_etag("abc", fields)
+
+        assert partial.startswith('W/"abc;f=')
+        assert partial == format_etag("abc", frozenset({"language", "name"}))
+        assert etag_matches(partial, "abc", fields)
+        assert not etag_matches(partial, "abc")
+        assert not etag_matches(format_etag("abc"), "abc", fields)
+        assert not etag_matches(partial, "abc", frozenset({"name"}))
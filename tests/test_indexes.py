@@ -0,0 +1,89 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.indexes import (
+    INDEXES,
+    index_drift,
+    ensure_indexes,
+    missing_indexes,
+    require_index,
+    MissingIndexError,
+)
+
+
+def make_db(index_info):
+    collections = {}
+    for name in INDEXES:
+        collection = AsyncMock()
+        collection.index_information.return_value = index_info.get(
+            name, {"_id_": {"key": [("_id", 1)]}}
+        )
+        collections[name] = collection
+    db = MagicMock()
+    db.__getitem__.side_effect = collections.__getitem__
+    return db, collections
+
+
+@pytest.fixture(autouse=True)
+def clear_missing_indexes():
+    yield
+    missing_indexes.clear()
+
+
+class TestIndexes:
+    """Tests for index registry and drift detection"""
+
+    @pytest.mark.asyncio
+    async def test_index_drift_missing_and_extra(self):
+        db, _ = make_db(
+            {
+                "conversations": {
+                    "_id_": {"key": [("_id", 1)]},
+                    "legacy": {"key": [("messages.time", 1)]},
+                },
+                "logs_new": {
+                    "_id_": {"key": [("_id", 1)]},
+                    "custom_name": {
+                        "key": [("user_id", 1.0), ("start_time", 1.0), ("_id", 1.0)]
+                    },
+                },
+            }
+        )
+
+        report = await index_drift(db)
+
+        assert report["conversations"]["missing"] == ["user_id_id"]
+        assert report["conversations"]["extra"] == ["legacy"]
+        assert report["logs_new"]["present"] == ["custom_name"]
+        assert "user_id_start_time_id" not in report["logs_new"]["missing"]
+
+    @pytest.mark.asyncio
+    async def test_ensure_indexes_creates_missing(self):
+        db, collections = make_db({})
+
+        await ensure_indexes(db, create=True)
+
+        created = collections["conversations"].create_indexes.call_args[0][0]
+        assert [model.document["name"] for model in created] == ["user_id_id"]
+        collections["users_new"].create_indexes.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_ensure_indexes_verify_only(self):
+        db, collections = make_db({})
+
+        report = await ensure_indexes(db, create=False)
+
+        assert report["message_buckets"]["missing"] == ["conversation_id_seq"]
+        for collection in collections.values():
+            collection.create_indexes.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_missing_indexes_are_refused_until_built(self):
+        db, _ = make_db({})
+
+        await ensure_indexes(db, create=False)
+        with pytest.raises(MissingIndexError):
+            require_index("logs_new", "type_start_time_id")
+
+        await ensure_indexes(db, create=True)
+        require_index("logs_new", "type_start_time_id")
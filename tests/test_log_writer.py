@@ -0,0 +1,150 @@
+import gc
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from datetime import datetime
+from pymongo.errors import BulkWriteError, ServerSelectionTimeoutError
+
+from app.cruds.log_crud import build_log_doc
+from app.log_writer import LogWriter
+from app.models.log import LogIn
+
+
+def make_doc(user_id=123):
+    log = LogIn(
+        user_id=user_id,
+        activity_id="test_activity",
+        type="test_type",
+        start_time=datetime.now(),
+        completion_time=datetime.now()
+    )
+    return build_log_doc(log)
+
+
+class TestLogWriter:
+    """Tests for buffered log writer"""
+
+    @pytest.mark.asyncio
+    async def test_flush_by_size(self):
+        mock_collection = AsyncMock()
+        writer = LogWriter(
+            mock_collection, max_size=100, flush_size=5, flush_interval=10
+        )
+        await writer.start()
+
+        docs = [make_doc(i) for i in range(10)]
+        ids = await asyncio.gather(*(writer.submit(doc) for doc in docs))
+        await writer.stop()
+
+        assert ids == [str(doc["_id"]) for doc in docs]
+        assert mock_collection.insert_many.call_count == 2
+        assert all(
+            len(call[0][0]) == 5 for call in mock_collection.insert_many.call_args_list
+        )
+
+    @pytest.mark.asyncio
+    async def test_flush_by_interval(self):
+        mock_collection = AsyncMock()
+        writer = LogWriter(
+            mock_collection, max_size=100, flush_size=1000, flush_interval=0.01
+        )
+        await writer.start()
+
+        doc = make_doc()
+        inserted_id = await asyncio.wait_for(writer.submit(doc), timeout=1)
+        await writer.stop()
+
+        assert inserted_id == str(doc["_id"])
+        mock_collection.insert_many.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_stop_flushes_pending(self):
+        mock_collection = AsyncMock()
+        writer = LogWriter(
+            mock_collection, max_size=100, flush_size=1000, flush_interval=60
+        )
+        await writer.start()
+
+        for i in range(3):
+            await writer.submit(make_doc(i), wait=False)
+        await writer.stop()
+
+        assert not writer.running
+        docs = [
+            doc
+            for call in mock_collection.insert_many.call_args_list
+            for doc in call[0][0]
+        ]
+        assert len(docs) == 3
+
+    @pytest.mark.asyncio
+    async def test_failed_item_raises(self):
+        mock_collection = AsyncMock()
+        mock_collection.insert_many.side_effect = BulkWriteError(
+            {"writeErrors": [{"index": 0, "errmsg": "duplicate key"}]}
+        )
+        writer = LogWriter(
+            mock_collection, max_size=100, flush_size=1, flush_interval=60
+        )
+        await writer.start()
+
+        with pytest.raises(RuntimeError, match="duplicate key"):
+            await writer.submit(make_doc())
+        await writer.stop()
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_counts_unawaited_logs(self, caplog):
+        mock_collection = AsyncMock()
+        mock_collection.insert_many.side_effect = ServerSelectionTimeoutError(
+            "no servers"
+        )
+        writer = LogWriter(
+            mock_collection, max_size=100, flush_size=1000, flush_interval=60
+        )
+        await writer.start()
+
+        for i in range(3):
+            await writer.submit(make_doc(i), wait=False)
+        await writer.stop()
+        await asyncio.sleep(0)
+
+        assert writer.dropped == 3
+        assert "Failed to flush 3 buffered logs" in caplog.text
+        gc.collect()
+        assert "never retrieved" not in caplog.text
+
+    @pytest.mark.asyncio
+    async def test_submit_requires_running_writer(self):
+        writer = LogWriter(AsyncMock())
+
+        with pytest.raises(RuntimeError):
+            await writer.submit(make_doc())
+
+    @pytest.mark.asyncio
+    async def test_stop_writes_logs_waiting_for_room(self):
+        release = asyncio.Event()
+
+        async def insert_many(docs, **kwargs):
+            await release.wait()
+
+        mock_collection = AsyncMock()
+        mock_collection.insert_many.side_effect = insert_many
+        writer = LogWriter(
+            mock_collection, max_size=1, flush_size=1, flush_interval=60
+        )
+        await writer.start()
+
+        docs = [make_doc(i) for i in range(4)]
+        submits = [asyncio.create_task(writer.submit(doc)) for doc in docs]
+        await asyncio.sleep(0)
+        stop = asyncio.create_task(writer.stop())
+        await asyncio.sleep(0)
+        with pytest.raises(RuntimeError):
+            await writer.submit(make_doc())
+        release.set()
+
+        ids = await asyncio.wait_for(asyncio.gather(*submits), timeout=1)
+        await asyncio.wait_for(stop, timeout=1)
+
+        assert ids == [str(doc["_id"]) for doc in docs]
+        assert mock_collection.insert_many.call_count == 4
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import time
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from app.main import app
+from app.loop_monitor import LoopLagMonitor
+from app.metrics import event_loop_lag
+
+
+class TestLoopLagMonitor:
+    """Tests for the event loop lag monitor"""
+
+    @pytest.mark.asyncio
+    async def test_measures_lag_of_a_blocked_loop(self):
+        event_loop_lag.clear()
+        monitor = LoopLagMonitor(interval=0.01)
+        await monitor.start()
+        await asyncio.sleep(0.005)
+        time.sleep(0.05)  # block the loop past the probe's wake-up
+        await asyncio.sleep(0.02)
+        await monitor.stop()
+
+        stats = monitor.stats()
+        assert stats["max_lag_ms"] >= 30
+        assert sum(event_loop_lag.samples(())[0]) >= 1
+        assert not monitor.running
+
+    def test_stats_before_any_sample(self):
+        assert LoopLagMonitor(interval=0.5).stats() == {
+            "lag_ms": None,
+            "max_lag_ms": None,
+            "window_s": 0.0,
+        }
+
+    @pytest.mark.asyncio
+    async def test_watchdog_logs_the_blocking_stack(self, caplog):
+        monitor = LoopLagMonitor(interval=0.01, block_threshold_ms=20)
+        await monitor.start()
+        await asyncio.sleep(0.02)
+
+        with caplog.at_level(logging.WARNING, logger="app.loop_monitor"):
+            time.sleep(0.15)
+            await asyncio.sleep(0.02)
+        await monitor.stop()
+
+        blocked = [
+            record
+            for record in caplog.records
+            if "Event loop blocked" in record.getMessage()
+        ]
+        assert len(blocked) == 1
+        assert "test_watchdog_logs_the_blocking_stack" in blocked[0].getMessage()
+
+    @pytest.mark.asyncio
+    async def test_stop_waits_for_the_watchdog_off_the_loop(self):
+        monitor = LoopLagMonitor(interval=0.01, block_threshold_ms=20)
+        reporting = asyncio.Event()
+        loop = asyncio.get_running_loop()
+
+        def slow_report(blocked_ms):
+            loop.call_soon_threadsafe(reporting.set)
+            time.sleep(0.2)
+
+        monitor.report_blocked = slow_report
+        await monitor.start()
+        await asyncio.sleep(0.02)
+        time.sleep(0.05)
+        await asyncio.wait_for(reporting.wait(), 1)
+
+        stopping = asyncio.create_task(monitor.stop())
+        await asyncio.sleep(0.01)
+        assert not stopping.done()  # the loop keeps running while stop() waits
+        await stopping
+        assert not monitor.running
+
+    def test_health_reports_loop_lag(self):
+        monitor = LoopLagMonitor(interval=0.5)
+        monitor.record(0.004)
+
+        with patch("app.main.loop_monitor", monitor):
+            response = TestClient(app).get("/health")
+
+        assert response.status_code == 200
+        assert response.json()["event_loop"]["lag_ms"] == pytest.approx(4.0)
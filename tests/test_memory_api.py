@@ -0,0 +1,387 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from bson import ObjectId
+
+from app.main import app
+from app.storage import MemoryStorage
+
+
+class MemoryAPITestCase(unittest.TestCase):
+    """Drives the whole app against the in-memory storage backend"""
+
+    def setUp(self):
+        self.client = TestClient(app)
+        self.storage = MemoryStorage()
+        collections = {
+            "app.routes.user_routes.users_collection": "users_new",
+            "app.routes.conv_routes.conversations_collection": "conversations",
+            "app.routes.conv_routes.message_buckets_collection": "message_buckets",
+            "app.routes.log_routes.logs_collection": "logs_new",
+            "app.routes.log_routes.log_rollups_collection": "log_rollups",
+            "app.routes.analytics_routes.logs_collection": "logs_new",
+            "app.routes.analytics_routes.log_rollups_collection": "log_rollups",
+        }
+        for target, name in collections.items():
+            self.patch(target, self.storage.collection(name))
+        self.patch("app.routes.user_routes.user_cache", None)
+
+    def patch(self, target, value):
+        patcher = patch(target, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+def make_message(i):
+    return {
+        "sender": "user" if i % 2 else "bot",
+        "text": f"Message {i}",
+        "time": f"2024-01-01T00:00:{i:02d}",
+    }
+
+
+def make_log(user_id, i, type="lesson"):
+    return {
+        "user_id": user_id,
+        "activity_id": f"activity_{i % 3}",
+        "type": type,
+        "start_time": f"2024-01-0{1 + i % 2}T10:00:{i:02d}",
+        "completion_time": f"2024-01-0{1 + i % 2}T10:01:{i:02d}",
+    }
+
+
+class TestUserFlow(MemoryAPITestCase):
+
+    def test_user_lifecycle(self):
+        self.assertEqual(
+            self.client.post("/users/", json={"_id": 1, "name": "Ann"}).status_code, 200
+        )
+
+        response = self.client.get("/users/1")
+        self.assertEqual(response.json()["launch_count"], 0)
+        etag = response.headers["ETag"]
+        self.assertEqual(
+            self.client.get("/users/1", headers={"If-None-Match": etag}).status_code,
+            304,
+        )
+
+        self.client.patch("/users/1", json={"language": "en"})
+        self.client.post("/users/1/launch", json={"current_bundle_version": 2})
+        response = self.client.post("/users/1/launch", json={})
+        self.assertEqual(response.json()["launch_count"], 2)
+        self.assertEqual(response.json()["current_bundle_version"], 2)
+        self.assertEqual(response.json()["language"], "en")
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(
+            self.client.get("/users/1", headers={"If-None-Match": etag}).status_code,
+            200,
+        )
+
+        partial = self.client.get("/users/1", params={"fields": "name"})
+        self.assertNotEqual(partial.headers["ETag"], response.headers["ETag"])
+        self.assertEqual(
+            self.client.get(
+                "/users/1",
+                params={"fields": "name"},
+                headers={"If-None-Match": response.headers["ETag"]},
+            ).status_code,
+            200,
+        )
+        self.assertEqual(
+            self.client.get(
+                "/users/1",
+                params={"fields": "name"},
+                headers={"If-None-Match": partial.headers["ETag"]},
+            ).status_code,
+            304,
+        )
+
+        self.assertEqual(self.client.delete("/users/1").status_code, 200)
+        self.assertEqual(self.client.get("/users/1").status_code, 404)
+
+
+class TestConversationFlow(MemoryAPITestCase):
+
+    def run_conversation_flow(self):
+        conv_id = self.client.post(
+            "/conversations/",
+            json={"user_id": 7, "messages": [make_message(i) for i in range(3)]},
+        ).json()["_id"]
+        self.assertTrue(
+            self.client.post(
+                f"/conversations/{conv_id}/messages", json=make_message(3)
+            ).json()
+        )
+        response = self.client.post(
+            f"/conversations/{conv_id}/messages/batch",
+            json=[make_message(i) for i in range(4, 7)],
+        )
+        self.assertEqual(response.status_code, 200)
+
+        conv = self.client.get(f"/conversations/{conv_id}").json()
+        self.assertEqual(
+            [m["text"] for m in conv["messages"]], [f"Message {i}" for i in range(7)]
+        )
+
+        page = self.client.get(
+            f"/conversations/{conv_id}/messages", params={"limit": 4}
+        ).json()
+        self.assertEqual(
+            [m["text"] for m in page["messages"]], [f"Message {i}" for i in range(3, 7)]
+        )
+        page = self.client.get(
+            f"/conversations/{conv_id}/messages",
+            params={"limit": 4, "before": page["next_cursor"]},
+        ).json()
+        self.assertEqual(
+            [m["text"] for m in page["messages"]], [f"Message {i}" for i in range(3)]
+        )
+        self.assertIsNone(page["next_cursor"])
+        return conv_id
+
+    def test_embedded_conversation(self):
+        conv_id = self.run_conversation_flow()
+
+        response = self.client.post(
+            f"/conversations/{conv_id}/messages/batch",
+            params={"max_history": 2},
+            json=[make_message(7)],
+        )
+        self.assertEqual(response.status_code, 200)
+        conv = self.client.get(f"/conversations/{conv_id}").json()
+        self.assertEqual(
+            [m["text"] for m in conv["messages"]], ["Message 6", "Message 7"]
+        )
+
+    def test_bucketed_conversation(self):
+        self.patch("app.routes.conv_routes.CONV_STORAGE_MODE", "bucketed")
+        self.patch("app.routes.conv_routes.MESSAGE_BUCKET_SIZE", 2)
+
+        conv_id = self.run_conversation_flow()
+
+        buckets = self.storage.collection("message_buckets")
+        stored = asyncio.run(
+            buckets.find({"conversation_id": ObjectId(conv_id)}).to_list(None)
+        )
+        self.assertEqual([bucket["count"] for bucket in stored], [2, 2, 2, 1])
+        self.assertTrue(self.client.delete(f"/conversations/{conv_id}").json())
+        self.assertEqual(asyncio.run(buckets.find({}).to_list(None)), [])
+
+    def test_writes_follow_stored_shape_after_mode_switch(self):
+        with patch("app.routes.conv_routes.CONV_STORAGE_MODE", "bucketed"):
+            conv_id = self.client.post(
+                "/conversations/", json={"user_id": 7, "messages": [make_message(0)]}
+            ).json()["_id"]
+
+        self.assertTrue(
+            self.client.post(
+                f"/conversations/{conv_id}/messages", json=make_message(1)
+            ).json()
+        )
+        conv = self.client.get(f"/conversations/{conv_id}").json()
+        self.assertEqual(
+            [m["text"] for m in conv["messages"]], ["Message 0", "Message 1"]
+        )
+
+        self.assertTrue(
+            self.client.put(f"/conversations/{conv_id}", json={"user_id": 7}).json()
+        )
+        buckets = self.storage.collection("message_buckets")
+        self.assertEqual(asyncio.run(buckets.find({}).to_list(None)), [])
+        self.assertEqual(
+            self.client.get(f"/conversations/{conv_id}").json()["messages"], []
+        )
+
+    def test_partial_conversation_has_its_own_etag(self):
+        conv_id = self.client.post("/conversations/", json={"user_id": 7}).json()["_id"]
+        full_etag = self.client.get(f"/conversations/{conv_id}").headers["ETag"]
+
+        response = self.client.get(
+            f"/conversations/{conv_id}",
+            params={"fields": "user_id"},
+            headers={"If-None-Match": full_etag},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"user_id": 7})
+        self.assertTrue(response.headers["ETag"].startswith("W/"))
+
+    def test_max_history_by_stored_shape(self):
+        conv_id = self.client.post(
+            "/conversations/", json={"user_id": 7, "messages": [make_message(0)]}
+        ).json()["_id"]
+        self.patch("app.routes.conv_routes.CONV_STORAGE_MODE", "bucketed")
+        bucketed_id = self.client.post("/conversations/", json={"user_id": 7}).json()[
+            "_id"
+        ]
+
+        response = self.client.post(
+            f"/conversations/{conv_id}/messages/batch",
+            params={"max_history": 1},
+            json=[make_message(1)],
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [
+                m["text"]
+                for m in self.client.get(f"/conversations/{conv_id}").json()["messages"]
+            ],
+            ["Message 1"],
+        )
+        response = self.client.post(
+            f"/conversations/{bucketed_id}/messages/batch",
+            params={"max_history": 1},
+            json=[make_message(1)],
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_user_conversations(self):
+        ids = [
+            self.client.post("/conversations/", json={"user_id": 7}).json()["_id"]
+            for _ in range(3)
+        ]
+        self.client.post("/conversations/", json={"user_id": 8})
+
+        response = self.client.get(
+            "/conversations/user/7", params={"limit": 2, "fields": "_id"}
+        )
+        self.assertEqual(response.json(), [{"_id": ids[0]}, {"_id": ids[1]}])
+        after = response.headers["X-Next-After"]
+        response = self.client.get(
+            "/conversations/user/7", params={"limit": 2, "after": after}
+        )
+        self.assertEqual([conv["_id"] for conv in response.json()], ids[2:])
+
+    def test_last_full_page_links_to_empty_page(self):
+        ids = [
+            self.client.post("/conversations/", json={"user_id": 7}).json()["_id"]
+            for _ in range(2)
+        ]
+
+        response = self.client.get("/conversations/user/7", params={"limit": 2})
+        self.assertEqual(response.headers["X-Next-After"], ids[1])
+        response = self.client.get(
+            "/conversations/user/7", params={"limit": 2, "after": ids[1]}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+        self.assertNotIn("X-Next-After", response.headers)
+        self.assertEqual(self.client.get("/conversations/user/8").status_code, 404)
+
+
+class TestLogFlow(MemoryAPITestCase):
+
+    def test_log_lifecycle(self):
+        log_id = self.client.post("/logs/", json=make_log(1, 0)).json()["_id"]
+        response = self.client.post(
+            "/logs/batch", json=[make_log(1, i) for i in range(1, 6)] + [{"user_id": 1}]
+        )
+        self.assertEqual(response.json()["inserted_count"], 5)
+
+        first = self.client.get("/logs/", params={"user_id": 1, "limit": 4})
+        second = self.client.get(
+            "/logs/", params={"user_id": 1, "after": first.headers["X-Next-Cursor"]}
+        )
+        logs = first.json() + second.json()
+        self.assertEqual(len(logs), 6)
+        self.assertEqual(
+            logs, sorted(logs, key=lambda log: (log["start_time"], log["_id"]))
+        )
+
+        self.assertTrue(
+            self.client.put(f"/logs/{log_id}", json=make_log(1, 0, type="quiz")).json()
+        )
+        self.assertEqual(
+            self.client.get(f"/logs/{log_id}", params={"fields": "type"}).json(),
+            {"type": "quiz"},
+        )
+        self.assertTrue(self.client.delete(f"/logs/{log_id}").json())
+        self.assertEqual(self.client.get(f"/logs/{log_id}").status_code, 404)
+
+    def test_rollups(self):
+        self.patch("app.routes.log_routes.LOG_ROLLUPS_ENABLED", True)
+
+        self.client.post("/logs/batch", json=[make_log(1, i) for i in range(4)])
+        rollups = self.client.get("/analytics/daily", params={"user_id": 1}).json()
+
+        self.assertEqual(sum(rollup["count"] for rollup in rollups), 4)
+        self.assertTrue(all(rollup["min_duration_ms"] == 60000 for rollup in rollups))
+
+    def test_rollups_follow_updates_and_deletes(self):
+        self.patch("app.routes.log_routes.LOG_ROLLUPS_ENABLED", True)
+        ids = [
+            self.client.post("/logs/", json=make_log(1, 0)).json()["_id"]
+            for _ in range(2)
+        ]
+
+        moved = {**make_log(1, 0), "type": "quiz"}
+        self.assertEqual(
+            self.client.put(f"/logs/{ids[0]}", json=moved).status_code, 200
+        )
+        rollups = self.client.get("/analytics/daily", params={"user_id": 1}).json()
+        self.assertEqual(
+            sorted((rollup["type"], rollup["count"]) for rollup in rollups),
+            [("lesson", 1), ("quiz", 1)],
+        )
+
+        self.assertEqual(self.client.delete(f"/logs/{ids[1]}").status_code, 200)
+        rollups = self.client.get("/analytics/daily", params={"user_id": 1}).json()
+        self.assertEqual(
+            [(rollup["type"], rollup["count"]) for rollup in rollups], [("quiz", 1)]
+        )
+        self.assertEqual(rollups[0]["total_duration_ms"], 60000)
+
+    def test_identical_update_status_does_not_depend_on_rollups(self):
+        log_id = self.client.post("/logs/", json=make_log(1, 0)).json()["_id"]
+        self.assertEqual(
+            self.client.put(f"/logs/{log_id}", json=make_log(1, 0)).status_code, 404
+        )
+
+        self.patch("app.routes.log_routes.LOG_ROLLUPS_ENABLED", True)
+        self.client.post("/logs/", json=make_log(1, 1))
+        self.assertEqual(
+            self.client.put(f"/logs/{log_id}", json=make_log(1, 0)).status_code, 404
+        )
+        rollups = self.client.get("/analytics/daily", params={"user_id": 1}).json()
+        self.assertEqual([rollup["count"] for rollup in rollups], [1])
+
+    def test_timeseries_log_update(self):
+        storage = MemoryStorage(timeseries=["logs_timeseries"])
+        logs = storage.collection("logs_timeseries")
+        self.patch("app.routes.log_routes.logs_collection", logs)
+        self.patch("app.routes.log_routes.LOG_TIMESERIES", True)
+        log_id = self.client.post("/logs/", json=make_log(1, 0)).json()["_id"]
+
+        response = self.client.put(f"/logs/{log_id}", json=make_log(1, 0, type="quiz"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.client.get(f"/logs/{log_id}", params={"fields": "type"}).json(),
+            {"type": "quiz"},
+        )
+
+    def test_duration_stats(self):
+        self.client.post("/logs/batch", json=[make_log(1, i) for i in range(4)])
+
+        response = self.client.get("/analytics/users/1/durations")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(group["count"], group["p50_ms"]) for group in response.json()],
+            [(2, 60000), (2, 60000)],
+        )
+
+
+class TestMemoryBackendHealth(MemoryAPITestCase):
+
+    def test_database_health_check(self):
+        self.patch("app.main.STORAGE_BACKEND", "memory")
+
+        response = self.client.get("/health/db")
+
+        self.assertEqual(response.json()["database"], "memory")
+
+
+if __name__ == '__main__':
+    unittest.main()
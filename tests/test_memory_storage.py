@@ -0,0 +1,267 @@
+import pytest
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from app.storage import MemoryStorage
+from app.cruds.log_crud import duration_stats_pipeline
+from app.cruds.rollup_crud import rebuild_rollups_pipeline, rollup_updates
+
+
+@pytest.fixture
+def collection():
+    return MemoryStorage().collection("docs")
+
+
+class TestMemoryCollection:
+    """Tests for in-memory storage semantics"""
+
+    @pytest.mark.asyncio
+    async def test_insert_assigns_id_and_copies(self, collection):
+        doc = {"tags": ["a"]}
+        result = await collection.insert_one(doc)
+        doc["tags"].append("b")
+
+        assert isinstance(result.inserted_id, ObjectId)
+        assert doc["_id"] == result.inserted_id
+        stored = await collection.find_one({"_id": result.inserted_id})
+        assert stored["tags"] == ["a"]
+        stored["tags"].append("c")
+        assert (await collection.find_one({"_id": result.inserted_id}))["tags"] == ["a"]
+
+    @pytest.mark.asyncio
+    async def test_duplicate_id(self, collection):
+        await collection.insert_one({"_id": 1})
+
+        with pytest.raises(DuplicateKeyError):
+            await collection.insert_one({"_id": 1})
+
+    @pytest.mark.asyncio
+    async def test_timeseries_collection_allows_duplicate_id(self):
+        collection = MemoryStorage(timeseries=["events"]).collection("events")
+        await collection.insert_one({"_id": 1, "v": "old"})
+        await collection.insert_one({"_id": 1, "v": "new"})
+
+        assert len(await collection.find({"_id": 1}).to_list(None)) == 2
+        assert (await collection.delete_many({"_id": 1, "v": "old"})).deleted_count == 1
+        assert await collection.find({"_id": 1}).to_list(None) == [
+            {"_id": 1, "v": "new"}
+        ]
+
+    @pytest.mark.asyncio
+    async def test_insert_many_unordered_reports_failed_indexes(self, collection):
+        await collection.insert_one({"_id": 2})
+
+        with pytest.raises(BulkWriteError) as e:
+            await collection.insert_many(
+                [{"_id": 1}, {"_id": 2}, {"_id": 3}], ordered=False
+            )
+
+        assert [err["index"] for err in e.value.details["writeErrors"]] == [1]
+        assert len(await collection.find({}).to_list(None)) == 3
+
+    @pytest.mark.asyncio
+    async def test_filters(self, collection):
+        t0, t1 = datetime(2024, 1, 1), datetime(2024, 1, 2)
+        await collection.insert_many([
+            {"_id": 1, "user_id": 1, "start_time": t0, "messages": [1, 2]},
+            {"_id": 2, "user_id": 1, "start_time": t1, "bucket_size": 200},
+            {"_id": 3, "user_id": 2, "start_time": t1, "messages": []},
+        ])
+
+        async def ids(query):
+            return [doc["_id"] for doc in await collection.find(query).to_list(None)]
+
+        assert await ids({"user_id": 1, "start_time": {"$gte": t1}}) == [2]
+        assert await ids({"bucket_size": {"$exists": False}}) == [1, 3]
+        assert await ids({"messages": {"$size": 2}}) == [1]
+        assert await ids({"user_id": {"$in": [2, 3]}}) == [3]
+        assert await ids(
+            {
+                "$or": [
+                    {"start_time": {"$gt": t0}},
+                    {"start_time": t0, "_id": {"$gt": 0}},
+                ]
+            }
+        ) == [1, 2, 3]
+        assert await ids({"messages": 2}) == [1]
+
+    @pytest.mark.asyncio
+    async def test_sort_limit_projection(self, collection):
+        for i in range(5):
+            await collection.insert_one(
+                {"_id": i, "group": i % 2, "value": i, "meta": {"x": i}}
+            )
+
+        docs = await collection.find(
+            {}, projection={"meta": 0}, sort=[("group", 1), ("_id", -1)], limit=3
+        ).to_list(None)
+
+        assert docs == [
+            {"_id": 4, "group": 0, "value": 4},
+            {"_id": 2, "group": 0, "value": 2},
+            {"_id": 0, "group": 0, "value": 0},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_slice_and_size_projection(self, collection):
+        await collection.insert_one(
+            {"_id": 1, "other": True, "messages": list(range(10))}
+        )
+
+        latest = await collection.find_one(
+            {"_id": 1},
+            projection={
+                "total": {"$size": {"$ifNull": ["$messages", []]}},
+                "messages": {"$slice": -3},
+            },
+        )
+        window = await collection.find_one(
+            {"_id": 1}, projection={"messages": {"$slice": [2, 3]}}
+        )
+
+        assert latest == {"_id": 1, "total": 10, "messages": [7, 8, 9]}
+        assert window == {"_id": 1, "other": True, "messages": [2, 3, 4]}
+
+    @pytest.mark.asyncio
+    async def test_update_operators(self, collection):
+        await collection.insert_one(
+            {"_id": 1, "count": 1, "low": 5, "high": 5, "items": [1]}
+        )
+
+        result = await collection.update_one({"_id": 1}, {
+            "$inc": {"count": 2},
+            "$min": {"low": 3},
+            "$max": {"high": 4},
+            "$push": {"items": {"$each": [2, 3, 4], "$slice": -3}},
+            "$set": {"nested.value": "x"},
+        })
+
+        assert result.modified_count == 1
+        assert await collection.find_one({"_id": 1}) == {
+            "_id": 1,
+            "count": 3,
+            "low": 3,
+            "high": 5,
+            "items": [2, 3, 4],
+            "nested": {"value": "x"},
+        }
+
+    @pytest.mark.asyncio
+    async def test_noop_update_is_not_modified(self, collection):
+        await collection.insert_one({"_id": 1, "name": "a"})
+
+        assert (
+            await collection.update_one({"_id": 1}, {"$set": {"name": "a"}})
+        ).modified_count == 0
+        assert (
+            await collection.replace_one({"_id": 1}, {"name": "a"})
+        ).modified_count == 0
+        assert (
+            await collection.replace_one({"_id": 1}, {"name": "b"})
+        ).modified_count == 1
+
+    @pytest.mark.asyncio
+    async def test_upsert_seeds_from_query(self, collection):
+        conv_id = ObjectId()
+
+        result = await collection.update_one(
+            {"conversation_id": conv_id, "seq": 0},
+            {"$push": {"messages": "m"}, "$inc": {"count": 1}},
+            upsert=True,
+        )
+
+        doc = await collection.find_one({"_id": result.upserted_id})
+        assert doc["conversation_id"] == conv_id
+        assert doc["seq"] == 0
+        assert doc["messages"] == ["m"]
+        assert doc["count"] == 1
+
+    @pytest.mark.asyncio
+    async def test_find_one_and_update_return_document(self, collection):
+        await collection.insert_one({"_id": 1, "n": 0})
+
+        before = await collection.find_one_and_update({"_id": 1}, {"$inc": {"n": 1}})
+        after = await collection.find_one_and_update(
+            {"_id": 1},
+            {"$inc": {"n": 1}},
+            projection={"n": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+
+        assert before == {"_id": 1, "n": 0}
+        assert after == {"_id": 1, "n": 2}
+        assert (
+            await collection.find_one_and_update({"_id": 2}, {"$inc": {"n": 1}}) is None
+        )
+
+    @pytest.mark.asyncio
+    async def test_bulk_write_and_deletes(self, collection):
+        await collection.bulk_write([
+            UpdateOne({"day": 1}, {"$inc": {"count": 1}}, upsert=True),
+            UpdateOne({"day": 1}, {"$inc": {"count": 2}}, upsert=True),
+            UpdateOne({"day": 2}, {"$inc": {"count": 1}}, upsert=True),
+        ], ordered=False)
+
+        assert (await collection.find_one({"day": 1}))["count"] == 3
+        assert (await collection.delete_many({"day": {"$gte": 1}})).deleted_count == 2
+        assert (await collection.find_one_and_delete({"day": 1})) is None
+
+    @pytest.mark.asyncio
+    async def test_unsupported_operator(self, collection):
+        await collection.insert_one({"name": "a"})
+
+        with pytest.raises(NotImplementedError):
+            await collection.find_one({"name": {"$regex": "a"}})
+
+    @pytest.mark.asyncio
+    async def test_aggregate_duration_stats(self, collection):
+        start = datetime(2024, 1, 1, 10)
+        for seconds in (1, 2, 3, 4):
+            await collection.insert_one(
+                {
+                    "type": "quiz",
+                    "start_time": start,
+                    "completion_time": start + timedelta(seconds=seconds),
+                }
+            )
+
+        [group] = await collection.aggregate(
+            duration_stats_pipeline({"type": "quiz"})
+        ).to_list(None)
+
+        assert group["_id"] == {"day": datetime(2024, 1, 1), "type": "quiz"}
+        assert group["count"] == 4
+        assert group["mean_ms"] == 2500
+        assert group["percentiles"] == [2000, 4000, 4000]
+
+    @pytest.mark.asyncio
+    async def test_aggregate_merge_matches_incremental_rollups(self):
+        storage = MemoryStorage()
+        logs, rollups = storage.collection("logs"), storage.collection("rollups")
+        start = datetime(2024, 1, 1, 10, 0, 0, 999)
+        docs = [
+            {"user_id": 1, "type": "quiz", "activity_id": "a", "start_time": start,
+             "completion_time": start + timedelta(seconds=seconds, microseconds=700)}
+            for seconds in (1, 3)
+        ]
+        for doc in docs:
+            await logs.insert_one(doc)
+        await rollups.insert_one(
+            {
+                "day": datetime(2024, 1, 1),
+                "user_id": 1,
+                "type": "quiz",
+                "activity_id": "a",
+            }
+        )
+
+        await rollups.bulk_write(rollup_updates(docs))
+        incremental = await rollups.find_one({}, projection={"_id": 0})
+        await logs.aggregate(rebuild_rollups_pipeline("rollups")).to_list(None)
+
+        assert await rollups.find({}, projection={"_id": 0}).to_list(None) == [
+            incremental
+        ]
+        assert incremental["total_duration_ms"] == 4002
@@ -0,0 +1,177 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.metrics import (
+    Histogram,
+    Gauge,
+    CommandMetricsListener,
+    PoolMetricsListener,
+    command_collection,
+    http_request_duration,
+    mongo_command_duration,
+    mongo_pool_checked_out,
+    mongo_pool_waiting,
+    render,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_metrics():
+    for metric in (
+        http_request_duration,
+        mongo_command_duration,
+        mongo_pool_checked_out,
+        mongo_pool_waiting,
+    ):
+        metric.clear()
+    yield
+
+
+class TestMetricTypes:
+    """Tests for the Prometheus text-format metrics"""
+
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = Histogram(
+            "latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0)
+        )
+        histogram.observe(("/a",), 0.05)
+        histogram.observe(("/a",), 0.1)
+        histogram.observe(("/a",), 5.0)
+
+        lines = histogram.render()
+
+        assert "# TYPE latency_seconds histogram" in lines
+        assert 'latency_seconds_bucket{route="/a",le="0.1"} 2' in lines
+        assert 'latency_seconds_bucket{route="/a",le="1.0"} 2' in lines
+        assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+        assert 'latency_seconds_count{route="/a"} 3' in lines
+        assert 'latency_seconds_sum{route="/a"} 5.15' in lines
+
+    def test_label_values_are_escaped(self):
+        gauge = Gauge("things", "Things.", ("name",))
+        gauge.set(('a "b"\\c',), 2)
+
+        assert 'things{name="a \\"b\\"\\\\c"} 2' in gauge.render()
+
+    def test_gauge_inc_dec(self):
+        gauge = Gauge("things", "Things.", ("name",))
+        gauge.inc(("x",))
+        gauge.inc(("x",))
+        gauge.dec(("x",))
+
+        assert gauge.value(("x",)) == 1
+
+
+class TestMongoListeners:
+    """Tests for pymongo command and pool listeners"""
+
+    def test_command_collection(self):
+        assert (
+            command_collection("find", {"find": "users_new", "filter": {}})
+            == "users_new"
+        )
+        assert (
+            command_collection("getMore", {"getMore": 123, "collection": "logs_new"})
+            == "logs_new"
+        )
+        assert command_collection("ping", {"ping": 1}) == ""
+
+    def test_command_latency_by_collection(self):
+        listener = CommandMetricsListener()
+        listener.started(
+            SimpleNamespace(
+                connection_id=("localhost", 27017),
+                request_id=7,
+                command_name="find",
+                command={"find": "users_new"},
+            )
+        )
+        listener.succeeded(
+            SimpleNamespace(
+                connection_id=("localhost", 27017),
+                request_id=7,
+                command_name="find",
+                duration_micros=2500,
+            )
+        )
+
+        buckets, total = mongo_command_duration.samples(
+            ("users_new", "find", "succeeded")
+        )
+        assert sum(buckets) == 1
+        assert total == pytest.approx(0.0025)
+        assert listener._started == {}
+
+    def test_failed_command(self):
+        listener = CommandMetricsListener()
+        listener.started(
+            SimpleNamespace(
+                connection_id=("localhost", 27017),
+                request_id=8,
+                command_name="insert",
+                command={"insert": "logs_new"},
+            )
+        )
+        listener.failed(
+            SimpleNamespace(
+                connection_id=("localhost", 27017),
+                request_id=8,
+                command_name="insert",
+                duration_micros=100,
+            )
+        )
+
+        assert (
+            mongo_command_duration.samples(("logs_new", "insert", "failed")) is not None
+        )
+
+    def test_pool_gauges(self):
+        listener = PoolMetricsListener()
+        event = SimpleNamespace(address=("localhost", 27017))
+
+        listener.connection_check_out_started(event)
+        listener.connection_check_out_started(event)
+        listener.connection_checked_out(event)
+
+        assert mongo_pool_waiting.value(("localhost:27017",)) == 1
+        assert mongo_pool_checked_out.value(("localhost:27017",)) == 1
+
+        listener.connection_checked_in(event)
+        assert mongo_pool_checked_out.value(("localhost:27017",)) == 0
+
+
+class TestMetricsEndpoint:
+    """Tests for request metrics and /metrics"""
+
+    def test_requests_labelled_by_route_template(self):
+        client = TestClient(app)
+        client.get("/health")
+        client.get("/no/such/path")
+
+        body = client.get("/metrics").text
+
+        count = "http_request_duration_seconds_count"
+        assert f'{count}{{method="GET",route="/health",status="200"}} 1' in body
+        assert f'{count}{{method="GET",route="unmatched",status="404"}} 1' in body
+
+    @patch("app.routes.user_routes.read_user_by_id")
+    def test_path_parameters_do_not_create_series(self, mock_read):
+        mock_read.return_value = None
+        client = TestClient(app)
+        client.get("/users/1")
+        client.get("/users/2")
+
+        assert (
+            http_request_duration.samples(("GET", "/users/{user_id}", "404"))
+            is not None
+        )
+        assert 'route="/users/1"' not in render()
+
+    def test_content_type(self):
+        response = TestClient(app).get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
@@ -0,0 +1,112 @@
+import json
+import pstats
+import pytest
+from types import SimpleNamespace
+from httpx import ASGITransport, AsyncClient
+
+from app.main import app
+from app.profiling import (
+    ProfilingMiddleware,
+    ProfileCommandListener,
+    RequestProfile,
+    _active_profile,
+    package_of,
+)
+
+
+def client_for(middleware: ProfilingMiddleware) -> AsyncClient:
+    return AsyncClient(transport=ASGITransport(app=middleware), base_url="http://test")
+
+
+class TestProfilingMiddleware:
+    """Tests for opt-in request profiling"""
+
+    @pytest.mark.asyncio
+    async def test_profiles_request_with_token(self, tmp_path):
+        middleware = ProfilingMiddleware(
+            app, token="secret", sample_rate=0, directory=tmp_path
+        )
+
+        async with client_for(middleware) as client:
+            response = await client.get(
+                "/health", headers={"X-Profile-Token": "secret"}
+            )
+
+        assert response.status_code == 200
+        profile_id = response.headers["X-Profile-Id"]
+        [prof] = tmp_path.glob(f"*{profile_id}.prof")
+        [summary_path] = tmp_path.glob(f"*{profile_id}.json")
+        assert pstats.Stats(str(prof)).total_calls > 0
+        summary = json.loads(summary_path.read_text())
+        assert summary["route"] == "/health"
+        assert summary["status"] == 200
+        assert summary["wall_ms"] > 0
+        assert summary["mongo_commands"] == []
+        assert summary["top_functions"]
+        assert "app" in summary["own_ms_by_package"]
+
+    @pytest.mark.asyncio
+    async def test_wrong_or_missing_token_is_not_profiled(self, tmp_path):
+        middleware = ProfilingMiddleware(
+            app, token="secret", sample_rate=0, directory=tmp_path
+        )
+
+        async with client_for(middleware) as client:
+            wrong = await client.get("/health", headers={"X-Profile-Token": "guess"})
+            missing = await client.get("/health")
+
+        assert "X-Profile-Id" not in wrong.headers
+        assert "X-Profile-Id" not in missing.headers
+        assert list(tmp_path.iterdir()) == []
+
+    @pytest.mark.asyncio
+    async def test_sampled_request(self, tmp_path):
+        middleware = ProfilingMiddleware(
+            app, token=None, sample_rate=1.0, directory=tmp_path
+        )
+
+        async with client_for(middleware) as client:
+            response = await client.get("/")
+
+        assert "X-Profile-Id" in response.headers
+        assert len(list(tmp_path.glob("*.json"))) == 1
+
+
+class TestProfileCommandListener:
+    """Tests for attributing Mongo commands to a profiled request"""
+
+    def test_records_commands_of_the_profiled_request(self):
+        listener = ProfileCommandListener()
+        event = dict(
+            connection_id=("localhost", 27017), request_id=1, command_name="find"
+        )
+        profile = RequestProfile()
+
+        token = _active_profile.set(profile)
+        try:
+            listener.started(SimpleNamespace(**event, command={"find": "users_new"}))
+            listener.succeeded(SimpleNamespace(**event, duration_micros=1500))
+        finally:
+            _active_profile.reset(token)
+
+        assert profile.commands == [
+            {"command": "find", "collection": "users_new", "duration_ms": 1.5}
+        ]
+
+    def test_ignores_commands_outside_profiles(self):
+        listener = ProfileCommandListener()
+        event = dict(
+            connection_id=("localhost", 27017), request_id=1, command_name="find"
+        )
+
+        listener.started(SimpleNamespace(**event, command={"find": "users_new"}))
+        listener.succeeded(SimpleNamespace(**event, duration_micros=1500))
+
+        assert listener._started == {}
+
+    def test_package_of(self):
+        assert package_of("~") == "builtins"
+        assert (
+            package_of("/usr/lib/python3.11/site-packages/pydantic/main.py")
+            == "pydantic"
+        )
@@ -0,0 +1,133 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from datetime import datetime, timedelta, timezone
+
+from app.cruds.rollup_crud import (
+    rollup_updates,
+    rollup_removals,
+    apply_log_rollups,
+    rebuild_rollups,
+    rebuild_rollups_pipeline,
+    read_rollups,
+)
+from app.cruds.log_crud import create_logs
+from app.models.log import LogIn
+
+
+def make_doc(user_id, start, seconds, type="quiz"):
+    return {
+        "user_id": user_id,
+        "activity_id": "a1",
+        "type": type,
+        "start_time": start,
+        "completion_time": start + timedelta(seconds=seconds),
+    }
+
+
+class TestLogRollups:
+    """Tests for incremental log rollups"""
+
+    def test_rollup_updates_groups_by_key(self):
+        start = datetime(2024, 1, 1, 10)
+        docs = [make_doc(1, start, 1), make_doc(1, start, 3), make_doc(2, start, 2)]
+
+        updates = rollup_updates(docs)
+
+        assert len(updates) == 2
+        first = updates[0]._doc
+        assert updates[0]._filter == {
+            "day": datetime(2024, 1, 1),
+            "user_id": 1,
+            "type": "quiz",
+            "activity_id": "a1",
+        }
+        assert first["$inc"] == {"count": 2, "total_duration_ms": 4000}
+        assert first["$min"] == {"min_duration_ms": 1000}
+        assert first["$max"] == {"max_duration_ms": 3000}
+        assert updates[0]._upsert is True
+
+    def test_rollup_day_is_utc(self):
+        start = datetime(2024, 1, 2, 1, tzinfo=timezone(timedelta(hours=3)))
+
+        updates = rollup_updates([make_doc(1, start, 1)])
+
+        assert updates[0]._filter["day"] == datetime(2024, 1, 1)
+
+    def test_duration_uses_stored_milliseconds(self):
+        # BSON keeps whole milliseconds, same as $subtract in the rebuild
+        start = datetime(2024, 1, 1, 10, 0, 0, 999)
+        doc = {
+            **make_doc(1, start, 1),
+            "completion_time": datetime(2024, 1, 1, 10, 0, 1, 1500),
+        }
+
+        updates = rollup_updates([doc])
+
+        assert updates[0]._doc["$inc"]["total_duration_ms"] == 1001
+
+    def test_rollup_removals_decrement_and_drop_empty(self):
+        start = datetime(2024, 1, 1, 10)
+
+        update, delete = rollup_removals([make_doc(1, start, 1), make_doc(1, start, 3)])
+
+        assert update._doc == {"$inc": {"count": -2, "total_duration_ms": -4000}}
+        assert not update._upsert
+        assert delete._filter == {**update._filter, "count": {"$lte": 0}}
+
+    @pytest.mark.asyncio
+    async def test_apply_log_rollups(self):
+        mock_rollups = AsyncMock()
+
+        await apply_log_rollups(mock_rollups, [make_doc(1, datetime(2024, 1, 1), 1)])
+        await apply_log_rollups(mock_rollups, [])
+
+        mock_rollups.bulk_write.assert_called_once()
+        assert mock_rollups.bulk_write.call_args[1]["ordered"] is False
+
+    @pytest.mark.asyncio
+    async def test_create_logs_updates_rollups(self):
+        mock_collection = AsyncMock()
+        mock_rollups = AsyncMock()
+        logs = [
+            LogIn(
+                user_id=1,
+                activity_id="a1",
+                type="quiz",
+                start_time=datetime(2024, 1, 1),
+                completion_time=datetime(2024, 1, 1, 0, 0, 2),
+            )
+        ]
+
+        await create_logs(mock_collection, logs, rollups=mock_rollups)
+
+        mock_rollups.bulk_write.assert_called_once()
+
+    def test_rebuild_pipeline_merges_on_key(self):
+        pipeline = rebuild_rollups_pipeline("log_rollups", start=datetime(2024, 1, 1))
+
+        assert pipeline[0] == {"$match": {"start_time": {"$gte": datetime(2024, 1, 1)}}}
+        merge = pipeline[-1]["$merge"]
+        assert merge["into"] == "log_rollups"
+        assert merge["on"] == ["day", "user_id", "type", "activity_id"]
+        assert merge["whenMatched"] == "replace"
+
+    @pytest.mark.asyncio
+    async def test_rebuild_does_not_clear_rollups(self):
+        mock_logs = MagicMock()
+        mock_logs.aggregate.return_value.__aiter__.return_value = []
+        mock_rollups = AsyncMock()
+        mock_rollups.name = "log_rollups"
+
+        await rebuild_rollups(mock_logs, mock_rollups, start=datetime(2024, 1, 1))
+
+        mock_rollups.delete_many.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_read_rollups_is_bounded(self):
+        mock_rollups = MagicMock()
+        mock_rollups.find.return_value.to_list = AsyncMock(return_value=[])
+
+        await read_rollups(mock_rollups, {"user_id": 1}, limit=50)
+
+        assert mock_rollups.find.call_args[1]["limit"] == 50
+        mock_rollups.find.return_value.to_list.assert_awaited_once_with(length=50)
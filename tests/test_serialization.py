@@ -0,0 +1,96 @@
+import json
+import pytest
+from datetime import datetime, timezone
+from bson import ObjectId
+
+from app.models import ConversationOut, LogOut, UserOut
+from app.serialization import (
+    dumps_trusted,
+    parse_fields,
+    trusted_dict,
+    trusted_list_response,
+)
+
+
+def model_json(model, doc):
+    doc = {
+        k: v
+        for k, v in doc.items()
+        if k in {f.alias or n for n, f in model.model_fields.items()}
+    }
+    doc["_id"] = str(doc["_id"])
+    return model(**doc).model_dump_json(by_alias=True).encode()
+
+
+class TestTrustedSerialization:
+    """Tests for serialization of stored documents"""
+
+    def test_conversation_matches_model(self):
+        doc = {
+            "_id": ObjectId(),
+            "user_id": 123,
+            "messages": [
+                {
+                    "sender": "user",
+                    "text": "Привет",
+                    "time": datetime(2024, 1, 1, 12, 0, 0, 123000),
+                },
+                {"sender": "bot", "text": "Hi", "time": datetime(2024, 1, 1, 12, 0, 1)},
+            ],
+            "etag": "v1",
+        }
+
+        assert dumps_trusted(ConversationOut, doc) == model_json(ConversationOut, doc)
+
+    def test_log_matches_model(self):
+        doc = {
+            "_id": ObjectId(),
+            "user_id": 1,
+            "activity_id": "a",
+            "type": "t",
+            "start_time": datetime(2024, 1, 1, tzinfo=timezone.utc),
+            "completion_time": datetime(2024, 1, 1, 0, 5),
+            "meta": {"user_id": 1, "type": "t"},
+        }
+
+        assert dumps_trusted(LogOut, doc) == model_json(LogOut, doc)
+
+    def test_missing_fields_use_defaults(self):
+        out = trusted_dict(UserOut, {"_id": 1, "name": "Test"})
+
+        assert out["launch_count"] == 0
+        assert out["gender"] is None
+        assert list(out) == [f.alias or n for n, f in UserOut.model_fields.items()]
+
+    def test_missing_required_field(self):
+        with pytest.raises(ValueError):
+            trusted_dict(ConversationOut, {"_id": ObjectId()})
+
+    def test_list_response(self):
+        docs = [{"_id": ObjectId(), "user_id": 1}, {"_id": ObjectId(), "user_id": 2}]
+
+        response = trusted_list_response(
+            ConversationOut, docs, headers={"X-Next-After": "x"}
+        )
+
+        assert response.headers["X-Next-After"] == "x"
+        assert [conv["user_id"] for conv in json.loads(response.body)] == [1, 2]
+
+    def test_partial_dict(self):
+        doc = {"_id": ObjectId(), "user_id": 1, "messages": []}
+
+        assert trusted_dict(ConversationOut, doc, frozenset({"_id"})) == {
+            "_id": doc["_id"]
+        }
+
+    def test_parse_fields_accepts_names_and_aliases(self):
+        assert parse_fields(ConversationOut, "id, user_id,") == frozenset(
+            {"_id", "user_id"}
+        )
+        assert parse_fields(ConversationOut, "_id") == frozenset({"_id"})
+
+    def test_parse_fields_rejects_unknown(self):
+        with pytest.raises(ValueError):
+            parse_fields(UserOut, "name,password")
+        with pytest.raises(ValueError):
+            parse_fields(UserOut, " , ")
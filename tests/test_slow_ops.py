@@ -0,0 +1,230 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.request_context import current_scope
+from app.slow_ops import (
+    SlowOperationLog,
+    command_shape,
+    explain_command,
+    explain_summary,
+    redact,
+)
+
+
+def finished(request_id: int, command_name: str, duration_ms: float):
+    return SimpleNamespace(
+        connection_id=("localhost", 27017),
+        request_id=request_id,
+        command_name=command_name,
+        duration_micros=int(duration_ms * 1000),
+    )
+
+
+def started(request_id: int, command_name: str, command: dict):
+    return SimpleNamespace(
+        connection_id=("localhost", 27017),
+        request_id=request_id,
+        command_name=command_name,
+        database_name="swp_db",
+        command=command,
+    )
+
+
+class TestCommandShape:
+    """Tests for redacting Mongo commands"""
+
+    def test_redacts_values_and_keeps_operators(self):
+        assert redact(
+            {"user_id": 7, "_id": {"$gt": "abc"}, "tags": {"$in": [1, 2]}}
+        ) == {
+            "user_id": "?",
+            "_id": {"$gt": "?"},
+            "tags": {"$in": "?"},
+        }
+
+    def test_keeps_pipeline_stages(self):
+        assert redact([{"$match": {"user_id": 1}}, {"$limit": 10}]) == [
+            {"$match": {"user_id": "?"}},
+            {"$limit": "?"},
+        ]
+
+    def test_shape_drops_documents_and_session_fields(self):
+        command = {
+            "find": "conversations",
+            "filter": {"user_id": 7},
+            "sort": {"_id": 1},
+            "limit": 100,
+            "lsid": {"id": "x"},
+            "$db": "swp_db",
+        }
+
+        assert command_shape("find", command) == {
+            "find": "conversations", "filter": {"user_id": "?"}, "sort": {"_id": "?"},
+        }
+
+    def test_bulk_statements_collapse_to_first(self):
+        command = {
+            "update": "message_buckets",
+            "updates": [{"q": {"_id": i}, "u": {"$push": {}}} for i in range(3)],
+        }
+
+        assert command_shape("update", command)["updates"] == [
+            {"q": {"_id": "?"}, "u": {"$push": {}}}
+        ]
+        assert len(explain_command(command)["updates"]) == 1
+
+    def test_explain_command_strips_driver_fields(self):
+        command = {
+            "find": "users_new",
+            "filter": {"_id": 1},
+            "lsid": {"id": "x"},
+            "$db": "swp_db",
+        }
+
+        assert explain_command(command) == {"find": "users_new", "filter": {"_id": 1}}
+
+
+class TestExplainSummary:
+    """Tests for summarizing explain output"""
+
+    def test_collection_scan(self):
+        result = {
+            "queryPlanner": {
+                "winningPlan": {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}
+            },
+            "executionStats": {
+                "nReturned": 3,
+                "totalKeysExamined": 0,
+                "totalDocsExamined": 5000,
+            },
+        }
+
+        summary = explain_summary(result)
+
+        assert summary["stages"] == ["SORT", "COLLSCAN"]
+        assert summary["collection_scan"] is True
+        assert summary["docs_examined"] == 5000
+
+    def test_aggregate_and_slot_based_plans(self):
+        result = {
+            "stages": [
+                {
+                    "$cursor": {
+                        "queryPlanner": {
+                            "winningPlan": {
+                                "queryPlan": {
+                                    "stage": "FETCH",
+                                    "inputStage": {"stage": "IXSCAN"},
+                                }
+                            }
+                        },
+                        "executionStats": {"nReturned": 1},
+                    }
+                }
+            ]
+        }
+
+        summary = explain_summary(result)
+
+        assert summary["stages"] == ["FETCH", "IXSCAN"]
+        assert summary["collection_scan"] is False
+
+
+class TestSlowOperationLog:
+    """Tests for the slow Mongo operation log"""
+
+    def test_fast_commands_are_ignored(self):
+        log = SlowOperationLog(threshold_ms=100)
+        listener = log.listener()
+        listener.started(
+            started(1, "find", {"find": "users_new", "filter": {"_id": 1}})
+        )
+        listener.succeeded(finished(1, "find", 5))
+
+        assert log.stats() == []
+        assert listener._started == {}
+
+    def test_slow_commands_are_grouped_by_shape(self, caplog):
+        log = SlowOperationLog(threshold_ms=100)
+        listener = log.listener()
+        for request_id, user_id in enumerate((1, 2)):
+            listener.started(
+                started(
+                    request_id,
+                    "find",
+                    {"find": "conversations", "filter": {"user_id": user_id}},
+                )
+            )
+            listener.succeeded(finished(request_id, "find", 150 + request_id * 100))
+
+        [entry] = log.stats()
+        assert entry["count"] == 2
+        assert entry["max_ms"] == 250
+        assert "Slow Mongo find on swp_db.conversations" in caplog.text
+        assert '"user_id": 1' not in caplog.text
+
+    def test_records_the_calling_route(self):
+        log = SlowOperationLog(threshold_ms=100)
+        token = current_scope.set(
+            {
+                "path": "/conversations/user/7",
+                "route": SimpleNamespace(path="/conversations/user/{user_id}"),
+            }
+        )
+        try:
+            log.record(
+                "find",
+                "swp_db",
+                {"find": "conversations", "filter": {"user_id": 7}},
+                300.0,
+            )
+        finally:
+            current_scope.reset(token)
+
+        assert log.stats()[0]["last_route"] == "/conversations/user/{user_id}"
+
+    @pytest.mark.asyncio
+    async def test_explains_once_per_interval(self):
+        client = MagicMock()
+        client.__getitem__.return_value.command = AsyncMock(return_value={
+            "queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}},
+            "executionStats": {"nReturned": 1, "totalDocsExamined": 1000},
+        })
+        log = SlowOperationLog(threshold_ms=100, explain=True, explain_interval=60)
+        log.start(lambda: client)
+        command = {
+            "find": "conversations",
+            "filter": {"user_id": 7},
+            "lsid": {"id": "x"},
+        }
+
+        with patch("app.slow_ops.time.monotonic", return_value=1000.0):
+            log.record("find", "swp_db", command, 300.0)
+            log.record("find", "swp_db", command, 300.0)
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+        client.__getitem__.return_value.command.assert_awaited_once_with(
+            {
+                "explain": {"find": "conversations", "filter": {"user_id": 7}},
+                "verbosity": "executionStats",
+            }
+        )
+        assert log.stats()[0]["explain"]["collection_scan"] is True
+
+        with patch("app.slow_ops.time.monotonic", return_value=1061.0):
+            log.record("find", "swp_db", command, 300.0)
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert client.__getitem__.return_value.command.await_count == 2
+        await log.stop()
+
+    def test_writes_other_than_explainable_are_not_explained(self):
+        log = SlowOperationLog(threshold_ms=100, explain=True)
+        log._schedule_explain = MagicMock()
+
+        log.record("insert", "swp_db", {"insert": "logs_new", "documents": [{}]}, 300.0)
+
+        log._schedule_explain.assert_not_called()
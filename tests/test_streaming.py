@@ -0,0 +1,42 @@
+import pytest
+from unittest.mock import Mock
+
+from app.streaming import wants_ndjson, json_array_stream, ndjson_stream
+
+
+async def items(values):
+    for value in values:
+        yield value
+
+
+def make_request(accept):
+    request = Mock()
+    request.headers = {"accept": accept} if accept is not None else {}
+    return request
+
+
+class TestStreaming:
+    """Tests for streaming helpers"""
+
+    def test_wants_ndjson(self):
+        assert wants_ndjson(make_request("application/x-ndjson"))
+        assert wants_ndjson(
+            make_request("application/json, application/x-ndjson;q=0.9")
+        )
+        assert not wants_ndjson(make_request("application/json"))
+        assert not wants_ndjson(make_request(None))
+
+    @pytest.mark.asyncio
+    async def test_json_array_stream(self):
+        chunks = [chunk async for chunk in json_array_stream(items([b"1", b"2"]))]
+        assert b"".join(chunks) == b"[1,2]"
+
+        chunks = [chunk async for chunk in json_array_stream(items([]))]
+        assert b"".join(chunks) == b"[]"
+
+    @pytest.mark.asyncio
+    async def test_ndjson_stream(self):
+        chunks = [
+            chunk async for chunk in ndjson_stream(items([b'{"a":1}', b'{"a":2}']))
+        ]
+        assert b"".join(chunks) == b'{"a":1}\n{"a":2}\n'